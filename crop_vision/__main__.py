@@ -0,0 +1,7 @@
+import sys
+import multiprocessing
+from crop_vision.cli import main
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support() # Needed for sharded batch workers in frozen builds
+    sys.exit(main())
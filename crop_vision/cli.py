@@ -0,0 +1,443 @@
+"""
+Headless command-line entry point: python -m crop_vision <command> ...
+
+Drives Detector and image_utils directly and never imports PyQt6, so batch
+jobs can run on servers without a GUI stack. All machine-readable output is
+JSON lines on stdout (one object per event); logs go to stderr.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from . import config
+
+log = logging.getLogger("crop_vision.cli")
+
+
+def setup_logging(level=None):
+    """Configures logging to stderr, keeping stdout free for JSON events."""
+    log_level = getattr(logging, (level or config.LOG_LEVEL).upper(), logging.INFO)
+    logging.basicConfig(level=log_level, format=config.LOG_FORMAT, stream=sys.stderr)
+    logging.getLogger("ultralytics").setLevel(logging.WARNING) # Reduce YOLO spam
+    logging.getLogger("PIL").setLevel(logging.WARNING) # Reduce Pillow spam
+
+
+def emit(event, **fields):
+    """Writes one JSON event line to stdout."""
+    sys.stdout.write(json.dumps({"event": event, **fields}) + "\n")
+    sys.stdout.flush()
+
+
+def emit_summary(images, started, **fields):
+    elapsed = time.perf_counter() - started
+    emit("summary", images=images, seconds=round(elapsed, 3),
+         images_per_sec=round(images / elapsed, 2) if elapsed > 0 else None, **fields)
+
+
+class ProgressReporter:
+    """Emits throttled 'progress' events so huge jobs don't flood stdout."""
+
+    def __init__(self, total, interval=config.CLI_PROGRESS_INTERVAL):
+        self.total = total
+        self.interval = interval
+        self._last = 0.0
+
+    def __call__(self, index, message, processed):
+        now = time.perf_counter()
+        if processed == self.total or now - self._last >= self.interval:
+            self._last = now
+            emit("progress", done=processed, total=self.total, index=index, message=message)
+
+
+def _load_detector(args):
+    from .core.detector import Detector # Deferred: pulls in torch
+    detector = Detector()
+    success, msg = detector.init_model(args.model, backend=args.backend, profile=args.profile, tiled=args.tiled)
+    if not success:
+        emit("error", message=f"Failed to load model: {msg}")
+        return None
+    log.info(msg)
+    return detector
+
+
+def _store_identity(args):
+    """Results-store/journal identity of args.model under --profile, --backend and --tiled (all change the predictions)."""
+    from .core.detector import run_identity
+    return run_identity(args.model, args.profile, args.tiled, args.backend)
+
+
+def _list_images(source):
+    from .core import image_utils
+    return image_utils.list_images(source)
+
+
+def cmd_scan(args):
+    started = time.perf_counter()
+    image_paths = _list_images(args.source)
+    if not args.count_only:
+        for path in image_paths:
+            emit("image", path=path)
+    emit_summary(len(image_paths), started)
+    return 0
+
+
+def cmd_detect(args):
+    started = time.perf_counter()
+    image_paths = _list_images(args.source)
+    detector = _load_detector(args)
+    if detector is None:
+        return 1
+
+    total_boxes = 0
+    failed = 0
+    for start in range(0, len(image_paths), args.batch_size):
+        chunk = image_paths[start:start + args.batch_size]
+        try:
+            outcomes = detector.detect_batch(chunk, args.threshold, args.class_filter, batch_size=len(chunk))
+        except Exception as e:
+            log.warning(f"Batched detection failed ({e}), retrying {len(chunk)} images one by one.")
+            outcomes = []
+            for path in chunk:
+                try:
+                    outcomes.append(detector.detect_objects(path, args.threshold, args.class_filter))
+                except Exception as item_error:
+                    outcomes.append(item_error)
+
+        for path, outcome in zip(chunk, outcomes):
+            if isinstance(outcome, Exception):
+                failed += 1
+                emit("error", path=path, message=str(outcome))
+            else:
+                total_boxes += len(outcome)
+                emit("detections", path=path, **outcome.to_dict())
+
+    emit_summary(len(image_paths), started, detections=total_boxes, failed=failed, scheduler=detector.scheduler.stats())
+    return 0
+
+
+def cmd_crop(args):
+    started = time.perf_counter()
+    image_paths = _list_images(args.source)
+    if not image_paths:
+        emit_summary(0, started, crops=0)
+        return 0
+    progress = ProgressReporter(len(image_paths))
+    from .core.journal import BatchJournal
+
+    if args.workers > 1:
+        from .core.multiproc import ShardedBatchRunner
+        journal = BatchJournal(args.output, _store_identity(args), args.threshold, args.class_filter,
+                               resume=not args.restart)
+        runner = ShardedBatchRunner(
+            args.model, image_paths, args.threshold, args.class_filter, args.output,
+            processes=args.workers, torch_threads=args.torch_threads, batch_size=args.batch_size,
+            journal=journal, backend=args.backend, profile=args.profile, tiled=args.tiled
+        )
+    else:
+        from .core.pipeline import BatchPipeline
+        detector = _load_detector(args)
+        if detector is None:
+            return 1
+        journal = BatchJournal(args.output, detector.model_identity, args.threshold, args.class_filter,
+                               resume=not args.restart)
+        runner = BatchPipeline(detector, image_paths, args.threshold, args.class_filter, args.output,
+                               batch_size=args.batch_size, journal=journal)
+
+    try:
+        total_crops = runner.run(on_item=progress)
+    except KeyboardInterrupt:
+        emit("error", message="Interrupted.")
+        return 130
+    for error in runner.errors:
+        emit("error", message=error)
+    emit_summary(len(image_paths), started, crops=total_crops, skipped=runner.skipped)
+    return 1 if runner.errors else 0
+
+
+def cmd_watch(args):
+    from .core.watcher import FolderWatcher
+    if not os.path.isdir(args.source):
+        emit("error", message=f"Not a folder: {args.source}")
+        return 1
+    detector = _load_detector(args)
+    if detector is None:
+        return 1
+    started = time.perf_counter()
+    watcher = FolderWatcher(detector, args.source, args.output, args.threshold, args.class_filter,
+                            batch_size=args.batch_size, max_batch=args.max_batch, settle=args.settle,
+                            poll_interval=args.poll_interval, use_events=args.events,
+                            process_existing=not args.new_only, resume=not args.restart)
+    emit("watching", source=watcher.src_dir, output=args.output)
+    try:
+        watcher.run(on_item=lambda path, message: emit("item", image=path, message=message),
+                    on_round=lambda summary: emit("round", **summary))
+    except KeyboardInterrupt:
+        pass
+    emit_summary(watcher.processed, started, crops=watcher.total_saved_crops, rounds=watcher.rounds)
+    return 0
+
+
+def cmd_export(args):
+    from .core import exporters
+    from .core.results_store import ResultsStore
+    started = time.perf_counter()
+    store = ResultsStore(args.store)
+    identity = _store_identity(args)
+    if store.class_names(identity) is None:
+        emit("error", message=f"No stored results for model '{identity}'.", models=store.models())
+        return 1
+
+    results = store.iter_results(identity, root=args.source)
+    if args.format == "coco":
+        count = exporters.export_coco(results, args.output, args.threshold, args.class_filter,
+                                      names=store.class_names(identity))
+    elif args.format == "yolo":
+        os.makedirs(args.output, exist_ok=True)
+        count = exporters.export_yolo(results, args.output, args.threshold, args.class_filter,
+                                      root=args.source, names=store.class_names(identity))
+    else:
+        count = exporters.export_jsonl(results, args.output, args.threshold, args.class_filter)
+    emit_summary(count, started, format=args.format, output=args.output)
+    return 0
+
+
+def cmd_recrop(args):
+    from .core import recrop
+    started = time.perf_counter()
+    names = None
+    if args.boxes == "yolo":
+        tasks = recrop.yolo_tasks(args.source, args.labels)
+        names = recrop.read_class_names(args.labels or recrop.default_labels_root(args.source))
+    elif args.boxes == "coco":
+        if not args.labels:
+            emit("error", message="--labels must point to the COCO JSON file.")
+            return 2
+        tasks = recrop.coco_tasks(args.labels, args.source)
+    else:
+        from .core.results_store import ResultsStore
+        tasks = recrop.store_tasks(ResultsStore(args.store), _store_identity(args), root=args.source)
+    log.info(f"Re-cropping {len(tasks)} images with stored boxes.")
+
+    progress = ProgressReporter(len(tasks))
+    try:
+        total_crops, failed = recrop.run_recrop(
+            tasks, args.output, threshold=args.threshold, class_filter=args.class_filter, names=names,
+            padding=args.padding, square=args.square, resize=args.resize, workers=args.workers,
+            on_item=lambda i, path, crops, error: progress(i, error or f"{crops} crops", i + 1))
+    except KeyboardInterrupt:
+        emit("error", message="Interrupted.")
+        return 130
+    emit_summary(len(tasks), started, crops=total_crops, failed=failed)
+    return 1 if failed else 0
+
+
+def cmd_bench(args):
+    from .core import bench
+    started = time.perf_counter()
+    image_paths = _list_images(args.source)[:args.limit]
+    if not image_paths:
+        emit("error", message="No images found.")
+        return 1
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    unknown = [p for p in profiles if p not in config.PERFORMANCE_PROFILES]
+    if unknown:
+        emit("error", message=f"Unknown profiles: {', '.join(unknown)}", profiles=list(config.PERFORMANCE_PROFILES))
+        return 2
+    try:
+        reports = bench.compare_profiles(args.model, image_paths, profiles, threshold=args.threshold,
+                                         class_filter=args.class_filter, backend=args.backend,
+                                         on_profile=lambda report: emit("profile", **report))
+    except RuntimeError as e:
+        emit("error", message=f"Failed to load model: {e}")
+        return 1
+    emit_summary(len(image_paths) * len(reports), started, profiles=len(reports))
+    return 0
+
+
+def cmd_serve(args):
+    from .core.server import InferenceServer
+    detector = _load_detector(args)
+    if detector is None:
+        return 1
+    try:
+        server = InferenceServer(detector, args.host, args.port, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms,
+                                 threshold=args.threshold, class_filter=args.class_filter, output_dir=args.output,
+                                 allowed_hosts=config.SERVE_ALLOWED_HOSTS + tuple(args.allow_host),
+                                 allow_any_output_dir=args.allow_any_output)
+    except OSError as e:
+        emit("error", message=f"Could not listen on {args.host}:{args.port}: {e}")
+        return 1
+    host, port = server.server_address[:2]
+    emit("listening", url=f"http://{host}:{port}", max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        detector.close()
+    emit("stopped", **server.stats())
+    return 0
+
+
+def cmd_loadtest(args):
+    from urllib.parse import urlencode
+    from .core.server import run_load_test
+    paths = _list_images(args.source) if os.path.isdir(args.source) else [args.source]
+    if args.upload:
+        requests = []
+        for path in paths[:args.limit]:
+            with open(path, "rb") as f:
+                requests.append((f.read(), "application/octet-stream"))
+    else:
+        requests = [(json.dumps({"path": os.path.abspath(path), "cache": args.cached}).encode("utf-8"), "application/json")
+                    for path in paths[:args.limit]]
+    if not requests:
+        emit("error", message="No images to send.")
+        return 1
+    url = f"{args.url.rstrip('/')}/{args.endpoint}"
+    if args.endpoint == "crop" and args.output:
+        url += f"?{urlencode({'output_dir': os.path.abspath(args.output)})}"
+    summary = run_load_test(url, requests, concurrency=args.concurrency, total=args.requests)
+    emit("loadtest", url=url, images=len(requests), **summary)
+    return 1 if summary["errors"] else 0
+
+
+def _add_profile_arg(parser):
+    parser.add_argument("--profile", choices=list(config.PERFORMANCE_PROFILES), default=config.DEFAULT_PROFILE,
+                        help="Performance profile (input size, precision, torch settings).")
+    parser.add_argument("--tiled", action=argparse.BooleanOptionalAction, default=config.TILED_INFERENCE,
+                        help="Run large images as overlapping native-resolution tiles (small objects in aerial/scanned images).")
+
+
+def _add_detection_args(parser):
+    parser.add_argument("--model", default=config.DEFAULT_MODEL_NAME, help="YOLO model name or path.")
+    parser.add_argument("--threshold", type=float, default=config.DEFAULT_CONF_THRESHOLD, help="Confidence threshold.")
+    parser.add_argument("--class-filter", default="", help="Only keep this class name (default: all).")
+    parser.add_argument("--batch-size", type=int, default=config.DEFAULT_BATCH_SIZE, help="Images per forward pass.")
+    parser.add_argument("--backend", choices=["torch", "onnx", "openvino"], default=config.INFERENCE_BACKEND,
+                        help="Inference runtime; onnx/openvino export the model once and apply on CPU only.")
+    _add_profile_arg(parser)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="crop_vision", description="Headless CropVision batch tools.")
+    parser.add_argument("--log-level", default=None, help="Logging level (default from config).")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    scan = sub.add_parser("scan", help="List supported images under a source folder.")
+    scan.add_argument("source")
+    scan.add_argument("--count-only", action="store_true", help="Only print the summary.")
+    scan.set_defaults(func=cmd_scan)
+
+    detect = sub.add_parser("detect", help="Run detection and print detections per image.")
+    detect.add_argument("source")
+    _add_detection_args(detect)
+    detect.set_defaults(func=cmd_detect)
+
+    crop = sub.add_parser("crop", help="Detect and save crops for every image under source.")
+    crop.add_argument("source")
+    crop.add_argument("output")
+    _add_detection_args(crop)
+    crop.add_argument("--workers", type=int, default=config.INFERENCE_PROCESSES,
+                      help="Inference processes (1 = single in-process pipeline).")
+    crop.add_argument("--torch-threads", type=int, default=config.TORCH_THREADS_PER_PROCESS,
+                      help="Torch intra-op threads per worker process.")
+    crop.add_argument("--restart", action="store_true",
+                      help="Process every image again instead of skipping those the output folder's journal records.")
+    crop.set_defaults(func=cmd_crop)
+
+    watch = sub.add_parser("watch", help="Detect and crop new or re-written images as they arrive in source (Ctrl+C stops).")
+    watch.add_argument("source")
+    watch.add_argument("output")
+    _add_detection_args(watch)
+    watch.add_argument("--new-only", action="store_true", help="Skip images already in source when the watch starts.")
+    watch.add_argument("--restart", action="store_true", help="Ignore the output folder's journal and reprocess existing images.")
+    watch.add_argument("--settle", type=float, default=config.WATCH_SETTLE_SECONDS,
+                       help="Seconds a file's size and mtime must stay unchanged before it is read.")
+    watch.add_argument("--poll-interval", type=float, default=config.WATCH_POLL_INTERVAL,
+                       help="Seconds between rescans when filesystem events are unavailable.")
+    watch.add_argument("--max-batch", type=int, default=config.WATCH_MAX_BATCH, help="Images processed per round.")
+    watch.add_argument("--events", action=argparse.BooleanOptionalAction, default=config.WATCH_USE_EVENTS,
+                       help="Use filesystem events (needs the watchdog package) instead of polling only.")
+    watch.set_defaults(func=cmd_watch)
+
+    recrop = sub.add_parser("recrop", help="Crop from existing boxes (label files or the results store) without a model.")
+    recrop.add_argument("source", help="Image folder.")
+    recrop.add_argument("output")
+    recrop.add_argument("--boxes", choices=["yolo", "coco", "store"], default="yolo", help="Where the boxes come from.")
+    recrop.add_argument("--labels", default=None,
+                        help="YOLO labels folder (default: the images/ -> labels/ layout) or COCO JSON file.")
+    recrop.add_argument("--model", default=config.DEFAULT_MODEL_NAME, help="Model whose stored results to use (--boxes store).")
+    recrop.add_argument("--store", default=None, help="Results store path (default from config).")
+    _add_profile_arg(recrop)
+    recrop.add_argument("--threshold", type=float, default=0.0, help="Confidence threshold (label files without scores always pass).")
+    recrop.add_argument("--class-filter", default="", help="Only keep this class name (default: all).")
+    recrop.add_argument("--padding", type=float, default=config.CROP_PADDING, help="Fraction of box size added on each side.")
+    recrop.add_argument("--square", action="store_true", default=config.CROP_SQUARE, help="Expand crops to squares.")
+    recrop.add_argument("--resize", type=int, default=config.CROP_RESIZE, help="Longer side of saved crops, in pixels.")
+    recrop.add_argument("--workers", type=int, default=config.RECROP_WORKERS, help="Worker processes (default: all cores).")
+    recrop.set_defaults(func=cmd_recrop)
+
+    export = sub.add_parser("export", help="Export stored detection results without running the model.")
+    export.add_argument("output", help="Output file (coco, jsonl) or folder (yolo).")
+    export.add_argument("--format", choices=["coco", "yolo", "jsonl"], default="jsonl")
+    export.add_argument("--source", default=None, help="Only export images under this folder.")
+    export.add_argument("--model", default=config.DEFAULT_MODEL_NAME, help="Model whose results to export.")
+    export.add_argument("--threshold", type=float, default=config.DEFAULT_CONF_THRESHOLD, help="Confidence threshold.")
+    export.add_argument("--class-filter", default="", help="Only keep this class name (default: all).")
+    export.add_argument("--store", default=None, help="Results store path (default from config).")
+    _add_profile_arg(export)
+    export.set_defaults(func=cmd_export)
+
+    bench = sub.add_parser("bench", help="Compare performance profiles: latency and detection-count deltas.")
+    bench.add_argument("source")
+    bench.add_argument("--profiles", default=",".join(config.PERFORMANCE_PROFILES),
+                       help="Comma-separated profiles; the first is the baseline.")
+    bench.add_argument("--limit", type=int, default=50, help="Number of images to benchmark.")
+    bench.add_argument("--model", default=config.DEFAULT_MODEL_NAME, help="YOLO model name or path.")
+    bench.add_argument("--threshold", type=float, default=config.DEFAULT_CONF_THRESHOLD, help="Confidence threshold.")
+    bench.add_argument("--class-filter", default="", help="Only count this class name (default: all).")
+    bench.add_argument("--backend", choices=["torch", "onnx", "openvino"], default=config.INFERENCE_BACKEND,
+                       help="Inference runtime.")
+    bench.set_defaults(func=cmd_bench)
+
+    serve = sub.add_parser("serve", help="Serve detect/crop over HTTP on localhost, sharing one loaded model.")
+    _add_detection_args(serve)
+    serve.add_argument("--host", default=config.SERVE_HOST, help="Interface to bind (default: localhost only).")
+    serve.add_argument("--port", type=int, default=config.SERVE_PORT)
+    serve.add_argument("--max-batch", type=int, default=config.SERVE_MAX_BATCH,
+                       help="Concurrent requests coalesced into one forward pass.")
+    serve.add_argument("--max-wait-ms", type=float, default=config.SERVE_MAX_WAIT_MS,
+                       help="How long a request may wait for others to join its batch.")
+    serve.add_argument("--output", default=None,
+                       help="Default output folder of /crop requests; requested output_dirs must lie inside it.")
+    serve.add_argument("--allow-any-output", action="store_true", default=config.SERVE_ALLOW_ANY_OUTPUT_DIR,
+                       help="Let /crop requests write to any output_dir this process can write to.")
+    serve.add_argument("--allow-host", action="append", default=[],
+                       help="Extra host name clients may address the server by (repeatable; for --host 0.0.0.0).")
+    serve.set_defaults(func=cmd_serve)
+
+    loadtest = sub.add_parser("loadtest", help="Load-test a running server: p50/p99 latency and requests/s.")
+    loadtest.add_argument("source", help="Image file or folder whose images are sent.")
+    loadtest.add_argument("--url", default=f"http://{config.SERVE_HOST}:{config.SERVE_PORT}")
+    loadtest.add_argument("--endpoint", choices=["detect", "crop"], default="detect")
+    loadtest.add_argument("--output", default=None,
+                          help="Output folder for --endpoint crop (inside the server's --output unless it allows any).")
+    loadtest.add_argument("--requests", type=int, default=200, help="Total requests.")
+    loadtest.add_argument("--concurrency", type=int, default=8, help="Requests in flight.")
+    loadtest.add_argument("--limit", type=int, default=100, help="Distinct images sent (cycled).")
+    loadtest.add_argument("--upload", action="store_true", help="Send image bytes instead of file paths.")
+    loadtest.add_argument("--cached", action="store_true",
+                          help="Let path requests hit the prediction cache (default: always run the model).")
+    loadtest.set_defaults(func=cmd_loadtest)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    setup_logging(args.log_level)
+    return args.func(args)
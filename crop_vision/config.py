@@ -6,6 +6,12 @@ DEFAULT_MODEL_NAME = "yolo11x.pt"
 DEFAULT_CONF_THRESHOLD = 0.65
 DEFAULT_ITEMS_PER_PAGE = 25
 DEFAULT_OUTPUT_DIR = os.path.join(os.getcwd(), "yolo_crops")
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "cropvision") # Model metadata and other on-disk caches
+DEFAULT_BATCH_SIZE = 8 # Images per forward pass in batch crop jobs
+PREDICTION_CACHE_SIZE = 512 # Raw predictions kept for re-filtering (0 disables)
+DECODE_ONCE = True # Batch jobs decode each image full size once and share it between inference and cropping
+REDUCED_DECODE = True # Reduced-resolution model input: an in-memory reduce of the DECODE_ONCE image, or without DECODE_ONCE a JPEG DCT-scale decode plus a full-size one only for images with crops (cheaper when most have none)
+INFERENCE_BACKEND = "torch" # "torch", or on CPU-only hosts "onnx" / "openvino" (exported once per profile imgsz, cached next to the weights)
 
 # --- Supported Image Formats ---
 # Used in core/image_utils.py - ensures consistency
@@ -37,4 +43,101 @@ DEFAULT_CLASS_NAMES = [
     "laptop", "mouse", "remote", "keyboard", "cell phone", "microwave",
     "oven", "toaster", "sink", "refrigerator", "book", "clock", "vase",
     "scissors", "teddy bear", "hair drier", "toothbrush"
-]
\ No newline at end of file
+]
+
+# --- Performance Profiles ---
+# imgsz: inference input size (ONNX/OpenVINO exports are made at this size)
+# precision: "fp32", "half" (CUDA only) or "bf16" (CPU autocast; half on CUDA)
+# threads: torch intra-op threads (None = torch default)
+# channels_last / compile: PyTorch memory format and torch.compile (falls back to eager if compiling fails)
+PERFORMANCE_PROFILES = {
+    "accurate": {"imgsz": 640, "precision": "fp32", "threads": None, "channels_last": False, "compile": False},
+    "balanced": {"imgsz": 512, "precision": "fp32", "threads": None, "channels_last": True, "compile": False},
+    "fast": {"imgsz": 416, "precision": "bf16", "threads": None, "channels_last": True, "compile": True},
+}
+DEFAULT_PROFILE = "accurate"
+
+# --- Cropping ---
+CROP_PADDING = 0.0 # Fraction of the box width/height added on each side of every crop
+CROP_SQUARE = False # Expand crops to squares around the box center
+CROP_RESIZE = None # Resize crops so the longer side is this many pixels (None keeps the original size)
+RECROP_WORKERS = None # Processes for crop-only jobs from stored boxes (None = cpu_count)
+
+# --- Batch Pipeline ---
+PIPELINE_LOADER_WORKERS = 2 # Threads decoding images ahead of inference
+PIPELINE_WRITER_WORKERS = 2 # Threads cropping and JPEG-encoding results
+PIPELINE_QUEUE_SIZE = 16 # Images buffered between stages (each holds a full-resolution decoded frame)
+RESUME_BATCHES = True # Skip images the output folder's journal already records for the same model/threshold/class filter
+JOURNAL_FILENAME = ".cropvision_journal.jsonl" # Append-only progress journal written in the output folder
+JOURNAL_SYNC_EVERY = 50 # fsync the journal after this many images (flushed after every image)
+
+# --- Tiled Inference ---
+# Large images (aerial mosaics, scanned sheets) are cut into overlapping tiles run at native resolution,
+# so small objects survive; per-tile boxes are merged with class-aware NMS.
+TILED_INFERENCE = False
+TILE_MIN_IMAGE_SIDE = 2560 # Only images whose longer side is at least this are tiled
+TILE_SIZE = None # Tile side in pixels (None = the profile's model input size)
+TILE_OVERLAP = 0.2 # Fraction of a tile shared with its neighbour
+TILE_BATCH_SIZE = 8 # Tiles per forward pass
+TILE_FULL_FRAME = True # Also run the downscaled whole image, so objects larger than a tile are found
+TILE_NMS_IOU = 0.5 # Boxes of the same class overlapping more than this (IoU) are merged
+TILE_NMS_IOS = 0.8 # ...or whose intersection covers this much of the smaller box (objects cut at tile edges)
+
+# --- Watch Folder ---
+# New or re-written images under a watched source folder are detected and cropped as they arrive.
+WATCH_USE_EVENTS = True # Use filesystem events (watchdog package, if installed) instead of waiting for the next rescan
+WATCH_POLL_INTERVAL = 2.0 # Seconds between rescans without filesystem events
+WATCH_RESCAN_INTERVAL = 60.0 # Seconds between safety rescans with events (network shares may not deliver them)
+WATCH_SETTLE_SECONDS = 1.0 # A file must keep its size and mtime this long before it is read (partial writes)
+WATCH_MAX_BATCH = 64 # Images pushed through the batch pipeline per round, so new arrivals don't queue behind a backlog
+WATCH_PROCESS_EXISTING = True # Also process images already in the folder that the output journal doesn't list
+WATCH_RETRY_LIMIT = 3 # Attempts per file version whose detection or cropping failed (locked file, full disk...)
+WATCH_RETRY_DELAY = 10.0 # Seconds before a failed file is retried
+
+# --- Multi-process CPU Inference ---
+INFERENCE_PROCESSES = 1 # >1 shards CPU batch jobs across this many worker processes, each with its own model
+TORCH_THREADS_PER_PROCESS = None # None = cpu_count // INFERENCE_PROCESSES
+
+# --- Inference Scheduler ---
+# One thread per Detector runs all forward passes: interactive > prefetch > batch.
+SCHEDULER_MAX_BATCH = 16 # Queued requests of one priority merged into one call (micro-batching); batch requests always run whole
+SCHEDULER_MAX_WAIT_MS = 0 # How long a non-batch request may wait for others to micro-batch with (0 = never wait)
+SCHEDULER_STATS_WINDOW = 512 # Recent requests per priority used for wait-time stats
+
+# --- Inference Server ---
+SERVE_HOST = "127.0.0.1" # Local tools only; requests may name files on this host
+SERVE_PORT = 8765
+SERVE_MAX_BATCH = 8 # Concurrent requests coalesced into one forward pass
+SERVE_MAX_WAIT_MS = 10 # How long a request may wait for others to join its micro-batch
+SERVE_MAX_UPLOAD_BYTES = 64 * 1024 * 1024
+SERVE_ALLOWED_HOSTS = ("localhost", "127.0.0.1", "::1") # Host/Origin names answered (plus the bound host); stops browser pages and DNS rebinding
+SERVE_ALLOW_ANY_OUTPUT_DIR = False # Let /crop requests write anywhere; otherwise only inside the server's output folder
+
+# --- Speculative Detection ---
+PREFETCH_DETECTIONS = False # Detect the neighbours of the selected image in the background (GUI, opt-in)
+PREFETCH_AHEAD = 3 # Following images (in view order) detected speculatively
+PREFETCH_BEHIND = 1 # Preceding images detected speculatively
+PREFETCH_IDLE_MS = 400 # Selection must stay put this long before prefetching starts
+
+# --- Directory Scanning ---
+SCAN_WORKERS = 8 # Directories listed in parallel (helps most on network shares)
+SCAN_BATCH_SIZE = 500 # Paths per incremental batch reported while scanning
+
+# --- File Catalog ---
+USE_FILE_CATALOG = True # Remember folder contents between sessions and only rescan changed directories
+FILE_CATALOG_PATH = os.path.join(CACHE_DIR, "catalog.sqlite3")
+
+# --- Results Store ---
+USE_RESULTS_STORE = True # Persist every raw prediction (keyed by image content hash + model) for re-use and export
+RESULTS_STORE_PATH = os.path.join(CACHE_DIR, "results.sqlite3")
+
+# --- Thumbnails ---
+THUMBNAIL_SIZE = 100 # Pixels (square bounding box)
+THUMBNAIL_WORKERS = 4 # Threads generating thumbnails in the background
+THUMBNAIL_CACHE_MAX_BYTES = 512 * 1024 * 1024 # On-disk thumbnail cache budget under CACHE_DIR
+THUMBNAIL_MEMORY_BUDGET = 64 * 1024 * 1024 # Decoded thumbnail pixmaps kept in memory (LRU)
+THUMBNAIL_PREFETCH_ROWS = 40 # Thumbnails requested beyond the visible rows while scrolling
+THUMBNAIL_PAGINATED = False # True = Previous/Next pages of DEFAULT_ITEMS_PER_PAGE; False = one scrolling grid
+
+# --- Command Line ---
+CLI_PROGRESS_INTERVAL = 1.0 # Seconds between JSON progress events in `python -m crop_vision crop`
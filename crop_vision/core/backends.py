@@ -0,0 +1,80 @@
+import os
+import logging
+from .. import config # Import config from the parent package
+from . import model_meta
+
+log = logging.getLogger(__name__)
+
+BACKEND_TORCH = "torch"
+BACKEND_ONNX = "onnx"
+BACKEND_OPENVINO = "openvino"
+BACKENDS = (BACKEND_TORCH, BACKEND_ONNX, BACKEND_OPENVINO)
+
+_EXPORT_SUFFIX = {BACKEND_ONNX: ".onnx", BACKEND_OPENVINO: "_openvino_model"}
+
+
+def is_exported(model_path):
+    """True if model_path already is an ONNX file or OpenVINO model folder."""
+    return backend_of(model_path) != BACKEND_TORCH
+
+
+def backend_of(model_path):
+    """Backend that runs model_path: onnx/openvino for exports, torch otherwise."""
+    path = str(model_path).rstrip("/\\")
+    for backend, suffix in _EXPORT_SUFFIX.items():
+        if path.endswith(suffix):
+            return backend
+    return BACKEND_TORCH
+
+
+def exported_model_path(weights_path, backend, imgsz, in_cache=False):
+    """
+    Where the export of weights_path for backend/imgsz lives: next to the
+    weights (or under CACHE_DIR/exports), named by the weights' content hash
+    and input size, so retrained weights or another imgsz get a fresh export.
+    """
+    file_hash = model_meta.model_file_hash(weights_path)
+    stem = os.path.splitext(os.path.basename(weights_path))[0]
+    folder = os.path.join(config.CACHE_DIR, "exports") if in_cache else os.path.dirname(os.path.abspath(weights_path))
+    return os.path.join(folder, f"{stem}.{(file_hash or 'nohash')[:12]}.{imgsz}{_EXPORT_SUFFIX[backend]}")
+
+
+def ensure_exported(model_name, backend, imgsz, progress_callback=None):
+    """
+    Returns the path of model_name exported for backend at input size imgsz,
+    exporting it through ultralytics on first use. Already-exported models and
+    the torch backend are returned unchanged. Imports ultralytics (and torch).
+    """
+    if backend == BACKEND_TORCH or is_exported(model_name):
+        return model_name
+    if backend not in _EXPORT_SUFFIX:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    report = progress_callback or (lambda _message: None)
+
+    from ultralytics import YOLO
+    torch_model = None
+    weights_path = model_name
+    if not os.path.isfile(weights_path):
+        torch_model = YOLO(model_name) # Resolves (downloads) named models
+        weights_path = getattr(torch_model, "ckpt_path", None) or model_name
+
+    for in_cache in (False, True):
+        target = exported_model_path(weights_path, backend, imgsz, in_cache=in_cache)
+        if os.path.exists(target):
+            log.info(f"Using cached {backend} export {target}")
+            return target
+
+    report(f"Exporting to {backend} (one-time)...")
+    log.info(f"Exporting '{weights_path}' to {backend} at imgsz={imgsz}...")
+    torch_model = torch_model or YOLO(weights_path)
+    exported = torch_model.export(format=backend, imgsz=imgsz, dynamic=True, verbose=False)
+    for in_cache in (False, True):
+        target = exported_model_path(weights_path, backend, imgsz, in_cache=in_cache)
+        try:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(exported, target)
+            log.info(f"Cached {backend} export at {target}")
+            return target
+        except OSError as e:
+            log.warning(f"Could not cache {backend} export at {target}: {e}")
+    return exported
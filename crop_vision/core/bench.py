@@ -0,0 +1,88 @@
+import time
+import logging
+import numpy as np
+from .. import config # Import config from the parent package
+from . import image_utils
+from .detector import Detector
+
+log = logging.getLogger(__name__)
+
+
+def _profile_run(model_name, image_paths, profile, threshold, class_filter, backend, warmup):
+    """
+    Loads the model with one profile and times detection on every image.
+    Images are decoded up front the way batch jobs decode them for this
+    profile's input size (see _decode), so only inference is timed. The model
+    is released afterwards, so later profiles don't run beside earlier ones.
+    Returns (latencies, counts).
+    """
+    detector = Detector()
+    try:
+        success, msg = detector.init_model(model_name, backend=backend, profile=profile)
+        if not success:
+            raise RuntimeError(msg)
+        detector.results_store = None # Every image must reach the model
+        images = [(path, *_decode(path, detector.input_size)) for path in image_paths]
+        for path, image, original_size in images[:warmup]:
+            detector.detect_objects(path, threshold, class_filter, image=image, original_size=original_size)
+
+        latencies, counts = [], []
+        for path, image, original_size in images:
+            detector.clear_cache()
+            started = time.perf_counter()
+            detections = detector.detect_objects(path, threshold, class_filter, image=image,
+                                                 original_size=original_size)
+            latencies.append(time.perf_counter() - started)
+            counts.append(len(detections))
+        return np.array(latencies), np.array(counts)
+    finally:
+        detector.close()
+
+
+def _decode(path, input_size):
+    """(image, original size or None) as BatchPipeline feeds it to the model: reduced to input_size with REDUCED_DECODE."""
+    if config.REDUCED_DECODE and input_size:
+        if config.DECODE_ONCE:
+            return image_utils.reduce_for_inference(image_utils.load_image(path), input_size)
+        return image_utils.load_for_inference(path, input_size)
+    return image_utils.load_image(path), None
+
+
+def compare_profiles(model_name, image_paths, profiles=None, threshold=config.DEFAULT_CONF_THRESHOLD,
+                     class_filter=None, backend=None, warmup=2, on_profile=None):
+    """
+    Runs the same images through each performance profile and reports speed
+    against accuracy. Each profile decodes the images up front at its own input
+    size, so only inference is timed. Deltas are relative to the first profile (the baseline):
+    detection_delta is the change in total detections, and
+    images_changed the number of images whose detection count differs.
+    on_profile(report) is called after each profile. Returns the reports.
+    """
+    profiles = list(profiles or config.PERFORMANCE_PROFILES)
+    reports = []
+    baseline = None
+    for profile in profiles:
+        log.info(f"Benchmarking profile '{profile}' on {len(image_paths)} images...")
+        latencies, counts = _profile_run(model_name, image_paths, profile, threshold, class_filter, backend, warmup)
+        report = {
+            "profile": profile,
+            "settings": config.PERFORMANCE_PROFILES.get(profile),
+            "images": len(image_paths),
+            "mean_ms": round(float(latencies.mean()) * 1000, 2) if len(latencies) else None,
+            "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2) if len(latencies) else None,
+            "p90_ms": round(float(np.percentile(latencies, 90)) * 1000, 2) if len(latencies) else None,
+            "detections": int(counts.sum()),
+        }
+        if baseline is None:
+            baseline = (report, counts)
+        else:
+            base_report, base_counts = baseline
+            report["baseline"] = base_report["profile"]
+            report["speedup"] = (round(base_report["mean_ms"] / report["mean_ms"], 2)
+                                 if report["mean_ms"] else None)
+            report["detection_delta"] = report["detections"] - base_report["detections"]
+            report["images_changed"] = int(np.count_nonzero(counts != base_counts))
+        reports.append(report)
+        if on_profile:
+            on_profile(report)
+    return reports
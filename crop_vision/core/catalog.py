@@ -0,0 +1,215 @@
+import os
+import sqlite3
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .. import config # Import config from the parent package
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS roots (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    id INTEGER PRIMARY KEY,
+    root_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    parent_id INTEGER,
+    mtime_ns INTEGER NOT NULL,
+    UNIQUE (root_id, path)
+);
+CREATE TABLE IF NOT EXISTS files (
+    dir_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (dir_id, name)
+) WITHOUT ROWID;
+"""
+
+
+class FileCatalog:
+    """
+    Persistent SQLite catalog of the images under one or more source roots.
+    Stores every directory with its mtime and every image with size and mtime.
+    sync() only lists directories whose mtime changed since the last scan
+    (adding or removing an entry changes the parent directory's mtime), so
+    re-opening a large, mostly unchanged dataset costs one stat per directory
+    instead of a full tree walk. Files modified in place without being
+    re-created keep their old size/mtime until their directory changes.
+    One instance per thread: the SQLite connection is not shared.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or config.FILE_CATALOG_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def has_root(self, root):
+        return self._root_id(root, create=False) is not None
+
+    def paths(self, root):
+        """
+        Returns all catalogued image paths under root, folder by folder, then by
+        file name (ImageIndex's name order). SQLite reads them in that order
+        straight from the (root_id, path) and (dir_id, name) indexes, no sort.
+        """
+        root_id = self._root_id(root, create=False)
+        if root_id is None:
+            return []
+        rows = self.conn.execute(
+            "SELECT d.path, f.name FROM dirs d JOIN files f ON f.dir_id = d.id WHERE d.root_id = ? "
+            "ORDER BY d.path, f.name", (root_id,))
+        return [os.path.join(dir_path, name) for dir_path, name in rows]
+
+    def count(self, root):
+        root_id = self._root_id(root, create=False)
+        if root_id is None:
+            return 0
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM files f JOIN dirs d ON d.id = f.dir_id WHERE d.root_id = ?",
+            (root_id,)).fetchone()[0]
+
+    def sync(self, root, on_added=None, on_removed=None, workers=config.SCAN_WORKERS, is_cancelled=None):
+        """
+        Brings the catalog for root up to date with the filesystem.
+        Unchanged directories (same mtime) are not listed again; changed ones
+        are listed in parallel and their file deltas applied.
+        on_added(paths) / on_removed(paths), if given, are called with each
+        batch of newly found / no longer present images.
+        Returns (added, removed) counts. A cancelled sync leaves the catalog
+        consistent but possibly incomplete; the next sync picks up the rest.
+        """
+        root = os.path.abspath(root)
+        is_cancelled = is_cancelled or (lambda: False)
+        root_id = self._root_id(root, create=True)
+
+        # Snapshot of what we know, so worker threads never touch the connection
+        known = {path: (dir_id, mtime_ns) for dir_id, path, mtime_ns in self.conn.execute(
+            "SELECT id, path, mtime_ns FROM dirs WHERE root_id = ?", (root_id,))}
+        id_to_path = {dir_id: path for path, (dir_id, _) in known.items()}
+        children = {}
+        for dir_id, parent_id in self.conn.execute("SELECT id, parent_id FROM dirs WHERE root_id = ?", (root_id,)):
+            if parent_id is not None:
+                children.setdefault(parent_id, []).append(id_to_path[dir_id])
+
+        added = 0
+        removed = 0
+        seen = set()
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="cropvision-catalog") as executor:
+            pending = {executor.submit(_probe_dir, root, None, known.get(root), children)}
+            try:
+                while pending and not is_cancelled():
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    with self.conn:
+                        for future in done:
+                            dir_path, parent_path, mtime_ns, listing, subdirs = future.result()
+                            if mtime_ns is None:
+                                continue # Vanished or unreadable; cleaned up below as unseen
+                            seen.add(dir_path)
+                            for subdir in subdirs:
+                                pending.add(executor.submit(_probe_dir, subdir, dir_path, known.get(subdir), children))
+                            if listing is None:
+                                continue # Unchanged directory
+                            new_paths, gone_paths = self._apply_listing(root_id, dir_path, parent_path, mtime_ns, listing)
+                            added += len(new_paths)
+                            removed += len(gone_paths)
+                            if new_paths and on_added:
+                                on_added(new_paths)
+                            if gone_paths and on_removed:
+                                on_removed(gone_paths)
+            finally:
+                for future in pending:
+                    future.cancel()
+
+        if is_cancelled():
+            log.info(f"Catalog sync of '{root}' cancelled (+{added}/-{removed} so far).")
+            return added, removed
+
+        # Directories we knew about but didn't reach are gone
+        with self.conn:
+            for path in set(known) - seen:
+                dir_id = known[path][0]
+                gone_paths = [os.path.join(path, name) for (name,) in self.conn.execute(
+                    "SELECT name FROM files WHERE dir_id = ?", (dir_id,))]
+                self.conn.execute("DELETE FROM files WHERE dir_id = ?", (dir_id,))
+                self.conn.execute("DELETE FROM dirs WHERE id = ?", (dir_id,))
+                removed += len(gone_paths)
+                if gone_paths and on_removed:
+                    on_removed(gone_paths)
+        log.info(f"Catalog sync of '{root}': +{added} / -{removed} images, {len(seen)} directories.")
+        return added, removed
+
+    def _apply_listing(self, root_id, dir_path, parent_path, mtime_ns, listing):
+        """Stores a fresh directory listing. Returns (new image paths, removed image paths)."""
+        parent_id = None
+        if parent_path is not None:
+            row = self.conn.execute("SELECT id FROM dirs WHERE root_id = ? AND path = ?", (root_id, parent_path)).fetchone()
+            parent_id = row[0] if row else None
+        self.conn.execute(
+            "INSERT INTO dirs (root_id, path, parent_id, mtime_ns) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (root_id, path) DO UPDATE SET parent_id = excluded.parent_id, mtime_ns = excluded.mtime_ns",
+            (root_id, dir_path, parent_id, mtime_ns))
+        dir_id = self.conn.execute("SELECT id FROM dirs WHERE root_id = ? AND path = ?", (root_id, dir_path)).fetchone()[0]
+
+        stored = {name: (size, mtime) for name, size, mtime in self.conn.execute(
+            "SELECT name, size, mtime_ns FROM files WHERE dir_id = ?", (dir_id,))}
+        gone = [name for name in stored if name not in listing]
+        fresh = [(dir_id, name, size, mtime) for name, (size, mtime) in listing.items() if stored.get(name) != (size, mtime)]
+        self.conn.executemany("DELETE FROM files WHERE dir_id = ? AND name = ?", [(dir_id, name) for name in gone])
+        self.conn.executemany("INSERT OR REPLACE INTO files (dir_id, name, size, mtime_ns) VALUES (?, ?, ?, ?)", fresh)
+        new_paths = [os.path.join(dir_path, name) for name in listing if name not in stored]
+        return new_paths, [os.path.join(dir_path, name) for name in gone]
+
+    def _root_id(self, root, create):
+        root = os.path.abspath(root)
+        row = self.conn.execute("SELECT id FROM roots WHERE path = ?", (root,)).fetchone()
+        if row:
+            return row[0]
+        if not create:
+            return None
+        with self.conn:
+            return self.conn.execute("INSERT INTO roots (path) VALUES (?)", (root,)).lastrowid
+
+
+def _probe_dir(dir_path, parent_path, known_entry, children):
+    """
+    Runs on a worker thread. Stats dir_path; if its mtime matches known_entry
+    the catalogued subdirectories are reused, otherwise it is listed.
+    Returns (dir_path, parent_path, mtime_ns, listing, subdirs), where listing
+    maps image name -> (size, mtime_ns), or is None for an unchanged directory.
+    """
+    try:
+        mtime_ns = os.stat(dir_path).st_mtime_ns
+    except OSError as e:
+        log.warning(f"Could not stat directory {dir_path}: {e}")
+        return dir_path, parent_path, None, None, []
+
+    if known_entry is not None and known_entry[1] == mtime_ns:
+        return dir_path, parent_path, mtime_ns, None, children.get(known_entry[0], [])
+
+    listing = {}
+    subdirs = []
+    try:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            subdirs.append(entry.path)
+                    elif entry.name.lower().endswith(config.SUPPORTED_EXTENSIONS):
+                        st = entry.stat()
+                        listing[entry.name] = (st.st_size, st.st_mtime_ns)
+                except OSError:
+                    continue
+    except OSError as e:
+        log.warning(f"Could not list directory {dir_path}: {e}")
+        return dir_path, parent_path, None, None, []
+    return dir_path, parent_path, mtime_ns, listing, subdirs
@@ -0,0 +1,90 @@
+import numpy as np
+
+
+class Detections:
+    """
+    Array-backed detection results for one image.
+    boxes is an (N, 4) xyxy float32 array, scores (N,) float32, class_ids (N,) int32.
+    Also readable like the legacy {scores, labels, boxes} dict, so existing
+    code doing detections['boxes'] keeps working. len() is the number of boxes.
+    image_size is the (width, height) of the source image, when known.
+    """
+    __slots__ = ('boxes', 'scores', 'class_ids', 'names', 'image_size', '_labels')
+
+    KEYS = ('scores', 'labels', 'boxes')
+
+    def __init__(self, boxes, scores, class_ids, names=None, image_size=None):
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        self.class_ids = np.asarray(class_ids, dtype=np.int32).reshape(-1)
+        self.names = names if names is not None else {}
+        self.image_size = image_size
+        self._labels = None
+
+    @classmethod
+    def empty(cls, names=None, image_size=None):
+        return cls(np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32),
+                   np.empty(0, dtype=np.int32), names, image_size)
+
+    @property
+    def labels(self):
+        """Class names per box, built on first access."""
+        if self._labels is None:
+            self._labels = [self.names.get(c, f"ID_{c}") for c in self.class_ids.tolist()]
+        return self._labels
+
+    def filter(self, threshold, class_ids=None):
+        """
+        Returns a new Detections with score >= threshold and, if class_ids is
+        given (an iterable of ints), only those classes.
+        """
+        mask = self.scores >= threshold
+        if class_ids is not None:
+            mask &= np.isin(self.class_ids, np.fromiter(class_ids, dtype=np.int32))
+        return Detections(self.boxes[mask], self.scores[mask], self.class_ids[mask], self.names, self.image_size)
+
+    def rescaled(self, image_size):
+        """
+        Returns these detections with boxes mapped from self.image_size to
+        image_size (width, height), e.g. from a reduced-resolution decode back
+        to the original image. Unchanged if either size is unknown or equal.
+        """
+        if not self.image_size or not image_size or tuple(self.image_size) == tuple(image_size):
+            return self
+        sx = image_size[0] / self.image_size[0]
+        sy = image_size[1] / self.image_size[1]
+        boxes = self.boxes * np.array([sx, sy, sx, sy], dtype=np.float32)
+        return Detections(boxes, self.scores, self.class_ids, self.names, tuple(image_size))
+
+    def to_dict(self):
+        """Plain {scores, labels, boxes} dict of Python lists (JSON-serializable)."""
+        return {
+            'scores': self.scores.tolist(),
+            'labels': list(self.labels),
+            'boxes': self.boxes.tolist()
+        }
+
+    # --- dict-compatible view ---
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.KEYS else default
+
+    def keys(self):
+        return list(self.KEYS)
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.KEYS]
+
+    def __repr__(self):
+        return f"Detections(n={len(self)})"
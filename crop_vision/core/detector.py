@@ -1,11 +1,46 @@
 import os
-import torch
-from ultralytics import YOLO
+import threading
+from collections import OrderedDict
+import numpy as np
 from PIL import Image
 import logging
+from .. import config # Import config from the parent package
+from .detections import Detections
+from . import model_meta, backends, image_utils, tiling
+from .scheduler import InferenceScheduler, PRIORITY_INTERACTIVE, PRIORITY_BATCH
 
 log = logging.getLogger(__name__)
 
+
+def resolve_profile(name=None):
+    """Returns (name, settings) of a config.PERFORMANCE_PROFILES entry, falling back to DEFAULT_PROFILE."""
+    name = name or config.DEFAULT_PROFILE
+    if name not in config.PERFORMANCE_PROFILES:
+        log.warning(f"Unknown performance profile '{name}', using '{config.DEFAULT_PROFILE}'.")
+        name = config.DEFAULT_PROFILE
+    return name, config.PERFORMANCE_PROFILES[name]
+
+
+def run_identity(model_name, profile=None, tiled=None, backend=None):
+    """
+    Identifies model_name's predictions under a profile, for the results store
+    and batch journals: weights and input size, plus the precision, backend and
+    tiling wherever they differ from fp32 / torch / untiled (so default
+    identities stay the same), since each of them changes the predictions.
+    """
+    _profile, settings = resolve_profile(profile)
+    imgsz = settings.get("imgsz", 640)
+    identity = model_meta.model_identity(model_name, imgsz)
+    if settings.get("precision", "fp32") != "fp32":
+        identity += f"~{settings['precision']}"
+    backend = backend or config.INFERENCE_BACKEND
+    if backend != backends.BACKEND_TORCH:
+        identity += f"#{backend}"
+    if config.TILED_INFERENCE if tiled is None else tiled:
+        identity += tiling.identity_suffix(config.TILE_SIZE or imgsz, config.TILE_OVERLAP)
+    return identity
+
+
 class Detector:
     """Encapsulates the YOLO model and detection logic."""
 
@@ -13,38 +48,140 @@ class Detector:
         self.model = None
         self.device = None
         self.class_names = []
+        self.model_name = None # As passed to init_model, so worker processes can load the same model
+        self.model_id = None # Identifies the loaded model in prediction cache keys
+        self.backend = None # Inference runtime actually in use (see backends.BACKENDS)
+        self.profile = None # Name of the config.PERFORMANCE_PROFILES entry in use
+        self.input_size = None # Model input size (imgsz) of the profile in use
+        self.tiled = False # Tiled inference for large images (see config.TILED_INFERENCE)
+        self.tile_size = None
+        self._predict_kwargs = {"verbose": False} # Passed to every model call
+        self._autocast_dtype = None # torch dtype for CPU autocast (bf16 profiles)
+        self.model_identity = None # Identifies the weights across runs (name + content hash) in the results store
+        self.results_store = None # ResultsStore persisting every raw prediction, if enabled
 
-    def init_model(self, model_name_or_path):
+        # Unfiltered Detections per image, so threshold/class
+        # changes can be re-applied without another forward pass.
+        self._prediction_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Every forward pass goes through the scheduler: the model is shared by
+        # GUI, prefetch and batch threads, and interactive requests go first.
+        self.scheduler = InferenceScheduler(self._predict_now)
+        self._class_id_lookup = {} # lower-cased class filter -> frozenset of class ids
+
+    def init_model(self, model_name_or_path, torch_threads=None, progress_callback=None, backend=None, profile=None,
+                   tiled=None):
         """
         Loads a YOLO model, moves it to CPU/GPU, and performs a dummy inference.
+        torch and ultralytics are imported here rather than at module import,
+        so the GUI can start without paying for them.
+        backend (default config.INFERENCE_BACKEND) selects the runtime on CPU:
+        "onnx"/"openvino" export the weights once (cached next to them) and run
+        the export through ultralytics, which returns the same results.
+        profile (default config.DEFAULT_PROFILE) names a config.PERFORMANCE_PROFILES
+        entry: input size, precision, threads, channels_last and torch.compile.
+        torch_threads, if given, sets torch's intra-op thread count for this
+        process (overriding the profile's).
+        tiled (default config.TILED_INFERENCE) runs images larger than
+        config.TILE_MIN_IMAGE_SIDE as overlapping tiles (see _detect_tiled).
+        progress_callback(message), if given, is called as each loading stage starts.
         Returns (success, message_or_error).
         """
+        report = progress_callback or (lambda _message: None)
+        self._unload() # Never hold the old and the new model at once
+        if self.scheduler.closed:
+            self.scheduler = InferenceScheduler(self._predict_now)
         try:
+            report("Importing PyTorch...")
+            import torch
+            from ultralytics import YOLO
+
+            profile, settings = resolve_profile(profile)
+            threads = torch_threads or settings.get("threads")
+            if threads:
+                torch.set_num_threads(int(threads))
             if torch.cuda.is_available():
                 self.device = torch.device("cuda")
             else:
                 self.device = torch.device("cpu")
-            log.info(f"Attempting to load model '{model_name_or_path}' on {self.device}...")
+            log.info(f"Attempting to load model '{model_name_or_path}' on {self.device} (profile '{profile}')...")
 
-            self.model = YOLO(model_name_or_path)
-            self.model.to(self.device)
+            backend = backend or config.INFERENCE_BACKEND
+            if backend != backends.BACKEND_TORCH and self.device.type != "cpu":
+                log.info(f"Ignoring the {backend} backend on {self.device}; it is meant for CPU-only hosts.")
+                backend = backends.BACKEND_TORCH
+            imgsz = settings.get("imgsz", 640)
+            model_path = backends.ensure_exported(model_name_or_path, backend, imgsz, report)
+
+            report(f"Loading weights on {self.device}...")
+            self._predict_kwargs = {"verbose": False, "imgsz": imgsz}
+            self._autocast_dtype = None
+            if backends.is_exported(model_path):
+                self.model = YOLO(model_path, task="detect")
+            else:
+                self.model = YOLO(model_path)
+                self.model.to(self.device)
+                self._apply_torch_settings(torch, settings)
+            self.backend = backends.backend_of(model_path)
+            self.profile = profile
+            self.input_size = imgsz
+            self.tiled = config.TILED_INFERENCE if tiled is None else bool(tiled)
+            self.tile_size = config.TILE_SIZE or imgsz
 
             # Perform a dummy inference
+            report("Warming up...")
             dummy_img = Image.new('RGB', (64, 64), color='red')
-            results = self.model(dummy_img, verbose=False)
+            try:
+                results = self._predict([dummy_img])
+            except Exception as e:
+                if not settings.get("compile"):
+                    raise
+                # torch.compile is the least portable setting; keep the profile's other settings
+                log.warning(f"torch.compile failed ({e}); running the model uncompiled.")
+                self.model = YOLO(model_path)
+                self.model.to(self.device)
+                self._apply_torch_settings(torch, {**settings, "compile": False})
+                results = self._predict([dummy_img])
 
             self.class_names = list(results[0].names.values()) if results and results[0].names else []
-            log.info(f"Model '{model_name_or_path}' loaded successfully on {self.device}.")
+            self.model_name = model_name_or_path
+            self.model_id = f"{os.path.abspath(model_path) if os.path.exists(model_path) else model_path}@{self.device}/{profile}{'/tiled' if self.tiled else ''}"
+            self.clear_cache()
+            model_meta.save_class_names(model_name_or_path, self.class_names)
+            self.model_identity = run_identity(model_name_or_path, profile, self.tiled, self.backend)
+            if config.USE_RESULTS_STORE and self.results_store is None:
+                from .results_store import ResultsStore
+                self.results_store = ResultsStore()
+            log.info(f"Model '{model_name_or_path}' loaded successfully on {self.device} ({self.backend}, {profile}).")
             log.debug(f"Model classes: {self.class_names}")
 
-            return True, f"Model '{model_name_or_path}' loaded on {self.device}."
+            return True, f"Model '{model_name_or_path}' loaded on {self.device} ({self.backend}, profile '{profile}')."
         except Exception as e:
-            self.model = None
-            self.device = None
-            self.class_names = []
+            self._unload()
             log.error(f"Error loading model: {e}", exc_info=True)
             return False, str(e)
 
+    def close(self):
+        """
+        Releases the model: stops the scheduler's thread (which holds this
+        detector, and so the model, alive) and drops the model and cached
+        predictions. init_model() can load a model again afterwards.
+        """
+        self.scheduler.close()
+        self._unload()
+
+    def _unload(self):
+        self.model = None
+        self.device = None
+        self.class_names = []
+        self.model_name = None
+        self.model_id = None
+        self.backend = None
+        self.profile = None
+        self.input_size = None
+        self.model_identity = None
+        self.clear_cache()
+
     def is_loaded(self):
         """Checks if a model is currently loaded."""
         return self.model is not None
@@ -53,52 +190,319 @@ class Detector:
         """Returns the list of class names from the loaded model."""
         return self.class_names
 
-    def detect_objects(self, image_path, threshold, target_class=None):
+    def clear_cache(self):
+        """Drops all cached raw predictions and resolved class filters."""
+        with self._cache_lock:
+            self._prediction_cache.clear()
+        self._class_id_lookup = {}
+
+    def detect_objects(self, image_path, threshold, target_class=None, image=None, original_size=None,
+                       priority=PRIORITY_INTERACTIVE):
         """
         Runs YOLO inference, filters by confidence and optional class.
-        Returns {scores, labels, boxes}.
+        Raw predictions are cached (and persisted to the results store, if
+        enabled), so repeated calls for the same unchanged image only re-run
+        the filtering. If image (a decoded RGB PIL image of
+        image_path) is given, it is fed to the model instead of the path;
+        original_size gives the file's (width, height) when image is a
+        reduced-resolution decode, and boxes are mapped back to it. Without
+        image, config.REDUCED_DECODE decodes the file at reduced resolution.
+        priority orders the forward pass in the InferenceScheduler.
+        Returns a Detections (readable as {scores, labels, boxes}).
         Raises ValueError if model not loaded or inference error.
         """
         if not self.is_loaded():
             raise ValueError("Model not initialized. Call init_model() first.")
 
         log.debug(f"Running detection on '{image_path}' with threshold {threshold} and class '{target_class}'")
+        key = self._cache_key(image_path)
+        raw = self._cache_get(key)
+        if raw is None:
+            raw = self._store_get(image_path)
+            if raw is None:
+                try:
+                    if self._use_tiles(image_path, image, original_size):
+                        raw = self._detect_tiled(image_path, image, original_size, priority)
+                    else:
+                        model_input, original_size = self._prepare_input(image_path, image, original_size)
+                        results = self._predict([model_input], priority)
+                        raw = self._extract_raw(results[0] if results else None).rescaled(original_size)
+                except Exception as e:
+                    log.error(f"Error during model inference for {image_path}: {e}", exc_info=True)
+                    raise RuntimeError(f"Model inference failed for {os.path.basename(image_path)}: {e}")
+
+                self._store_put([(image_path, raw)])
+            self._cache_put(key, raw)
+
+        detections = self._filter_raw(raw, threshold, target_class)
+        log.debug(f"Found {len(detections['boxes'])} objects matching criteria.")
+        return detections
+
+    def detect_batch(self, image_paths, threshold, target_class=None, batch_size=config.DEFAULT_BATCH_SIZE, images=None,
+                     original_sizes=None, priority=PRIORITY_BATCH):
+        """
+        Runs YOLO inference on a list of images, batch_size images per forward pass.
+        Images with a cached or stored prediction are not sent to the model again.
+        images, if given, holds a decoded RGB PIL image per path (same order)
+        to feed the model instead of the paths; original_sizes, if given, the
+        files' (width, height) for images decoded at reduced resolution.
+        priority (batch by default) orders the forward passes in the InferenceScheduler.
+        Returns a list of Detections, one per input path, in input order.
+        Raises ValueError if model not loaded, RuntimeError if a batch fails.
+        """
+        if not self.is_loaded():
+            raise ValueError("Model not initialized. Call init_model() first.")
+
+        keys = [self._cache_key(path) for path in image_paths]
+        raws = [self._cache_get(key) for key in keys]
+        for i, raw in enumerate(raws):
+            if raw is None:
+                raws[i] = self._store_get(image_paths[i])
+                if raws[i] is not None:
+                    self._cache_put(keys[i], raws[i])
+        pending = [i for i, raw in enumerate(raws) if raw is None]
+
+        # Large images with tiling on: each one is its own batch of tiles
+        for i in pending:
+            image = images[i] if images is not None else None
+            original_size = original_sizes[i] if original_sizes is not None else None
+            if not self._use_tiles(image_paths[i], image, original_size):
+                continue
+            try:
+                raws[i] = self._detect_tiled(image_paths[i], image, original_size, priority)
+            except Exception as e:
+                log.error(f"Error during tiled inference for {image_paths[i]}: {e}", exc_info=True)
+                raise RuntimeError(f"Model inference failed for {os.path.basename(image_paths[i])}: {e}")
+            self._cache_put(keys[i], raws[i])
+            self._store_put([(image_paths[i], raws[i])])
+        pending = [i for i in pending if raws[i] is None]
+
+        batch_size = max(1, int(batch_size))
+        for start in range(0, len(pending), batch_size):
+            indices = pending[start:start + batch_size]
+            chunk = [image_paths[i] for i in indices]
+            log.debug(f"Running batched detection on {len(chunk)} images (threshold {threshold}, class '{target_class}')")
+            try:
+                prepared = [self._prepare_input(image_paths[i], images[i] if images is not None else None,
+                                                original_sizes[i] if original_sizes is not None else None)
+                            for i in indices]
+                results = self._predict([model_input for model_input, _ in prepared], priority)
+            except Exception as e:
+                log.error(f"Error during batched inference starting at {chunk[0]}: {e}", exc_info=True)
+                raise RuntimeError(f"Model inference failed for batch starting at {os.path.basename(chunk[0])}: {e}")
+
+            if not results or len(results) != len(chunk):
+                raise RuntimeError(f"Model returned {len(results) if results else 0} results for a batch of {len(chunk)} images.")
+
+            for i, pred, (_, original_size) in zip(indices, results, prepared):
+                raws[i] = self._extract_raw(pred).rescaled(original_size)
+                self._cache_put(keys[i], raws[i])
+            self._store_put([(image_paths[i], raws[i]) for i in indices])
+
+        return [self._filter_raw(raw, threshold, target_class) for raw in raws]
+
+    def detect_image(self, image, threshold, target_class=None, original_size=None, priority=PRIORITY_INTERACTIVE):
+        """
+        Runs detection on an in-memory RGB PIL image that has no file identity
+        (e.g. uploaded bytes), bypassing the prediction cache and results store.
+        original_size maps boxes back when image is a reduced-resolution decode.
+        Returns a Detections.
+        """
+        if not self.is_loaded():
+            raise ValueError("Model not initialized. Call init_model() first.")
+        try:
+            results = self._predict([image], priority)
+        except Exception as e:
+            log.error(f"Error during model inference on an in-memory image: {e}", exc_info=True)
+            raise RuntimeError(f"Model inference failed: {e}")
+        raw = self._extract_raw(results[0] if results else None).rescaled(original_size)
+        return self._filter_raw(raw, threshold, target_class)
+
+    def filter_cached(self, image_path, threshold, target_class=None):
+        """
+        Re-filters the cached raw prediction for image_path without running the model.
+        Returns a Detections, or None if the image has no cached prediction.
+        """
+        if not self.is_loaded():
+            return None
+        raw = self._cache_get(self._cache_key(image_path))
+        if raw is None:
+            return None
+        return self._filter_raw(raw, threshold, target_class)
+
+    def _cache_key(self, image_path):
+        """Cache key: absolute path + mtime + model identity. None if the file can't be stat'ed."""
+        try:
+            st = os.stat(image_path)
+        except OSError:
+            return None
+        return (os.path.abspath(image_path), st.st_mtime_ns, self.model_id)
+
+    def _cache_get(self, key):
+        if key is None:
+            return None
+        with self._cache_lock:
+            raw = self._prediction_cache.get(key)
+            if raw is not None:
+                self._prediction_cache.move_to_end(key)
+            return raw
+
+    def _cache_put(self, key, raw):
+        if key is None or config.PREDICTION_CACHE_SIZE <= 0:
+            return
+        with self._cache_lock:
+            self._prediction_cache[key] = raw
+            self._prediction_cache.move_to_end(key)
+            while len(self._prediction_cache) > config.PREDICTION_CACHE_SIZE:
+                self._prediction_cache.popitem(last=False)
+
+    def _prepare_input(self, image_path, image=None, original_size=None):
+        """
+        Returns (model input, original size to map boxes back to, or None):
+        the given image, or with config.REDUCED_DECODE a reduced-resolution
+        decode of image_path, or else the path for ultralytics to decode.
+        """
+        if image is not None:
+            return image, original_size
+        if config.REDUCED_DECODE and self.input_size:
+            return image_utils.load_for_inference(image_path, self.input_size)
+        return image_path, None
+
+    def _use_tiles(self, image_path, image=None, original_size=None):
+        """True if tiling is on and the image's longer side reaches config.TILE_MIN_IMAGE_SIDE."""
+        if not self.tiled:
+            return False
+        size = original_size or (image.size if image is not None else None)
+        if size is None:
+            try:
+                with Image.open(image_path) as img: # Header only
+                    size = img.size
+            except OSError:
+                return False
+        return max(size) >= config.TILE_MIN_IMAGE_SIDE
+
+    def _detect_tiled(self, image_path, image=None, original_size=None, priority=PRIORITY_INTERACTIVE):
+        """
+        Raw Detections of a large image from overlapping tile_size tiles at
+        native resolution, config.TILE_BATCH_SIZE tiles per forward pass.
+        Tiles are cut from image if it is a full-size decode, otherwise read
+        through a RegionReader, so tiled/uncompressed TIFFs are never decoded whole. With config.TILE_FULL_FRAME the downscaled
+        whole image is run too, for objects larger than a tile. Boxes from
+        all passes are merged with class-aware NMS (tiling.merge_boxes).
+        """
+        full_image = image if image is not None and original_size is None else None
+        reader = None if full_image is not None else image_utils.RegionReader(image_path)
+        width, height = full_image.size if full_image is not None else reader.size
+        read = full_image.crop if full_image is not None else reader.read
+        windows = tiling.tile_windows(width, height, self.tile_size, config.TILE_OVERLAP)
+        log.debug(f"Tiled detection on '{image_path}' ({width}x{height}, {len(windows)} tiles)")
+        parts = []
+        names = None
+        try:
+            batch_size = max(1, int(config.TILE_BATCH_SIZE))
+            for start in range(0, len(windows), batch_size):
+                chunk = windows[start:start + batch_size]
+                results = self._predict([read(window) for window in chunk], priority)
+                for (x1, y1, _x2, _y2), pred in zip(chunk, results):
+                    raw = self._extract_raw(pred)
+                    names = raw.names or names
+                    parts.append((raw.boxes + np.array([x1, y1, x1, y1], dtype=np.float32), raw.scores, raw.class_ids))
+        finally:
+            if reader is not None:
+                reader.close()
+        if config.TILE_FULL_FRAME:
+            model_input, size = self._prepare_input(image_path, image, original_size)
+            results = self._predict([model_input], priority)
+            raw = self._extract_raw(results[0] if results else None).rescaled(size)
+            names = raw.names or names
+            parts.append((raw.boxes, raw.scores, raw.class_ids))
+
+        boxes = np.concatenate([part[0] for part in parts])
+        scores = np.concatenate([part[1] for part in parts])
+        class_ids = np.concatenate([part[2] for part in parts])
+        keep = tiling.merge_boxes(boxes, scores, class_ids, config.TILE_NMS_IOU, config.TILE_NMS_IOS)
+        return Detections(boxes[keep], scores[keep], class_ids[keep], names or {}, (width, height))
+
+    def _apply_torch_settings(self, torch, settings):
+        """Precision, memory format and compilation of a PyTorch model, per profile settings."""
+        precision = settings.get("precision", "fp32")
+        if precision in ("half", "bf16") and self.device.type == "cuda":
+            self._predict_kwargs["half"] = True
+        elif precision == "bf16":
+            self._autocast_dtype = torch.bfloat16 # CPU autocast; fp16 isn't worth it on CPU
+        net = self.model.model
+        if settings.get("channels_last"):
+            net.to(memory_format=torch.channels_last)
+        if settings.get("compile"):
+            net.forward = torch.compile(net.forward, dynamic=True)
+
+    def _predict(self, inputs, priority=PRIORITY_INTERACTIVE):
+        """Runs a list of model inputs through the scheduler; returns one ultralytics result per input."""
+        return self.scheduler.run(inputs, priority)
+
+    def _predict_now(self, inputs):
+        """
+        One model call with the profile's predict options, under
+        torch.inference_mode (and autocast for bf16). Only called by the
+        scheduler's thread: ultralytics models aren't safe to share between threads.
+        """
+        if self.backend != backends.BACKEND_TORCH:
+            return self.model(inputs, **self._predict_kwargs)
+        import torch # Already imported by init_model; this is a sys.modules lookup
+        with torch.inference_mode():
+            if self._autocast_dtype is not None:
+                with torch.autocast("cpu", dtype=self._autocast_dtype):
+                    return self.model(inputs, **self._predict_kwargs)
+            return self.model(inputs, **self._predict_kwargs)
+
+    def _store_get(self, image_path):
+        """Raw prediction from the results store, or None (also on store errors, which are only logged)."""
+        if self.results_store is None:
+            return None
         try:
-            results = self.model(image_path, verbose=False)
+            return self.results_store.get(image_path, self.model_identity)
         except Exception as e:
-            log.error(f"Error during model inference for {image_path}: {e}", exc_info=True)
-            raise RuntimeError(f"Model inference failed for {os.path.basename(image_path)}: {e}")
-
-        if not results or len(results) == 0:
-            return {'scores': [], 'labels': [], 'boxes': []}
-
-        pred = results[0]
-        all_boxes = pred.boxes.xyxy.cpu().numpy()
-        all_scores = pred.boxes.conf.cpu().numpy()
-        all_class_ids = pred.boxes.cls.cpu().numpy().astype(int)
-        model_class_names = pred.names
-
-        filtered_scores = []
-        filtered_labels = []
-        filtered_boxes = []
-
-        for i in range(len(all_scores)):
-            score = all_scores[i]
-            if score >= threshold:
-                class_id = all_class_ids[i]
-                label = model_class_names.get(class_id, f"ID_{class_id}") # Use .get for safety
-
-                if target_class and target_class.strip():
-                    if label.lower() != target_class.strip().lower():
-                        continue  # Skip if class doesn't match
-
-                filtered_scores.append(score)
-                filtered_labels.append(label)
-                filtered_boxes.append(all_boxes[i])
-
-        log.debug(f"Found {len(filtered_boxes)} objects matching criteria.")
-        return {
-            'scores': filtered_scores,
-            'labels': filtered_labels,
-            'boxes': filtered_boxes
-        }
\ No newline at end of file
+            log.warning(f"Results store lookup failed for {image_path}: {e}")
+            return None
+
+    def _store_put(self, items):
+        """Persists [(image_path, raw), ...]; a failing store never fails detection."""
+        if self.results_store is None or not items:
+            return
+        try:
+            self.results_store.put_many(items, self.model_identity)
+        except Exception as e:
+            log.warning(f"Could not store {len(items)} predictions: {e}")
+
+    def _extract_raw(self, pred):
+        """Returns the unfiltered Detections of a single ultralytics result."""
+        if pred is None:
+            return Detections.empty()
+        image_size = (int(pred.orig_shape[1]), int(pred.orig_shape[0])) if pred.orig_shape is not None else None
+        if pred.boxes is None:
+            return Detections.empty(pred.names, image_size)
+        return Detections(
+            pred.boxes.xyxy.cpu().numpy(),
+            pred.boxes.conf.cpu().numpy(),
+            pred.boxes.cls.cpu().numpy(),
+            pred.names or {},
+            image_size
+        )
+
+    def _filter_raw(self, raw, threshold, target_class=None):
+        """Filters a raw prediction by confidence and optional class, using array masks."""
+        return raw.filter(threshold, self._resolve_class_ids(target_class, raw.names))
+
+    def _resolve_class_ids(self, target_class, names):
+        """
+        Maps a class-name filter to the set of matching class ids (case-insensitive).
+        Returns None when no filter is set, so all classes pass.
+        """
+        if not target_class or not target_class.strip():
+            return None
+        wanted = target_class.strip().lower()
+        class_ids = self._class_id_lookup.get(wanted)
+        if class_ids is None:
+            class_ids = frozenset(cid for cid, name in names.items() if name.lower() == wanted)
+            self._class_id_lookup[wanted] = class_ids
+        return class_ids
@@ -0,0 +1,93 @@
+import os
+import json
+import logging
+from PIL import Image
+
+log = logging.getLogger(__name__)
+
+FORMATS = ("coco", "yolo", "jsonl")
+
+
+def _class_ids(names, class_filter):
+    """Class ids matching a case-insensitive class name filter, or None for all classes."""
+    if not class_filter or not class_filter.strip():
+        return None
+    wanted = class_filter.strip().lower()
+    return frozenset(cid for cid, name in names.items() if name.lower() == wanted)
+
+
+def _image_size(image_path, detections):
+    """(width, height) from the stored prediction, or read from the image header."""
+    if detections.image_size:
+        return detections.image_size
+    with Image.open(image_path) as img:
+        return img.size
+
+
+def _filtered(results, threshold, class_filter):
+    """Applies threshold/class filter to (path, raw) pairs from ResultsStore.iter_results."""
+    class_ids = None
+    for path, raw in results:
+        if class_ids is None and class_filter:
+            class_ids = _class_ids(raw.names, class_filter)
+        yield path, raw.filter(threshold, class_ids)
+
+
+def export_jsonl(results, output_path, threshold=0.0, class_filter=None):
+    """One JSON object per image: path, image size and {scores, labels, boxes}. Returns the image count."""
+    count = 0
+    with open(output_path, "w", encoding="utf-8") as f:
+        for path, detections in _filtered(results, threshold, class_filter):
+            width, height = detections.image_size or (None, None)
+            f.write(json.dumps({"image": path, "width": width, "height": height, **detections.to_dict()}) + "\n")
+            count += 1
+    return count
+
+
+def export_coco(results, output_path, threshold=0.0, class_filter=None, names=None):
+    """
+    Writes a COCO detection JSON (images, annotations with score, categories).
+    Category ids are the model's class ids. Returns the image count.
+    """
+    images = []
+    annotations = []
+    for image_id, (path, detections) in enumerate(_filtered(results, threshold, class_filter), start=1):
+        width, height = _image_size(path, detections)
+        images.append({"id": image_id, "file_name": path, "width": width, "height": height})
+        names = names or detections.names
+        for (x1, y1, x2, y2), score, class_id in zip(detections.boxes.tolist(), detections.scores.tolist(),
+                                                     detections.class_ids.tolist()):
+            w, h = x2 - x1, y2 - y1
+            annotations.append({"id": len(annotations) + 1, "image_id": image_id, "category_id": class_id,
+                                "bbox": [round(x1, 2), round(y1, 2), round(w, 2), round(h, 2)],
+                                "area": round(w * h, 2), "score": round(score, 4), "iscrowd": 0})
+    categories = [{"id": cid, "name": name} for cid, name in sorted((names or {}).items())]
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({"images": images, "annotations": annotations, "categories": categories}, f)
+    return len(images)
+
+
+def export_yolo(results, output_dir, threshold=0.0, class_filter=None, root=None, names=None):
+    """
+    Writes one YOLO label file per image ("class cx cy w h", normalized) plus
+    classes.txt. Label files mirror the image folders relative to root
+    (the common folder of all images if not given). Returns the image count.
+    """
+    results = list(_filtered(results, threshold, class_filter))
+    if not results:
+        return 0
+    root = root or os.path.commonpath([os.path.dirname(path) for path, _ in results])
+    for path, detections in results:
+        width, height = _image_size(path, detections)
+        rel = os.path.relpath(os.path.splitext(path)[0], root)
+        label_path = os.path.join(output_dir, f"{rel}.txt")
+        os.makedirs(os.path.dirname(label_path), exist_ok=True)
+        with open(label_path, "w", encoding="utf-8") as f:
+            for (x1, y1, x2, y2), class_id in zip(detections.boxes.tolist(), detections.class_ids.tolist()):
+                f.write(f"{class_id} {(x1 + x2) / 2 / width:.6f} {(y1 + y2) / 2 / height:.6f} "
+                        f"{(x2 - x1) / width:.6f} {(y2 - y1) / height:.6f}\n")
+        names = names or detections.names
+    with open(os.path.join(output_dir, "classes.txt"), "w", encoding="utf-8") as f:
+        for class_id in range(max(names, default=-1) + 1):
+            f.write(f"{names.get(class_id, f'ID_{class_id}')}\n")
+    return len(results)
@@ -0,0 +1,241 @@
+import os
+import math
+from array import array
+from itertools import accumulate, islice
+import numpy as np
+
+SORT_INSERTION = "insertion"
+SORT_NAME = "name"
+SORT_MTIME = "mtime"
+
+
+class ImageIndex:
+    """
+    Compact in-memory index of image paths.
+    Directory prefixes are interned once; file names live in a single UTF-8
+    blob with an offsets array, so a million paths cost tens of MB instead
+    of a Python str per path. Every image has a stable integer id.
+    Deletes are O(1) tombstones; the current view (sort + filter) is an
+    id array that is compacted lazily with NumPy before the next page slice.
+    """
+
+    def __init__(self, paths=(), mtimes=None):
+        self._dirs = [] # id -> directory path
+        self._dir_ids = {} # directory path -> id
+        self._dir_of = array('I') # image id -> directory id
+        self._name_offsets = array('Q', [0]) # image id -> start of its name in _names (n + 1 entries)
+        self._names = bytearray()
+        self._alive = bytearray() # 1 = present, 0 = deleted
+        self._mtimes = array('d') # NaN until known
+        self._has_detections = bytearray()
+        self._live = 0
+
+        self._sort = SORT_INSERTION
+        self._only_with_detections = False
+        self._view = None # np.ndarray of ids, rebuilt lazily
+        self._view_dirty = False # Tombstones to compact out of _view
+
+        self.extend(paths, mtimes)
+
+    # --- Building ---
+
+    def extend(self, paths, mtimes=None):
+        """Appends paths (with optional matching mtimes). Returns the first new id."""
+        first_id = len(self._dir_of)
+        splits = [os.path.split(path) for path in paths]
+        if not splits:
+            return first_id
+
+        dir_ids = self._dir_ids
+        for dir_path, _ in splits:
+            if dir_path not in dir_ids:
+                dir_ids[dir_path] = len(self._dirs)
+                self._dirs.append(dir_path)
+        self._dir_of.extend([dir_ids[dir_path] for dir_path, _ in splits])
+
+        encoded = [name.encode("utf-8", "surrogateescape") for _, name in splits]
+        # End offset of each new name; the first start offset is the current blob end, already stored
+        self._name_offsets.extend(islice(accumulate(map(len, encoded), initial=len(self._names)), 1, None))
+        self._names += b"".join(encoded)
+
+        count = len(splits)
+        self._alive += b"\x01" * count
+        self._has_detections += bytes(count)
+        self._mtimes.extend(mtimes if mtimes is not None else [math.nan] * count)
+        self._live += count
+        self._view = None # New ids: rebuild with the current sort/filter
+        return first_id
+
+    # --- Lookups ---
+
+    def __len__(self):
+        """Number of live (not deleted) images."""
+        return self._live
+
+    def path(self, image_id):
+        start, end = self._name_offsets[image_id], self._name_offsets[image_id + 1]
+        name = self._names[start:end].decode("utf-8", "surrogateescape")
+        return os.path.join(self._dirs[self._dir_of[image_id]], name)
+
+    def is_alive(self, image_id):
+        return 0 <= image_id < len(self._alive) and self._alive[image_id] == 1
+
+    def find(self, path):
+        """Returns the id of a live path, or None. O(n) - prefer keeping ids around."""
+        dir_path, name = os.path.split(path)
+        dir_id = self._dir_ids.get(dir_path)
+        if dir_id is None:
+            return None
+        encoded = name.encode("utf-8", "surrogateescape")
+        for image_id in np.flatnonzero(self._dir_ids_array() == dir_id).tolist():
+            start, end = self._name_offsets[image_id], self._name_offsets[image_id + 1]
+            if self._alive[image_id] and self._names[start:end] == encoded:
+                return image_id
+        return None
+
+    # --- Mutation ---
+
+    def delete(self, image_id):
+        """Tombstones an image. O(1); views compact themselves lazily."""
+        if self.is_alive(image_id):
+            self._alive[image_id] = 0
+            self._live -= 1
+            self._view_dirty = True
+
+    def set_mtime(self, image_id, mtime):
+        self._mtimes[image_id] = mtime
+        if self._sort == SORT_MTIME:
+            self._view = None
+
+    def set_mtimes(self, ids, mtimes):
+        """Bulk set_mtime, e.g. with the result of stat_mtimes()."""
+        np.frombuffer(self._mtimes, dtype=np.float64)[np.asarray(ids, dtype=np.int64)] = mtimes
+        if self._sort == SORT_MTIME:
+            self._view = None
+
+    def missing_mtimes(self):
+        """Ids of live images whose mtime isn't known yet."""
+        mtimes = np.frombuffer(self._mtimes, dtype=np.float64)
+        return np.flatnonzero(np.isnan(mtimes) & (np.frombuffer(self._alive, dtype=np.uint8) == 1))
+
+    def stat_mtimes(self, ids):
+        """
+        Stats the files of ids (0.0 if gone) and returns their mtimes without
+        storing them. Meant for a worker thread, so a large folder never stats
+        on the GUI thread; safe as long as the index isn't extended meanwhile.
+        """
+        mtimes = np.empty(len(ids), dtype=np.float64)
+        for k, image_id in enumerate(ids.tolist()):
+            try:
+                mtimes[k] = os.stat(self.path(image_id)).st_mtime
+            except OSError:
+                mtimes[k] = 0.0
+        return mtimes
+
+    def mark_detections(self, image_id, has_detections=True):
+        self._has_detections[image_id] = 1 if has_detections else 0
+        if self._only_with_detections:
+            self._view = None
+
+    # --- Views and paging ---
+
+    def set_view(self, sort=SORT_INSERTION, only_with_detections=False):
+        """
+        Selects the sort order and optional has-detections filter.
+        name sorts by folder, then file name; mtime puts images whose mtime isn't
+        known yet (see missing_mtimes) last, in insertion order.
+        """
+        if sort not in (SORT_INSERTION, SORT_NAME, SORT_MTIME):
+            raise ValueError(f"Unknown sort order: {sort}")
+        if (sort, only_with_detections) != (self._sort, self._only_with_detections):
+            self._sort = sort
+            self._only_with_detections = only_with_detections
+            self._view = None
+
+    def view_ids(self):
+        """Live ids in the current view order."""
+        if self._view is None:
+            self._view = self._build_view()
+            self._view_dirty = False
+        elif self._view_dirty:
+            alive = np.frombuffer(self._alive, dtype=np.uint8)
+            self._view = self._view[alive[self._view] == 1]
+            self._view_dirty = False
+        return self._view
+
+    def entry_at(self, position):
+        """Returns (id, path) at a position of the current view."""
+        if self._is_identity_view():
+            image_id = position
+        else:
+            image_id = int(self.view_ids()[position])
+        return image_id, self.path(image_id)
+
+    def position(self, image_id):
+        """Position of a live id in the current view, or None if it isn't in the view."""
+        if not self.is_alive(image_id):
+            return None
+        if self._is_identity_view():
+            return image_id
+        hits = np.flatnonzero(self.view_ids() == image_id)
+        return int(hits[0]) if len(hits) else None
+
+    def view_paths(self):
+        return [self.path(image_id) for image_id in self.view_ids().tolist()]
+
+    def view_size(self):
+        if self._is_identity_view():
+            return self._live
+        return len(self.view_ids())
+
+    def page_count(self, per_page):
+        """Number of pages in the current view (at least 1, so an empty view shows 'Page 1/1')."""
+        return max(1, (self.view_size() + per_page - 1) // per_page)
+
+    def clamp_page(self, page, per_page):
+        return max(0, min(page, self.page_count(per_page) - 1))
+
+    def page(self, page, per_page):
+        """Returns [(id, path), ...] for one page of the current view."""
+        if self._is_identity_view():
+            ids = range(page * per_page, min((page + 1) * per_page, self._live))
+        else:
+            ids = self.view_ids()[page * per_page:(page + 1) * per_page].tolist()
+        return [(image_id, self.path(image_id)) for image_id in ids]
+
+    def _is_identity_view(self):
+        """Insertion order, no filter, no deletions: view position == id, no array needed."""
+        return (self._sort == SORT_INSERTION and not self._only_with_detections
+                and self._live == len(self._dir_of))
+
+    def _build_view(self):
+        n = len(self._dir_of)
+        if n == 0:
+            return np.empty(0, dtype=np.int64)
+        mask = np.frombuffer(self._alive, dtype=np.uint8) == 1
+        if self._only_with_detections:
+            mask &= np.frombuffer(self._has_detections, dtype=np.uint8) == 1
+        ids = np.flatnonzero(mask)
+
+        if self._sort == SORT_NAME:
+            ids = ids[np.argsort(self._name_keys(ids), kind="stable")]
+            ids = ids[np.argsort(self._dir_ranks()[self._dir_ids_array()[ids]], kind="stable")]
+        elif self._sort == SORT_MTIME:
+            mtimes = np.frombuffer(self._mtimes, dtype=np.float64)[ids]
+            ids = ids[np.argsort(mtimes, kind="stable")]
+        return ids
+
+    def _name_keys(self, ids):
+        """File names of ids as a fixed-width bytes array (UTF-8 bytes sort in code point order)."""
+        offsets = self._name_offsets
+        names = self._names
+        return np.array([bytes(names[offsets[i]:offsets[i + 1]]) for i in ids.tolist()], dtype=np.bytes_)
+
+    def _dir_ranks(self):
+        """Directory id -> position of that directory in sorted order."""
+        ranks = np.empty(len(self._dirs), dtype=np.int64)
+        ranks[sorted(range(len(self._dirs)), key=self._dirs.__getitem__)] = np.arange(len(self._dirs))
+        return ranks
+
+    def _dir_ids_array(self):
+        return np.frombuffer(self._dir_of, dtype=np.uint32)
@@ -1,4 +1,6 @@
 import os
+import math
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from PIL import Image
 import logging
 from .. import config # Import config from the parent package
@@ -13,10 +15,8 @@ def list_images(src_dir):
     image_files = []
     log.info(f"Scanning '{src_dir}' for images...")
     try:
-        for root, _, files in os.walk(src_dir):
-            for file in files:
-                if file.lower().endswith(config.SUPPORTED_EXTENSIONS):
-                    image_files.append(os.path.join(root, file))
+        for batch in iter_images(src_dir):
+            image_files.extend(batch)
         log.info(f"Found {len(image_files)} images.")
         return sorted(image_files)
     except Exception as e:
@@ -24,38 +24,262 @@ def list_images(src_dir):
         return []
 
 
-def crop_and_save(image_path, detections, output_dir, prefix):
+def iter_images(src_dir, batch_size=config.SCAN_BATCH_SIZE, workers=config.SCAN_WORKERS, progress_callback=None):
+    """
+    Streaming recursive scan of src_dir for supported image files.
+    Subdirectories are listed in parallel with os.scandir (which matters on
+    network shares, where each listing is a round trip), and paths are
+    yielded in unsorted batches of about batch_size as they are found.
+    progress_callback(dirs_scanned, images_found), if given, is called after
+    every directory. Like os.walk, symlinked directories are not descended into.
+    """
+    batch = []
+    found = 0
+    dirs_scanned = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="cropvision-scan") as executor:
+        pending = {executor.submit(_scan_dir, src_dir)}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, subdirs = future.result()
+                    for subdir in subdirs:
+                        pending.add(executor.submit(_scan_dir, subdir))
+                    batch.extend(files)
+                    found += len(files)
+                    dirs_scanned += 1
+                    if progress_callback:
+                        progress_callback(dirs_scanned, found)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        finally:
+            # Generator closed early (e.g. scan cancelled): don't start queued listings
+            for future in pending:
+                future.cancel()
+
+
+def _scan_dir(dir_path):
+    """Lists one directory. Returns (image_paths, subdirectory_paths); unreadable directories are logged and skipped."""
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            subdirs.append(entry.path)
+                    elif entry.name.lower().endswith(config.SUPPORTED_EXTENSIONS):
+                        files.append(entry.path)
+                except OSError:
+                    continue
+    except OSError as e:
+        log.warning(f"Could not list directory {dir_path}: {e}")
+    return files, subdirs
+
+
+def load_image(image_path):
+    """
+    Decodes image_path into an RGB PIL image, fully loaded in memory.
+    The result can be shared by Detector and crop_and_save so the file is
+    only decoded once. Raises on unreadable files.
+    """
+    with Image.open(image_path) as img:
+        return img.convert("RGB")
+
+
+def load_for_inference(image_path, target_size):
+    """
+    Decodes image_path at reduced resolution for a model that letterboxes its
+    input to target_size: JPEGs are decoded at the smallest DCT scale whose
+    longer side is still >= target_size (draft mode, so the full-size image is
+    never materialized), other formats are shrunk by the largest integer
+    Image.reduce factor that keeps that size. Returns (RGB image, original
+    (width, height)); boxes found on the image are mapped back with
+    Detections.rescaled(original size). Raises on unreadable files.
+    """
+    with Image.open(image_path) as img:
+        original_size = img.size
+        scale = target_size / max(original_size)
+        if scale < 1:
+            img.draft("RGB", (math.ceil(original_size[0] * scale), math.ceil(original_size[1] * scale)))
+        rgb = img.convert("RGB")
+    return reduce_for_inference(rgb, target_size)[0], original_size
+
+
+def reduce_for_inference(image, target_size):
+    """
+    In-memory counterpart of load_for_inference for an already decoded image:
+    shrinks it by the largest integer Image.reduce factor whose longer side
+    stays >= target_size. Returns (image, original (width, height)).
+    """
+    factor = int(max(image.size) // target_size)
+    return (image.reduce(factor) if factor >= 2 else image), image.size
+
+
+# Bytes per pixel of uncompressed rasters whose rows can be read as a band
+_RAW_BYTES_PER_PIXEL = {"L": 1, "RGB": 3, "RGBA": 4, "RGBX": 4, "CMYK": 4}
+
+
+class RegionReader:
+    """
+    Reads rectangular regions of an image file as RGB images without decoding
+    the whole file where the format allows it:
+    - tiled or stripped TIFFs decoded by Pillow itself: only the tiles/strips
+      intersecting the region are decoded;
+    - uncompressed top-down rasters (plain TIFF, PPM): only the region's rows.
+    Other formats (JPEG, PNG, WebP, libtiff-compressed TIFF) can't be read in
+    windows; they are decoded once on first read and cropped from memory.
+    """
+
+    def __init__(self, image_path):
+        self.path = image_path
+        with Image.open(image_path) as img:
+            self.size = img.size
+            self._mode = img.mode
+            self._tiles = list(img.tile)
+            libtiff = getattr(img, "use_load_libtiff", False)
+        self._image = None # Full decode, for formats that can't be windowed
+        if libtiff or not self._tiles:
+            self.windowed = False
+        elif len(self._tiles) > 1:
+            self.windowed = True
+        else:
+            codec, _extents, _offset, args = self._tiles[0]
+            if isinstance(args, str):
+                args = (args, 0, 1) # Pillow's shorthand for a packed top-down raster
+            self.windowed = (codec == "raw" and tuple(args[:3]) == (self._mode, 0, 1)
+                             and self._mode in _RAW_BYTES_PER_PIXEL)
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    def read(self, box):
+        """Returns the (x1, y1, x2, y2) region, clipped to the image, as an RGB image."""
+        x1, y1 = max(0, int(box[0])), max(0, int(box[1]))
+        x2, y2 = min(self.width, int(box[2])), min(self.height, int(box[3]))
+        if not self.windowed:
+            if self._image is None:
+                self._image = load_image(self.path)
+            return self._image.crop((x1, y1, x2, y2))
+        if len(self._tiles) == 1:
+            return self._read_rows(y1, y2).crop((x1, 0, x2, y2 - y1))
+        region = Image.new("RGB", (x2 - x1, y2 - y1))
+        for tile in self._tiles:
+            tx1, ty1, tx2, ty2 = tile[1]
+            if tx1 < x2 and tx2 > x1 and ty1 < y2 and ty2 > y1:
+                part = self._decode(tile[0], (tx2 - tx1, ty2 - ty1), tile[2], tile[3])
+                region.paste(part, (tx1 - x1, ty1 - y1))
+        return region
+
+    def _read_rows(self, y1, y2):
+        codec, _extents, offset, args = self._tiles[0]
+        row_bytes = self.width * _RAW_BYTES_PER_PIXEL[self._mode]
+        return self._decode(codec, (self.width, y2 - y1), offset + y1 * row_bytes, args)
+
+    def _decode(self, codec, size, offset, args):
+        """Decodes one tile/band of the file into its own image of the given size."""
+        with Image.open(self.path) as img:
+            img._size = size # Pillow allocates the decode target from size
+            img.tile = [(codec, (0, 0) + size, offset, args)]
+            return img.convert("RGB")
+
+    def close(self):
+        self._image = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def expand_box(box, width, height, padding=0.0, square=False):
+    """
+    Grows an xyxy box by padding (a fraction of its width/height on each side)
+    and optionally to a square around its center, then fits it inside the
+    width x height image (shifting before clipping, so squares stay square
+    where the image allows). Returns integer (x1, y1, x2, y2).
+    """
+    x1, y1, x2, y2 = map(float, box)
+    pad_x, pad_y = (x2 - x1) * padding, (y2 - y1) * padding
+    x1, y1, x2, y2 = x1 - pad_x, y1 - pad_y, x2 + pad_x, y2 + pad_y
+    if square:
+        side = max(x2 - x1, y2 - y1)
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        x1, y1, x2, y2 = cx - side / 2, cy - side / 2, cx + side / 2, cy + side / 2
+    # Shift back inside the image, then clip whatever still doesn't fit
+    x1, x2 = x1 - min(0, x1) - max(0, x2 - width), x2 - min(0, x1) - max(0, x2 - width)
+    y1, y2 = y1 - min(0, y1) - max(0, y2 - height), y2 - min(0, y1) - max(0, y2 - height)
+    return max(0, int(x1)), max(0, int(y1)), min(width, int(round(x2))), min(height, int(round(y2)))
+
+
+def crop_and_save(image_path, detections, output_dir, prefix, image=None,
+                  padding=config.CROP_PADDING, square=config.CROP_SQUARE, resize=config.CROP_RESIZE):
     """
     Crops each box from detections and writes numbered files.
-    Returns the number of successfully saved crops.
+    If image (an already decoded RGB PIL image of image_path) is given, it is
+    used instead of decoding image_path again; otherwise each crop is read
+    through a RegionReader, so formats that allow windowed reads never decode
+    the whole image.
+    padding/square expand each box (see expand_box); resize, if set, scales
+    each crop so its longer side is that many pixels.
+    Returns (saved, errors): crops written, and crops that could not be read
+    or written (all of them if the image can't be opened). Zero-size boxes
+    are skipped and count as neither.
     """
-    if not detections or not detections['boxes']:
+    if detections is None or len(detections['boxes']) == 0:
         log.warning(f"No detections provided for '{image_path}', cannot crop.")
-        return 0
+        return 0, 0
 
-    try:
-        img = Image.open(image_path).convert("RGB")
-    except Exception as e:
-        log.error(f"Error opening image {image_path}: {e}", exc_info=True)
-        return 0
+    if image is not None:
+        img = image
+    else:
+        try:
+            img = RegionReader(image_path)
+        except Exception as e:
+            log.error(f"Error opening image {image_path}: {e}", exc_info=True)
+            return 0, len(detections['boxes'])
 
     os.makedirs(output_dir, exist_ok=True)
     count = 0
+    errors = 0
 
     for i, box in enumerate(detections['boxes']):
-        x1, y1, x2, y2 = map(int, box)
+        if padding or square:
+            x1, y1, x2, y2 = expand_box(box, img.width, img.height, padding, square)
+        else:
+            x1, y1, x2, y2 = map(int, box)
 
-        # Clip coordinates to image bounds
-        x1 = max(0, x1)
-        y1 = max(0, y1)
-        x2 = min(img.width, x2)
-        y2 = min(img.height, y2)
+            # Clip coordinates to image bounds
+            x1 = max(0, x1)
+            y1 = max(0, y1)
+            x2 = min(img.width, x2)
+            y2 = min(img.height, y2)
 
         if x1 >= x2 or y1 >= y2:
             log.warning(f"Skipping invalid (zero size) box {i} for {image_path}")
             continue
 
-        cropped_img = img.crop((x1, y1, x2, y2))
+        try:
+            cropped_img = img.crop((x1, y1, x2, y2)) if image is not None else img.read((x1, y1, x2, y2))
+        except Exception as e:
+            log.error(f"Error reading box {i} of {image_path}: {e}", exc_info=True)
+            errors += 1
+            continue
+        if resize:
+            scale = resize / max(cropped_img.width, cropped_img.height)
+            cropped_img = cropped_img.resize((max(1, round(cropped_img.width * scale)),
+                                              max(1, round(cropped_img.height * scale))),
+                                             Image.Resampling.LANCZOS)
         output_filename = os.path.join(output_dir, f"{prefix}_{i}.jpg") # Always save as JPG for consistency? Or keep original? Let's go with JPG.
 
         try:
@@ -64,6 +288,7 @@ def crop_and_save(image_path, detections, output_dir, prefix):
             count += 1
         except Exception as e:
             log.error(f"Error saving cropped image {output_filename}: {e}", exc_info=True)
+            errors += 1
 
     log.info(f"Saved {count} crops from '{image_path}' to '{output_dir}'.")
-    return count
\ No newline at end of file
+    return count, errors
\ No newline at end of file
@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import threading
+import logging
+from .. import config # Import config from the parent package
+
+log = logging.getLogger(__name__)
+
+
+class BatchJournal:
+    """
+    Append-only JSON-lines journal of finished images, kept in the output folder.
+    One line per image: image path and mtime, model identity, threshold, class filter and crop count.
+    An image is only recorded after its crops are written, so a crash loses at
+    most the images in flight (their crops are simply rewritten on resume), and
+    a torn last line is ignored when reading. Images are done for a run only if
+    a line matches the run's model identity (weights, input size, precision,
+    backend and tiling; see detector.run_identity), threshold and class filter; with
+    resume=False nothing is skipped but progress is still recorded.
+    Safe to use from several writer threads.
+    """
+
+    def __init__(self, output_dir, model_identity, threshold, class_filter, resume=True,
+                 sync_every=config.JOURNAL_SYNC_EVERY):
+        self.path = os.path.join(output_dir, config.JOURNAL_FILENAME)
+        self.model = model_identity
+        self.threshold = round(float(threshold), 4)
+        self.class_filter = (class_filter or "").strip().lower()
+        self.resume = resume
+        self.sync_every = max(1, int(sync_every))
+        self._lock = threading.Lock()
+        self._file = None
+        self._unsynced = 0
+
+    def completed(self):
+        """Returns the set of absolute image paths already finished with this run's parameters."""
+        return set(self.completed_versions())
+
+    def completed_versions(self):
+        """
+        Returns {absolute image path: mtime_ns when it was finished} for this
+        run's parameters (mtime_ns is None for entries written without one).
+        """
+        done = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue # Torn write from a crash
+                    if (entry.get("model") == self.model and entry.get("threshold") == self.threshold
+                            and entry.get("class_filter") == self.class_filter):
+                        done[entry.get("image")] = entry.get("mtime_ns")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.warning(f"Could not read batch journal {self.path}: {e}")
+        return done
+
+    def pending(self, image_paths):
+        """Returns the indices of image_paths not finished yet."""
+        done = self.completed() if self.resume else set()
+        if not done:
+            return list(range(len(image_paths)))
+        pending = [i for i, path in enumerate(image_paths) if os.path.abspath(path) not in done]
+        log.info(f"Batch journal: {len(image_paths) - len(pending)} of {len(image_paths)} images already done.")
+        return pending
+
+    def record(self, image_path, crops):
+        """Appends one finished image."""
+        try:
+            mtime_ns = os.stat(image_path).st_mtime_ns # Lets watch mode tell a re-written file from a finished one
+        except OSError:
+            mtime_ns = None
+        line = json.dumps({
+            "image": os.path.abspath(image_path), "mtime_ns": mtime_ns, "model": self.model, "threshold": self.threshold,
+            "class_filter": self.class_filter, "crops": crops, "time": round(time.time(), 3),
+        }) + "\n"
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "a+", encoding="utf-8")
+                if self._file.tell() > 0:
+                    self._file.seek(self._file.tell() - 1)
+                    if self._file.read(1) != "\n":
+                        self._file.write("\n") # Terminate a line torn by a crash
+            self._file.write(line)
+            self._file.flush() # Survives a process crash
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every:
+                os.fsync(self._file.fileno()) # Survives a power loss / reboot
+                self._unsynced = 0
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
@@ -0,0 +1,100 @@
+import os
+import json
+import hashlib
+import logging
+from .. import config # Import config from the parent package
+
+log = logging.getLogger(__name__)
+
+_HASH_INDEX = "hash_index.json"
+
+
+def _meta_dir():
+    return os.path.join(config.CACHE_DIR, "model_meta")
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    """Writes atomically so a crash never leaves a half-written cache file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def model_file_hash(model_path, compute=True):
+    """
+    Returns the SHA-256 of a model file, or None if it doesn't exist or isn't a file.
+    Hashes are memoized by (path, size, mtime), so each file is only read once.
+    With compute=False only the memo is consulted (never reads the weights).
+    """
+    try:
+        st = os.stat(model_path)
+    except OSError:
+        return None
+    if not os.path.isfile(model_path):
+        return None # e.g. an OpenVINO model folder
+    stamp = f"{os.path.abspath(model_path)}|{st.st_size}|{st.st_mtime_ns}"
+    index_path = os.path.join(_meta_dir(), _HASH_INDEX)
+    index = _read_json(index_path) or {}
+    if stamp in index:
+        return index[stamp]
+    if not compute:
+        return None
+
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    file_hash = digest.hexdigest()
+
+    index[stamp] = file_hash
+    try:
+        _write_json(index_path, index)
+    except OSError as e:
+        log.warning(f"Could not update model hash index: {e}")
+    return file_hash
+
+
+def model_identity(model_name, imgsz=None):
+    """
+    Identifies a model across runs: file name plus content hash for weights on
+    disk (so retrained weights with the same name don't count as the same model),
+    or the bare name for models ultralytics resolves itself.
+    imgsz, if given, is appended, since the input size changes the predictions.
+    """
+    file_hash = model_file_hash(model_name) if model_name else None
+    identity = f"{os.path.basename(model_name)}:{file_hash[:16]}" if file_hash else model_name
+    return f"{identity}@{imgsz}" if imgsz else identity
+
+
+def load_class_names(model_path, compute_hash=False):
+    """
+    Returns the cached class names for a model file, or None if unknown.
+    By default only uses already-known hashes, so it is cheap enough for GUI startup.
+    """
+    file_hash = model_file_hash(model_path, compute=compute_hash)
+    if not file_hash:
+        return None
+    meta = _read_json(os.path.join(_meta_dir(), f"{file_hash}.json"))
+    return meta.get("class_names") if meta else None
+
+
+def save_class_names(model_path, class_names):
+    """Caches class names for a model file, keyed by its content hash."""
+    try:
+        file_hash = model_file_hash(model_path)
+        if not file_hash:
+            return
+        _write_json(os.path.join(_meta_dir(), f"{file_hash}.json"),
+                    {"model": os.path.basename(model_path), "class_names": list(class_names)})
+    except OSError as e:
+        log.warning(f"Could not cache class names for {model_path}: {e}")
@@ -0,0 +1,187 @@
+import os
+import queue
+import logging
+import multiprocessing
+from .. import config # Import config from the parent package
+from . import backends
+from .detector import resolve_profile
+
+log = logging.getLogger(__name__)
+
+
+def default_torch_threads(processes):
+    """Splits the machine's cores evenly between worker processes."""
+    return max(1, (os.cpu_count() or 1) // max(1, processes))
+
+
+def shard_paths(image_paths, shards, indices=None):
+    """
+    Splits image_paths (or only the given indices of it) round-robin into
+    `shards` lists of (index, path).
+    Round-robin keeps shards balanced when the list is sorted by folder.
+    """
+    if indices is None:
+        indices = range(len(image_paths))
+    indexed = [(i, image_paths[i]) for i in indices]
+    return [indexed[k::shards] for k in range(shards)]
+
+
+class _JournalRelay:
+    """Stands in for BatchJournal inside a worker: the parent already skipped done images and writes the journal."""
+
+    def __init__(self, events):
+        self.events = events
+
+    def pending(self, image_paths):
+        return list(range(len(image_paths)))
+
+    def record(self, image_path, crops):
+        self.events.put(('journal', image_path, crops))
+
+    def close(self):
+        pass
+
+
+def _shard_worker(shard_id, model_name, torch_threads, indexed_paths, threshold, class_filter,
+                  output_dir, batch_size, events, stop_event, journaled=False, backend=config.INFERENCE_BACKEND,
+                  profile=None, tiled=None):
+    """Entry point of one worker process: loads its own model and runs a BatchPipeline over its shard."""
+    logging.basicConfig(level=getattr(logging, config.LOG_LEVEL.upper(), logging.INFO), format=config.LOG_FORMAT)
+    logging.getLogger("ultralytics").setLevel(logging.WARNING)
+
+    # Imported in the worker so importing this module stays cheap
+    from .detector import Detector
+    from .pipeline import BatchPipeline
+
+    detector = Detector()
+    success, msg = detector.init_model(model_name, torch_threads=torch_threads, backend=backend, profile=profile,
+                                       tiled=tiled)
+    if not success:
+        events.put(('error', shard_id, f"Worker {shard_id} failed to load model: {msg}"))
+        events.put(('done', shard_id, 0))
+        return
+
+    indices = [i for i, _ in indexed_paths]
+    paths = [path for _, path in indexed_paths]
+    pipeline = BatchPipeline(detector, paths, threshold, class_filter, output_dir,
+                             batch_size=batch_size, loader_workers=1, writer_workers=1,
+                             journal=_JournalRelay(events) if journaled else None)
+    try:
+        total = pipeline.run(on_item=lambda k, message, _processed: events.put(('item', indices[k], message)),
+                             is_cancelled=stop_event.is_set)
+    except Exception as e:
+        log.error(f"Worker {shard_id} failed: {e}", exc_info=True)
+        events.put(('error', shard_id, f"Worker {shard_id} failed: {e}"))
+        total = pipeline.total_saved_crops
+    finally:
+        detector.close()
+    events.put(('done', shard_id, total))
+
+
+class ShardedBatchRunner:
+    """
+    Batch detection and cropping spread over N worker processes.
+    Each process loads its own model via Detector.init_model with
+    torch_threads intra-op threads (the profile's thread count, or an even
+    split of the cores) and processes one shard of the image list.
+    Exposes the same run(on_item, is_cancelled) interface as BatchPipeline.
+    With a BatchJournal, done images are skipped before sharding and the
+    parent appends the workers' finished images to it, so there is one writer.
+    """
+
+    def __init__(self, model_name, image_paths, threshold, class_filter, output_dir,
+                 processes=config.INFERENCE_PROCESSES,
+                 torch_threads=config.TORCH_THREADS_PER_PROCESS,
+                 batch_size=config.DEFAULT_BATCH_SIZE,
+                 journal=None,
+                 backend=config.INFERENCE_BACKEND,
+                 profile=None,
+                 tiled=None):
+        self.model_name = model_name
+        self.image_paths = image_paths
+        self.threshold = threshold
+        self.class_filter = class_filter
+        self.output_dir = output_dir
+        self.processes = max(1, min(int(processes), len(image_paths) or 1))
+        self.profile, self.profile_settings = resolve_profile(profile)
+        self.torch_threads = (torch_threads or self.profile_settings.get("threads")
+                              or default_torch_threads(self.processes))
+        self.batch_size = batch_size
+        self.journal = journal
+        self.backend = backend
+        self.tiled = tiled
+        self.skipped = 0
+        self.errors = []
+
+    def run(self, on_item=None, is_cancelled=None):
+        """
+        Starts the workers and relays their per-image results.
+        on_item(index, message, processed_count) is called on the calling thread;
+        processed_count includes images skipped via the journal.
+        Returns the number of crops saved by this run.
+        """
+        is_cancelled = is_cancelled or (lambda: False)
+        pending = self.journal.pending(self.image_paths) if self.journal else range(len(self.image_paths))
+        self.skipped = len(self.image_paths) - len(pending)
+        if not pending:
+            return 0
+        processes = min(self.processes, len(pending))
+        # Export once here, so workers don't race to write the same ONNX/OpenVINO artifact
+        model_name = backends.ensure_exported(self.model_name, self.backend, self.profile_settings.get("imgsz", 640))
+        ctx = multiprocessing.get_context("spawn") # fork is unsafe with torch/Qt already initialized
+        events = ctx.Queue()
+        stop_event = ctx.Event()
+
+        log.info(f"Starting {processes} inference processes with {self.torch_threads} torch threads each.")
+        workers = []
+        for shard_id, shard in enumerate(shard_paths(self.image_paths, processes, pending)):
+            proc = ctx.Process(
+                target=_shard_worker,
+                args=(shard_id, model_name, self.torch_threads, shard, self.threshold,
+                      self.class_filter, self.output_dir, self.batch_size, events, stop_event,
+                      self.journal is not None, self.backend, self.profile, self.tiled),
+                name=f"cropvision-shard-{shard_id}", daemon=True
+            )
+            proc.start()
+            workers.append(proc)
+
+        processed = self.skipped
+        total_saved_crops = 0
+        done = set()
+        try:
+            while len(done) < len(workers):
+                if is_cancelled() and not stop_event.is_set():
+                    log.warning("Cancelling sharded batch processing.")
+                    stop_event.set()
+                try:
+                    kind, key, payload = events.get(timeout=0.2)
+                except queue.Empty:
+                    # A worker that died without reporting (e.g. OOM-killed) must not hang us
+                    for shard_id, proc in enumerate(workers):
+                        if shard_id not in done and proc.exitcode not in (None, 0):
+                            self.errors.append(f"Worker {shard_id} exited unexpectedly (code {proc.exitcode}).")
+                            done.add(shard_id)
+                    continue
+
+                if kind == 'item':
+                    processed += 1
+                    if on_item:
+                        on_item(key, payload, processed)
+                elif kind == 'journal':
+                    self.journal.record(key, payload)
+                elif kind == 'error':
+                    log.error(payload)
+                    self.errors.append(payload)
+                elif kind == 'done':
+                    done.add(key)
+                    total_saved_crops += payload
+        finally:
+            stop_event.set()
+            for proc in workers:
+                proc.join(timeout=5)
+                if proc.is_alive():
+                    proc.terminate()
+            if self.journal:
+                self.journal.close()
+
+        return total_saved_crops
@@ -0,0 +1,258 @@
+import os
+import queue
+import threading
+import logging
+from .. import config # Import config from the parent package
+from . import image_utils
+from .scheduler import PRIORITY_BATCH
+
+log = logging.getLogger(__name__)
+
+_DONE = object() # End-of-stream marker passed between stages
+
+
+class BatchPipeline:
+    """
+    Staged batch detection and cropping:
+
+        loader threads (decode) -> inference stage (batched) -> writer threads (crop_and_save)
+
+    Stages are connected by bounded queues, so decoding and JPEG encoding
+    overlap with inference without reading unboundedly ahead. With
+    config.DECODE_ONCE, loaders decode each image full size once for both the
+    model and the writers; otherwise, with config.REDUCED_DECODE, they decode
+    at reduced resolution and writers decode full size only for images that
+    have crops (see _decode). Inference runs
+    on the thread that calls run(), so a single Detector is only ever used by
+    one thread. With a BatchJournal, images it already records are skipped and
+    every finished image is appended to it, so interrupted jobs resume.
+    Qt-free; the GUI drives it from BatchProcessingRunnable.
+    """
+
+    def __init__(self, detector, image_paths, threshold, class_filter, output_dir,
+                 batch_size=config.DEFAULT_BATCH_SIZE,
+                 loader_workers=config.PIPELINE_LOADER_WORKERS,
+                 writer_workers=config.PIPELINE_WRITER_WORKERS,
+                 queue_size=config.PIPELINE_QUEUE_SIZE,
+                 journal=None):
+        self.detector = detector
+        self.image_paths = image_paths
+        self.threshold = threshold
+        self.class_filter = class_filter
+        self.output_dir = output_dir
+        self.batch_size = max(1, int(batch_size))
+        self.loader_workers = max(1, int(loader_workers))
+        self.writer_workers = max(1, int(writer_workers))
+        self.queue_size = max(1, int(queue_size))
+        self.journal = journal
+
+        self.processed = 0
+        self.skipped = 0 # Images the journal already had
+        self.total_saved_crops = 0
+        self.errors = [] # Job-level failures; per-image errors are reported through on_item
+        self.failed = set() # Indices of images whose detection or cropping failed (not journaled)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def run(self, on_item=None, is_cancelled=None):
+        """
+        Processes all images. on_item(index, message, processed_count) is called
+        from writer threads once per finished image; processed_count includes
+        images skipped via the journal, so it always runs up to len(image_paths).
+        is_cancelled() is polled between items. Returns the number of crops saved by this run.
+        """
+        self._stop.clear()
+        pending = self.journal.pending(self.image_paths) if self.journal else range(len(self.image_paths))
+        self.skipped = len(self.image_paths) - len(pending)
+        self.processed = self.skipped
+        self.total_saved_crops = 0
+        self.failed = set()
+        is_cancelled = is_cancelled or (lambda: False)
+
+        index_queue = queue.Queue()
+        for i in pending:
+            index_queue.put(i)
+        for _ in range(self.loader_workers):
+            index_queue.put(_DONE)
+        decoded_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+
+        loaders = [threading.Thread(target=self._loader, args=(index_queue, decoded_queue),
+                                    name=f"cropvision-loader-{n}", daemon=True)
+                   for n in range(self.loader_workers)]
+        writers = [threading.Thread(target=self._writer, args=(write_queue, on_item),
+                                    name=f"cropvision-writer-{n}", daemon=True)
+                   for n in range(self.writer_workers)]
+        for thread in loaders + writers:
+            thread.start()
+
+        try:
+            self._inference_stage(decoded_queue, write_queue, is_cancelled)
+        except BaseException:
+            self.stop() # Unblock loaders waiting on a full queue
+            raise
+        finally:
+            for _ in writers:
+                self._put(write_queue, _DONE, force=True)
+            for thread in loaders + writers:
+                thread.join()
+            if self.journal:
+                self.journal.close()
+
+        return self.total_saved_crops
+
+    def stop(self):
+        """Asks all stages to wind down as soon as possible."""
+        self._stop.set()
+
+    # --- Stages ---
+
+    def _loader(self, index_queue, decoded_queue):
+        while not self._stop.is_set():
+            i = index_queue.get()
+            if i is _DONE:
+                break
+            img_path = self.image_paths[i]
+            try:
+                image, original_size, crop_source = self._decode(img_path)
+                item = (i, img_path, image, original_size, crop_source, None)
+            except Exception as e:
+                log.error(f"Error decoding {img_path} in batch: {e}", exc_info=True)
+                item = (i, img_path, None, None, None, e)
+            if not self._put(decoded_queue, item):
+                break
+        self._put(decoded_queue, _DONE)
+
+    def _inference_stage(self, decoded_queue, write_queue, is_cancelled):
+        finished_loaders = 0
+        batch = []
+        while finished_loaders < self.loader_workers:
+            if is_cancelled():
+                self.stop()
+            if self._stop.is_set():
+                return
+            try:
+                item = decoded_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                finished_loaders += 1
+                continue
+
+            i, img_path, _image, _original_size, _crop_source, error = item
+            if error is not None:
+                self._put(write_queue, (i, img_path, None, error))
+                continue
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._infer(batch, write_queue)
+                batch = []
+
+        if batch and not self._stop.is_set():
+            self._infer(batch, write_queue)
+
+    def _infer(self, batch, write_queue):
+        """Runs one forward pass over batch and hands each result to the writers."""
+        paths = [item[1] for item in batch]
+        images = [item[2] for item in batch] if batch[0][2] is not None else None
+        original_sizes = [item[3] for item in batch]
+        try:
+            outcomes = self.detector.detect_batch(paths, self.threshold, self.class_filter,
+                                                  batch_size=len(paths), images=images, original_sizes=original_sizes)
+        except Exception as e:
+            # Retry one by one so a single bad file doesn't take the rest of the batch down with it
+            log.warning(f"Batched detection failed ({e}), retrying {len(paths)} images one by one.")
+            outcomes = []
+            for _, img_path, image, original_size, _, _ in batch:
+                try:
+                    outcomes.append(self.detector.detect_objects(img_path, self.threshold, self.class_filter,
+                                                                 image=image, original_size=original_size,
+                                                                 priority=PRIORITY_BATCH))
+                except Exception as item_error:
+                    log.error(f"Error processing {img_path} in batch: {item_error}", exc_info=True)
+                    outcomes.append(item_error)
+
+        for (i, img_path, _, _, crop_source, _), outcome in zip(batch, outcomes):
+            if isinstance(outcome, Exception):
+                item = (i, img_path, None, outcome)
+            else:
+                item = (i, img_path, crop_source, outcome) # None: the writer decodes full size itself
+            if not self._put(write_queue, item):
+                return
+
+    def _writer(self, write_queue, on_item):
+        while True:
+            item = write_queue.get()
+            if item is _DONE:
+                break
+            if self._stop.is_set():
+                continue # Drain without doing work until our end marker arrives
+
+            i, img_path, image, outcome = item
+            name = os.path.basename(img_path)
+            num_saved = 0
+            failed = True
+            if isinstance(outcome, Exception):
+                message = f"ERROR processing {name}: {outcome}"
+            else:
+                try:
+                    if len(outcome['boxes']) > 0:
+                        base_name = os.path.splitext(name)[0]
+                        prefix = f"{base_name}_crop"
+                        num_saved, errors = image_utils.crop_and_save(img_path, outcome, self.output_dir, prefix, image=image)
+                        failed = errors > 0 # Unreadable image or failed reads/writes (logged); zero-size boxes aren't errors
+                        message = (f"ERROR processing {name}: {errors} of {len(outcome['boxes'])} crops could not be saved."
+                                   if failed else f"Processed {name} - {num_saved} crops.")
+                    else:
+                        failed = False
+                        message = f"Processed {name} - No crops."
+                    if self.journal and not failed:
+                        self.journal.record(img_path, num_saved) # Only once its crops are on disk
+                except Exception as e:
+                    log.error(f"Error processing {img_path} in batch: {e}", exc_info=True)
+                    message = f"ERROR processing {name}: {e}"
+                    failed = True
+
+            with self._lock:
+                if failed:
+                    self.failed.add(i)
+                self.processed += 1
+                self.total_saved_crops += num_saved
+                processed = self.processed
+            if on_item:
+                on_item(i, message, processed)
+
+    # --- Helpers ---
+
+    def _decode(self, img_path):
+        """
+        Loader-side decode: (model input, original size or None, full image to
+        crop from or None). DECODE_ONCE decodes full size once and shares it,
+        with REDUCED_DECODE the model gets an in-memory reduced copy of it.
+        REDUCED_DECODE alone decodes at reduced resolution only. Neither:
+        (None, None, None), the model reads the file itself.
+        """
+        reduce = config.REDUCED_DECODE and self.detector.input_size
+        if config.DECODE_ONCE:
+            image = image_utils.load_image(img_path)
+            if reduce:
+                return (*image_utils.reduce_for_inference(image, self.detector.input_size), image)
+            return image, None, image
+        if reduce:
+            return (*image_utils.load_for_inference(img_path, self.detector.input_size), None)
+        return None, None, None
+
+    def _put(self, q, item, force=False):
+        """
+        Blocking put that gives up once the pipeline is stopped, so a full queue
+        can't deadlock cancellation. force=True keeps trying even when stopped
+        (used for end markers the consumer is guaranteed to drain).
+        Returns True if the item was queued.
+        """
+        while force or not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
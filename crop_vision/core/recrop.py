@@ -0,0 +1,170 @@
+import os
+import json
+import logging
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from .. import config # Import config from the parent package
+from .detections import Detections
+from . import image_utils
+
+log = logging.getLogger(__name__)
+
+SOURCES = ("yolo", "coco", "store")
+
+
+# --- Box sources ---
+# Each returns a list of (image_path, boxes) tasks, where boxes is a Detections
+# or the path of a YOLO label file (parsed in the worker once the image size is known).
+
+def yolo_label_path(image_path, images_root, labels_root=None):
+    """
+    Label file of an image: mirrored under labels_root if given, otherwise the
+    ultralytics layout (.../images/... -> .../labels/...), falling back to a
+    .txt next to the image.
+    """
+    stem = os.path.splitext(image_path)[0]
+    if labels_root:
+        return os.path.join(labels_root, os.path.relpath(stem, images_root) + ".txt")
+    parts = stem.split(os.sep)
+    if "images" in parts:
+        k = len(parts) - 1 - parts[::-1].index("images")
+        candidate = os.sep.join(parts[:k] + ["labels"] + parts[k + 1:]) + ".txt"
+        if os.path.exists(candidate):
+            return candidate
+    return stem + ".txt"
+
+
+def default_labels_root(images_root):
+    """Labels folder of the ultralytics layout (.../images -> .../labels) if it exists, else images_root."""
+    parts = os.path.abspath(images_root).split(os.sep)
+    if "images" in parts:
+        k = len(parts) - 1 - parts[::-1].index("images")
+        candidate = os.sep.join(parts[:k] + ["labels"] + parts[k + 1:])
+        if os.path.isdir(candidate):
+            return candidate
+    return images_root
+
+
+def read_class_names(labels_root):
+    """{class id: name} from a classes.txt in labels_root, or {} if there is none."""
+    try:
+        with open(os.path.join(labels_root, "classes.txt"), "r", encoding="utf-8") as f:
+            return {i: line.strip() for i, line in enumerate(f) if line.strip()}
+    except OSError:
+        return {}
+
+
+def yolo_tasks(images_root, labels_root=None):
+    """Tasks for every image under images_root that has a YOLO label file."""
+    tasks = []
+    for image_path in image_utils.list_images(images_root):
+        label_path = yolo_label_path(image_path, images_root, labels_root)
+        if os.path.exists(label_path):
+            tasks.append((image_path, label_path))
+    return tasks
+
+
+def read_yolo_labels(label_path, image_size, names=None):
+    """
+    Parses "class cx cy w h [conf]" lines (normalized) into pixel xyxy Detections.
+    Boxes without a confidence column get score 1.0.
+    """
+    width, height = image_size
+    boxes, scores, class_ids = [], [], []
+    with open(label_path, "r", encoding="utf-8") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) < 5:
+                continue
+            class_id, cx, cy, w, h = int(float(fields[0])), *map(float, fields[1:5])
+            boxes.append(((cx - w / 2) * width, (cy - h / 2) * height, (cx + w / 2) * width, (cy + h / 2) * height))
+            scores.append(float(fields[5]) if len(fields) > 5 else 1.0)
+            class_ids.append(class_id)
+    if not boxes:
+        return Detections.empty(names, image_size)
+    return Detections(boxes, scores, class_ids, names, image_size)
+
+
+def coco_tasks(coco_path, images_root=None):
+    """Tasks from a COCO detection JSON; relative file names are resolved against images_root."""
+    with open(coco_path, "r", encoding="utf-8") as f:
+        coco = json.load(f)
+    names = {c["id"]: c["name"] for c in coco.get("categories", [])}
+    per_image = {image["id"]: [] for image in coco.get("images", [])}
+    for ann in coco.get("annotations", []):
+        per_image.setdefault(ann["image_id"], []).append(ann)
+
+    base = images_root or os.path.dirname(os.path.abspath(coco_path))
+    tasks = []
+    for image in coco.get("images", []):
+        anns = per_image.get(image["id"], [])
+        if not anns:
+            continue
+        boxes = [(x, y, x + w, y + h) for x, y, w, h in (ann["bbox"] for ann in anns)]
+        detections = Detections(boxes, [ann.get("score", 1.0) for ann in anns], [ann["category_id"] for ann in anns],
+                                names, (image["width"], image["height"]) if image.get("width") else None)
+        tasks.append((os.path.join(base, image["file_name"]), detections))
+    return tasks
+
+
+def store_tasks(store, model_identity, root=None):
+    """Tasks from raw predictions in a ResultsStore (threshold/class filter are applied by run_recrop)."""
+    return list(store.iter_results(model_identity, root=root))
+
+
+# --- Cropping ---
+
+def _class_ids(names, class_filter):
+    if not class_filter or not class_filter.strip():
+        return None
+    wanted = class_filter.strip().lower()
+    return frozenset(cid for cid, name in names.items() if name.lower() == wanted)
+
+
+def _recrop_one(task, output_dir, threshold, class_filter, names, padding, square, resize):
+    """Runs in a worker process: decodes one image, resolves its boxes and writes the crops."""
+    image_path, boxes = task
+    try:
+        image = image_utils.load_image(image_path)
+        if isinstance(boxes, str):
+            boxes = read_yolo_labels(boxes, image.size, names)
+        detections = boxes.filter(threshold, _class_ids(boxes.names or names or {}, class_filter))
+        if len(detections) == 0:
+            return image_path, 0, None
+        prefix = f"{os.path.splitext(os.path.basename(image_path))[0]}_crop"
+        crops, errors = image_utils.crop_and_save(image_path, detections, output_dir, prefix, image=image,
+                                                  padding=padding, square=square, resize=resize)
+        return image_path, crops, (f"{errors} of {len(detections)} crops could not be saved." if errors else None)
+    except Exception as e:
+        return image_path, 0, f"{type(e).__name__}: {e}"
+
+
+def run_recrop(tasks, output_dir, threshold=0.0, class_filter=None, names=None,
+               padding=config.CROP_PADDING, square=config.CROP_SQUARE, resize=config.CROP_RESIZE,
+               workers=config.RECROP_WORKERS, on_item=None):
+    """
+    Crops (image_path, boxes) tasks in parallel worker processes without loading
+    a model: decoding, cropping and JPEG encoding are spread over all cores.
+    on_item(index, image_path, crops, error) is called in task order.
+    Returns (total crops, number of failed images).
+    """
+    if not tasks:
+        return 0, 0
+    workers = max(1, workers or os.cpu_count() or 1)
+    os.makedirs(output_dir, exist_ok=True)
+    total_crops = 0
+    failed = 0
+    # spawn: the parent may have Qt loaded; workers only import PIL and numpy
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        crop_one = partial(_recrop_one, output_dir=output_dir, threshold=threshold, class_filter=class_filter,
+                           names=names, padding=padding, square=square, resize=resize)
+        results = executor.map(crop_one, tasks, chunksize=max(1, min(64, len(tasks) // (workers * 8))))
+        for i, (image_path, crops, error) in enumerate(results):
+            if error:
+                failed += 1
+                log.error(f"Error re-cropping {image_path}: {error}")
+            total_crops += crops
+            if on_item:
+                on_item(i, image_path, crops, error)
+    return total_crops, failed
@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import logging
+import numpy as np
+from .. import config # Import config from the parent package
+from .detections import Detections
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    id INTEGER PRIMARY KEY,
+    identity TEXT NOT NULL UNIQUE,
+    names TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS images_by_hash ON images (content_hash);
+CREATE TABLE IF NOT EXISTS predictions (
+    content_hash TEXT NOT NULL,
+    model_id INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    boxes BLOB NOT NULL,
+    scores BLOB NOT NULL,
+    class_ids BLOB NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (content_hash, model_id)
+) WITHOUT ROWID;
+"""
+
+
+def file_content_hash(path):
+    """BLAKE2b-128 of a file's bytes, as hex."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultsStore:
+    """
+    Persistent SQLite store of raw (unfiltered) predictions.
+    Predictions are keyed by image content hash + model identity, so renamed
+    or copied images reuse them and edited images don't; boxes, scores and
+    class ids are stored as packed float32/int32 blobs. Content hashes are
+    memoized per (path, size, mtime) so each file is hashed once.
+    Any threshold or class filter can be re-applied to the stored results,
+    and exporters.py writes them out as COCO, YOLO txt or JSONL.
+    Safe to use from several threads (one connection per thread).
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or config.RESULTS_STORE_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._local = threading.local()
+        self._model_ids = {} # identity -> row id
+        self._model_names = {} # row id -> {class id: name}
+        self._lock = threading.Lock()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Closes the calling thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- Hashing ---
+
+    def image_hash(self, image_path):
+        """Returns the content hash of image_path, hashing the file only if it changed since last time."""
+        path = os.path.abspath(image_path)
+        st = os.stat(path)
+        conn = self._conn()
+        row = conn.execute("SELECT size, mtime_ns, content_hash FROM images WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        content_hash = file_content_hash(path)
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO images (path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?)",
+                         (path, st.st_size, st.st_mtime_ns, content_hash))
+        return content_hash
+
+    # --- Reading and writing predictions ---
+
+    def get(self, image_path, model_identity):
+        """Returns the stored raw Detections for image_path and model, or None."""
+        model_id = self._model_id(model_identity, create=False)
+        if model_id is None:
+            return None
+        content_hash = self.image_hash(image_path)
+        row = self._conn().execute(
+            "SELECT width, height, boxes, scores, class_ids FROM predictions WHERE content_hash = ? AND model_id = ?",
+            (content_hash, model_id)).fetchone()
+        if row is None:
+            return None
+        return _decode(row, self._names(model_id))
+
+    def put(self, image_path, model_identity, raw):
+        self.put_many([(image_path, raw)], model_identity)
+
+    def put_many(self, items, model_identity):
+        """Stores [(image_path, raw Detections), ...] for one model in a single transaction."""
+        if not items:
+            return
+        model_id = self._model_id(model_identity, create=True, names=items[0][1].names)
+        rows = []
+        for image_path, raw in items:
+            width, height = raw.image_size or (None, None)
+            rows.append((self.image_hash(image_path), model_id, width, height,
+                         raw.boxes.astype(np.float32).tobytes(), raw.scores.astype(np.float32).tobytes(),
+                         raw.class_ids.astype(np.int32).tobytes(), time.time()))
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO predictions (content_hash, model_id, width, height, boxes, scores, class_ids, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def models(self):
+        """Identities of all models with stored results."""
+        return [identity for (identity,) in self._conn().execute("SELECT identity FROM models ORDER BY identity")]
+
+    def class_names(self, model_identity):
+        """{class id: name} of a model, or None if it has no stored results."""
+        model_id = self._model_id(model_identity, create=False)
+        return self._names(model_id) if model_id is not None else None
+
+    def iter_results(self, model_identity, root=None):
+        """
+        Yields (image_path, raw Detections) for every known image with a stored
+        prediction from model, ordered by path, optionally only under root.
+        Images that no longer exist or changed since they were hashed are skipped.
+        """
+        model_id = self._model_id(model_identity, create=False)
+        if model_id is None:
+            return
+        names = self._names(model_id)
+        query = ("SELECT i.path, i.size, i.mtime_ns, p.width, p.height, p.boxes, p.scores, p.class_ids FROM images i "
+                 "JOIN predictions p ON p.content_hash = i.content_hash WHERE p.model_id = ?")
+        params = [model_id]
+        if root:
+            prefix = os.path.join(os.path.abspath(root), "")
+            query += " AND i.path >= ? AND i.path < ?"
+            params += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+        query += " ORDER BY i.path"
+        # A separate connection, so callers may keep using the store while iterating
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            for path, size, mtime_ns, *row in conn.execute(query, params):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if st.st_size == size and st.st_mtime_ns == mtime_ns:
+                    yield path, _decode(row, names)
+        finally:
+            conn.close()
+
+    # --- Models ---
+
+    def _model_id(self, identity, create, names=None):
+        with self._lock:
+            model_id = self._model_ids.get(identity)
+        if model_id is not None:
+            return model_id
+        conn = self._conn()
+        row = conn.execute("SELECT id FROM models WHERE identity = ?", (identity,)).fetchone()
+        if row is None:
+            if not create:
+                return None
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO models (identity, names) VALUES (?, ?)",
+                             (identity, json.dumps({str(k): v for k, v in (names or {}).items()})))
+            row = conn.execute("SELECT id FROM models WHERE identity = ?", (identity,)).fetchone()
+        with self._lock:
+            self._model_ids[identity] = row[0]
+        return row[0]
+
+    def _names(self, model_id):
+        names = self._model_names.get(model_id)
+        if names is None:
+            row = self._conn().execute("SELECT names FROM models WHERE id = ?", (model_id,)).fetchone()
+            names = {int(k): v for k, v in json.loads(row[0]).items()} if row else {}
+            self._model_names[model_id] = names
+        return names
+
+
+def _decode(row, names):
+    width, height, boxes, scores, class_ids = row
+    return Detections(np.frombuffer(boxes, dtype=np.float32).reshape(-1, 4),
+                      np.frombuffer(scores, dtype=np.float32),
+                      np.frombuffer(class_ids, dtype=np.int32),
+                      names, (width, height) if width and height else None)
@@ -0,0 +1,203 @@
+import time
+import heapq
+import itertools
+import threading
+import logging
+from collections import deque
+from concurrent.futures import Future
+from .. import config # Import config from the parent package
+
+log = logging.getLogger(__name__)
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0 # Preview detections the user is waiting for
+PRIORITY_PREFETCH = 1 # Speculative detections of neighbouring images
+PRIORITY_BATCH = 2 # Batch jobs
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_PREFETCH: "prefetch", PRIORITY_BATCH: "batch"}
+
+
+class _Request:
+    __slots__ = ("priority", "seq", "inputs", "kind", "results", "offset", "future", "submitted")
+
+    def __init__(self, priority, seq, inputs):
+        self.priority = priority
+        self.seq = seq
+        self.inputs = inputs
+        self.kind = "path" if isinstance(inputs[0], str) else "image" # Ultralytics can't mix both in one call
+        self.results = []
+        self.offset = 0 # Inputs already run
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class InferenceScheduler:
+    """
+    Single owner of a model's forward passes. Callers on any thread submit
+    lists of inputs with a priority; one worker thread serves them in
+    priority order (FIFO within a priority), so the model is never called
+    concurrently and interactive requests overtake queued batch work.
+    Callers already split batch jobs into batch_size requests, and each batch
+    request runs whole in one call (the queue is re-checked between them), so
+    an interactive request waits for at most one batch forward pass. Small
+    requests of the same priority are micro-batched into one call of up to
+    max_batch inputs (or the head batch request's size, if larger); with
+    max_wait_ms > 0 the worker holds a non-batch request up to that long
+    (from its arrival) for more to join.
+    stats() reports queue depth and wait times.
+    """
+
+    def __init__(self, predict, max_batch=config.SCHEDULER_MAX_BATCH, max_wait_ms=config.SCHEDULER_MAX_WAIT_MS,
+                 name="cropvision-inference"):
+        self._predict = predict # predict(list of inputs) -> list of results, one per input
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.name = name
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._waits = {priority: deque(maxlen=config.SCHEDULER_STATS_WINDOW) for priority in PRIORITY_NAMES}
+        self.model_calls = 0
+        self.inputs_run = 0
+
+    def submit(self, inputs, priority=PRIORITY_INTERACTIVE):
+        """Queues inputs; returns a Future resolving to their results (in order)."""
+        inputs = list(inputs)
+        if not inputs:
+            future = Future()
+            future.set_result([])
+            return future
+        request = _Request(priority, next(self._seq), inputs)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Inference scheduler is closed.")
+            heapq.heappush(self._heap, request)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return request.future
+
+    def run(self, inputs, priority=PRIORITY_INTERACTIVE):
+        """Blocking submit(). Called from the worker thread itself (re-entrantly), runs the inputs directly."""
+        if threading.current_thread() is self._thread:
+            return self._predict(list(inputs))
+        return self.submit(inputs, priority).result()
+
+    def stats(self):
+        """Queue depth (requests) and recent wait times (ms, queued until first run) per priority."""
+        with self._cond:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for request in self._heap:
+                depth[PRIORITY_NAMES.get(request.priority, str(request.priority))] += 1
+            waits = {priority: sorted(samples) for priority, samples in self._waits.items()}
+            calls, inputs_run = self.model_calls, self.inputs_run
+        wait_ms = {}
+        for priority, samples in waits.items():
+            if samples:
+                wait_ms[PRIORITY_NAMES[priority]] = {
+                    "mean": round(sum(samples) / len(samples) * 1000, 1),
+                    "p95": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 1),
+                    "max": round(samples[-1] * 1000, 1),
+                }
+        return {"queue_depth": depth, "wait_ms": wait_ms, "model_calls": calls, "inputs": inputs_run}
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self, timeout=5):
+        """Stops the worker once the queue is drained."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    # --- Worker ---
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                units = self._take()
+            self._run(units)
+
+    def _take(self):
+        """Pops the next slice of work (called with the lock held): [(request, start, end), ...]."""
+        head = heapq.heappop(self._heap)
+        if head.priority == PRIORITY_BATCH:
+            capacity = max(self.max_batch, len(head.inputs) - head.offset) # Never split the caller's batch
+        else:
+            capacity = self.max_batch
+        end = min(len(head.inputs), head.offset + capacity)
+        units = [(head, head.offset, end)]
+        taken = end - head.offset
+        if end == len(head.inputs):
+            taken, mergeable = self._merge(head, units, taken, capacity)
+            if self.max_wait > 0 and head.priority != PRIORITY_BATCH:
+                deadline = head.submitted + self.max_wait
+                while mergeable and taken < capacity and not self._closed:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining) # Releases the lock so more requests can arrive
+                    taken, mergeable = self._merge(head, units, taken, capacity)
+        now = time.perf_counter()
+        for request, start, _end in units:
+            if start == 0:
+                self._waits[request.priority].append(now - request.submitted)
+        return units
+
+    def _merge(self, head, units, taken, capacity):
+        """
+        Micro-batches whole, not yet started queued requests of head's priority
+        and input kind into units (lock held). Returns (inputs taken, whether
+        the queue head could still be merged later).
+        """
+        while self._heap and taken < capacity:
+            other = self._heap[0]
+            if other.priority != head.priority or other.kind != head.kind or other.offset:
+                return taken, False
+            if taken + len(other.inputs) > capacity:
+                return taken, False
+            heapq.heappop(self._heap)
+            units.append((other, 0, len(other.inputs)))
+            taken += len(other.inputs)
+        return taken, True
+
+    def _run(self, units):
+        inputs = [x for request, start, end in units for x in request.inputs[start:end]]
+        try:
+            results = self._predict(inputs)
+            if results is None or len(results) != len(inputs):
+                raise RuntimeError(f"Model returned {len(results) if results else 0} results for {len(inputs)} inputs.")
+        except BaseException as e:
+            for request, _start, _end in units:
+                request.future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        with self._cond:
+            self.model_calls += 1
+            self.inputs_run += len(inputs)
+        position = 0
+        for request, start, end in units:
+            request.results.extend(results[position:position + end - start])
+            position += end - start
+            request.offset = end
+            if end < len(request.inputs):
+                with self._cond:
+                    heapq.heappush(self._heap, request) # Same (priority, seq): keeps its place in line
+                    self._cond.notify()
+            else:
+                request.future.set_result(request.results)
@@ -0,0 +1,311 @@
+import io
+import os
+import json
+import hashlib
+import time
+import threading
+import logging
+import urllib.request
+import urllib.error
+from urllib.parse import urlparse, parse_qsl
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from .. import config # Import config from the parent package
+from . import image_utils
+
+log = logging.getLogger(__name__)
+
+
+class RequestError(Exception):
+    """A client error, answered with its HTTP status and message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class InferenceServer(ThreadingHTTPServer):
+    """
+    Local HTTP service around one loaded Detector, so other tools on the host
+    reuse its model instead of loading their own. Every request runs on its
+    own thread; the detector's InferenceScheduler coalesces concurrent
+    requests into micro-batches (max_batch inputs, waiting up to max_wait_ms).
+
+        GET  /health  model, profile, backend and classes
+        GET  /stats   scheduler queue depth/wait times and request counts
+        POST /detect  detections in the detect_objects format
+        POST /crop    detections plus crops written to output_dir
+
+    POST bodies are either JSON ({"path": ..., "threshold": ..., ...}) naming
+    a file on this host, or raw image bytes with the options in the query
+    string. Path requests use the prediction cache unless "cache" is false.
+
+    Requests whose Host or Origin header names another host are refused, so
+    web pages open in a local browser can't reach the service. A requested
+    output_dir must lie inside output_dir (relative ones are resolved
+    against it) unless allow_any_output_dir is set.
+    """
+    daemon_threads = True
+
+    def __init__(self, detector, host=config.SERVE_HOST, port=config.SERVE_PORT,
+                 max_batch=config.SERVE_MAX_BATCH, max_wait_ms=config.SERVE_MAX_WAIT_MS,
+                 threshold=config.DEFAULT_CONF_THRESHOLD, class_filter=None, output_dir=None,
+                 allowed_hosts=config.SERVE_ALLOWED_HOSTS, allow_any_output_dir=config.SERVE_ALLOW_ANY_OUTPUT_DIR):
+        self.detector = detector
+        self.default_threshold = threshold
+        self.default_class_filter = class_filter or None
+        self.default_output_dir = output_dir
+        self.allow_any_output_dir = allow_any_output_dir
+        self.allowed_hosts = {name.lower() for name in allowed_hosts}
+        if host not in ("", "0.0.0.0", "::"):
+            self.allowed_hosts.add(host.lower())
+        detector.scheduler.max_batch = max(1, int(max_batch))
+        detector.scheduler.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.started = time.time()
+        self.counts = {"detect": 0, "crop": 0, "errors": 0}
+        self._counts_lock = threading.Lock()
+        super().__init__((host, port), _Handler)
+
+    def count(self, key):
+        with self._counts_lock:
+            self.counts[key] += 1
+
+    # --- Endpoints ---
+
+    def health(self):
+        detector = self.detector
+        return {"status": "ok", "model": detector.model_name, "profile": detector.profile, "backend": detector.backend,
+                "device": str(detector.device), "classes": detector.get_class_names()}
+
+    def stats(self):
+        with self._counts_lock:
+            counts = dict(self.counts)
+        return {"uptime_s": round(time.time() - self.started, 1), "requests": counts,
+                "scheduler": self.detector.scheduler.stats()}
+
+    def detect(self, params, body):
+        """Returns (Detections, path or None for uploads)."""
+        threshold = _number(params, "threshold", float, self.default_threshold)
+        class_filter = params.get("class_filter", self.default_class_filter) or None
+        if body is not None:
+            try:
+                image, original_size = image_utils.load_for_inference(io.BytesIO(body), self.detector.input_size)
+            except Exception as e:
+                raise RequestError(400, f"Could not decode the uploaded image: {e}")
+            return self.detector.detect_image(image, threshold, class_filter, original_size=original_size), None
+
+        path = params.get("path")
+        if not path:
+            raise RequestError(400, "Send image bytes or a JSON body with a 'path'.")
+        if not os.path.isfile(path):
+            raise RequestError(404, f"No such file: {path}")
+        if _truthy(params.get("cache", True)):
+            return self.detector.detect_objects(path, threshold, class_filter), path
+        image, original_size = image_utils.load_for_inference(path, self.detector.input_size)
+        return self.detector.detect_image(image, threshold, class_filter, original_size=original_size), path
+
+    def crop(self, params, body):
+        """Returns (Detections, path or None, crops saved, crops that failed, output_dir, prefix)."""
+        output_dir = self._output_dir(params.get("output_dir"))
+        padding = _number(params, "padding", float, config.CROP_PADDING)
+        resize = _number(params, "resize", int, config.CROP_RESIZE)
+        prefix = str(params.get("prefix") or "")
+        if prefix in (".", "..") or any(sep in prefix for sep in ("/", "\\")):
+            raise RequestError(400, f"Invalid prefix: {prefix!r} (a file name prefix, not a path)")
+        detections, path = self.detect(params, body)
+        if not prefix and path:
+            prefix = f"{os.path.splitext(os.path.basename(path))[0]}_crop"
+        elif not prefix:
+            # Uploads have no file name of their own: key them by content so concurrent uploads never collide
+            name = os.path.splitext(os.path.basename(params.get("name") or "upload"))[0]
+            prefix = f"{name}_{hashlib.blake2b(body, digest_size=6).hexdigest()}_crop"
+        crops = errors = 0
+        if len(detections):
+            image = image_utils.load_image(io.BytesIO(body)) if body is not None else None
+            crops, errors = image_utils.crop_and_save(
+                path or prefix, detections, output_dir, prefix, image=image, padding=padding,
+                square=_truthy(params.get("square", config.CROP_SQUARE)), resize=resize)
+        return detections, path, crops, errors, output_dir, prefix
+
+    def _output_dir(self, requested):
+        """The folder a /crop request writes to: the default, or a requested one confined to it."""
+        if not requested:
+            if not self.default_output_dir:
+                raise RequestError(400, "No 'output_dir' given and the server has no default output folder.")
+            return self.default_output_dir
+        requested = str(requested)
+        if self.allow_any_output_dir:
+            return requested
+        if not self.default_output_dir:
+            raise RequestError(403, "Requests can't choose 'output_dir'; start the server with --output.")
+        root = os.path.realpath(self.default_output_dir)
+        target = os.path.realpath(os.path.join(root, requested))
+        if os.path.commonpath([root, target]) != root:
+            raise RequestError(403, f"'output_dir' must be inside {root}.")
+        return target
+
+    def check_origin(self, headers):
+        """Refuses requests addressed to (Host) or sent from (Origin) a name this server doesn't answer to."""
+        host = headers.get("Host")
+        if host and _hostname(host) not in self.allowed_hosts:
+            raise RequestError(403, f"Host {host!r} not allowed.")
+        origin = headers.get("Origin")
+        if origin and _hostname(urlparse(origin).netloc) not in self.allowed_hosts:
+            raise RequestError(403, f"Origin {origin!r} not allowed.")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "CropVision"
+    protocol_version = "HTTP/1.1" # Keep-alive, so load tests don't measure connection setup
+
+    def log_message(self, format, *args):
+        log.debug(f"{self.address_string()} {format % args}")
+
+    def do_GET(self):
+        route = urlparse(self.path).path
+        try:
+            self.server.check_origin(self.headers)
+        except RequestError as e:
+            self.server.count("errors")
+            self._reply(e.status, {"error": str(e)})
+            return
+        if route == "/health":
+            self._reply(200, self.server.health())
+        elif route == "/stats":
+            self._reply(200, self.server.stats())
+        else:
+            self._reply(404, {"error": f"Unknown endpoint {route}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        started = time.perf_counter()
+        try:
+            params, body = self._read_request(url) # Read first, so the connection stays usable after a refusal
+            self.server.check_origin(self.headers)
+            if url.path == "/detect":
+                detections, path = self.server.detect(params, body)
+                self.server.count("detect")
+                result = {"path": path, "image_size": detections.image_size, **detections.to_dict()}
+            elif url.path == "/crop":
+                detections, path, crops, errors, output_dir, prefix = self.server.crop(params, body)
+                self.server.count("crop")
+                result = {"path": path, "image_size": detections.image_size, **detections.to_dict(),
+                          "crops": crops, "crop_errors": errors, "output_dir": output_dir, "prefix": prefix}
+            else:
+                raise RequestError(404, f"Unknown endpoint {url.path}")
+        except RequestError as e:
+            self.server.count("errors")
+            self._reply(e.status, {"error": str(e)})
+            return
+        except Exception as e:
+            self.server.count("errors")
+            log.error(f"Request {url.path} failed: {e}", exc_info=True)
+            self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        result["ms"] = round((time.perf_counter() - started) * 1000, 2)
+        self._reply(200, result)
+
+    def _read_request(self, url):
+        """Returns (params, image bytes or None): query string merged with a JSON body, or raw image bytes."""
+        params = dict(parse_qsl(url.query))
+        length = self.headers.get("Content-Length") or "0"
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if not 0 <= length <= config.SERVE_MAX_UPLOAD_BYTES:
+            self.close_connection = True # The body is left unread: the connection can't carry another request
+            if length < 0:
+                raise RequestError(400, f"Invalid Content-Length: {self.headers.get('Content-Length')!r}")
+            raise RequestError(413, f"Body larger than {config.SERVE_MAX_UPLOAD_BYTES} bytes.")
+        data = self.rfile.read(length) if length else b""
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        if content_type == "application/json" or (not content_type and data[:1] == b"{"):
+            try:
+                payload = json.loads(data or b"{}")
+            except ValueError as e:
+                raise RequestError(400, f"Invalid JSON: {e}")
+            if not isinstance(payload, dict):
+                raise RequestError(400, "JSON body must be an object.")
+            params.update(payload)
+            return params, None
+        return params, data or None
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _number(params, key, kind, default):
+    """params[key] parsed as kind (default if missing or empty); bad input is a 400, not a 500."""
+    value = params.get(key)
+    if value is None or value == "":
+        return default
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        raise RequestError(400, f"Invalid {key}: {value!r}")
+
+
+def _hostname(netloc):
+    """Lower-case host name of a Host header or URL netloc, without port or IPv6 brackets ("" if unparseable)."""
+    try:
+        return (urlparse(f"//{netloc}").hostname or "").lower()
+    except ValueError:
+        return ""
+
+
+def _truthy(value):
+    if isinstance(value, str):
+        return value.strip().lower() not in ("0", "false", "no", "off", "")
+    return bool(value)
+
+
+# --- Load testing ---
+
+def run_load_test(url, requests, concurrency=8, total=200, timeout=120):
+    """
+    Sends total POSTs to url from concurrency threads, cycling through
+    requests, a list of (body bytes, content type). Returns a summary with
+    requests/s and p50/p90/p99/max latency in ms.
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def one(k):
+        body, content_type = requests[k % len(requests)]
+        request = urllib.request.Request(url, data=body, method="POST", headers={"Content-Type": content_type})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+        except (urllib.error.URLError, OSError) as e:
+            with lock:
+                errors.append(str(e))
+            return
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, int(concurrency))) as executor:
+        list(executor.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    def percentile(q):
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000, 2)
+
+    return {"requests": total, "ok": len(latencies), "errors": len(errors), "concurrency": concurrency,
+            "seconds": round(elapsed, 3), "requests_per_sec": round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+            "p50_ms": percentile(0.50), "p90_ms": percentile(0.90), "p99_ms": percentile(0.99),
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+            "first_error": errors[0] if errors else None}
@@ -0,0 +1,111 @@
+import os
+import hashlib
+import threading
+import logging
+from PIL import Image
+from .. import config # Import config from the parent package
+
+log = logging.getLogger(__name__)
+
+
+class ThumbnailCache:
+    """
+    Persistent, size-bounded on-disk thumbnail cache.
+    Entries are keyed by source path + file size + mtime (+ thumbnail size),
+    so edited files get fresh thumbnails and unchanged ones are never decoded
+    again. Thumbnails are generated with reduced-resolution decoding (JPEG
+    draft mode / Image.reduce), which is far cheaper than a full decode.
+    Safe to use from several worker threads.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=config.THUMBNAIL_CACHE_MAX_BYTES, size=config.THUMBNAIL_SIZE):
+        self.cache_dir = cache_dir or os.path.join(config.CACHE_DIR, "thumbnails")
+        self.max_bytes = max_bytes
+        self.size = size
+        self._lock = threading.Lock()
+        self._total_bytes = None # Computed lazily on first write
+
+    def cache_path(self, image_path):
+        """Returns where the thumbnail for image_path lives (it may not exist yet). Raises OSError if the source is gone."""
+        st = os.stat(image_path)
+        stamp = f"{os.path.abspath(image_path)}|{st.st_size}|{st.st_mtime_ns}|{self.size}"
+        key = hashlib.sha1(stamp.encode("utf-8", "surrogateescape")).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.jpg")
+
+    def get_or_create(self, image_path):
+        """
+        Returns the path of a cached JPEG thumbnail for image_path, generating it if needed.
+        Raises on unreadable source images.
+        """
+        thumb_path = self.cache_path(image_path)
+        if os.path.exists(thumb_path):
+            try:
+                os.utime(thumb_path) # Mark as recently used for eviction
+            except OSError:
+                pass
+            return thumb_path
+
+        thumb = make_thumbnail(image_path, self.size)
+        os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+        tmp_path = f"{thumb_path}.{threading.get_ident()}.tmp"
+        thumb.save(tmp_path, "JPEG", quality=85)
+        os.replace(tmp_path, thumb_path)
+        self._account(os.path.getsize(thumb_path))
+        return thumb_path
+
+    def _account(self, added_bytes):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._total_bytes += added_bytes
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        """Yields (path, size, mtime) for every cached thumbnail."""
+        try:
+            shards = list(os.scandir(self.cache_dir))
+        except OSError:
+            return
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            with os.scandir(shard.path) as entries:
+                for entry in entries:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    yield entry.path, st.st_size, st.st_mtime
+
+    def _evict(self):
+        """Deletes least recently used thumbnails until the cache is at 90% of max_bytes. Caller holds the lock."""
+        target = int(self.max_bytes * 0.9)
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        self._total_bytes = total
+        log.info(f"Evicted {removed} thumbnails; cache now {total / (1024 * 1024):.1f} MB.")
+
+
+def make_thumbnail(image_path, size):
+    """
+    Decodes image_path at reduced resolution and returns an RGB PIL thumbnail
+    that fits within size x size.
+    """
+    with Image.open(image_path) as img:
+        # JPEG: let the decoder scale by 1/2..1/8 via DCT instead of decoding full size
+        img.draft("RGB", (size, size))
+        # reducing_gap makes thumbnail() use Image.reduce before the final resample
+        img.thumbnail((size, size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+        return img.convert("RGB")
@@ -0,0 +1,62 @@
+import numpy as np
+
+
+def tile_windows(width, height, tile_size, overlap=0.0):
+    """
+    Covers a width x height image with tile_size squares overlapping by the
+    given fraction. The last row/column is shifted back to end at the image
+    border, so every tile is full size unless the image itself is smaller.
+    Returns a list of (x1, y1, x2, y2).
+    """
+    tile_size = max(1, int(tile_size))
+    step = max(1, int(tile_size * (1.0 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size + 1, step))
+        if positions[-1] + tile_size < length:
+            positions.append(length - tile_size)
+        return positions
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def merge_boxes(boxes, scores, class_ids, iou_threshold=0.5, ios_threshold=None):
+    """
+    Class-aware greedy NMS over xyxy boxes gathered from several tiles.
+    A box is suppressed by a higher-scoring box of the same class if their IoU
+    exceeds iou_threshold or, with ios_threshold, if their intersection covers
+    that fraction of the smaller box (a partial box cut at a tile edge inside
+    the full one). Returns the indices to keep, by descending score.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    scores = np.asarray(scores, dtype=np.float32)
+    class_ids = np.asarray(class_ids)
+    areas = np.maximum(boxes[:, 2] - boxes[:, 0], 0) * np.maximum(boxes[:, 3] - boxes[:, 1], 0)
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        rest = rest[class_ids[rest] == class_ids[i]]
+        if rest.size:
+            w = np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(boxes[i, 0], boxes[rest, 0])
+            h = np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(boxes[i, 1], boxes[rest, 1])
+            inter = np.maximum(w, 0) * np.maximum(h, 0)
+            suppress = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9) > iou_threshold
+            if ios_threshold is not None:
+                suppress |= inter / np.maximum(np.minimum(areas[i], areas[rest]), 1e-9) > ios_threshold
+            order = order[1:][~np.isin(order[1:], rest[suppress])]
+        else:
+            order = order[1:]
+    return np.array(keep, dtype=np.int64)
+
+
+def identity_suffix(tile_size, overlap):
+    """Suffix added to model identities when tiled inference is on (tiling changes the predictions)."""
+    return f"+tiles{int(tile_size)}o{round(float(overlap), 3)}"
@@ -0,0 +1,297 @@
+import os
+import time
+import threading
+import logging
+from .. import config # Import config from the parent package
+from . import image_utils
+from .journal import BatchJournal
+from .pipeline import BatchPipeline
+
+log = logging.getLogger(__name__)
+
+
+class FolderWatcher:
+    """
+    Watch mode for folders that keep receiving images (e.g. camera drops on a
+    share). Images created or re-written under src_dir are pushed through a
+    BatchPipeline (detection + crop_and_save) in rounds of at most max_batch
+    images, one round at a time, so the pipeline's bounded threads and queues
+    are the only concurrency.
+
+    Changes arrive as filesystem events when the watchdog package is installed
+    (with a safety rescan every rescan_interval, since network shares may not
+    deliver events), otherwise from rescans every poll_interval. A file is
+    only read once its size and mtime have stayed unchanged for settle
+    seconds, so partial writes are never processed. Finished images are
+    recorded in the output folder's BatchJournal with their mtime: a file is
+    processed again only if it is re-written, also across restarts. A file
+    whose detection or cropping fails is retried after retry_delay seconds,
+    up to retry_limit attempts per version of the file.
+    """
+
+    def __init__(self, detector, src_dir, output_dir, threshold, class_filter,
+                 batch_size=config.DEFAULT_BATCH_SIZE, max_batch=config.WATCH_MAX_BATCH,
+                 settle=config.WATCH_SETTLE_SECONDS, poll_interval=config.WATCH_POLL_INTERVAL,
+                 rescan_interval=config.WATCH_RESCAN_INTERVAL, use_events=config.WATCH_USE_EVENTS,
+                 process_existing=config.WATCH_PROCESS_EXISTING, resume=config.RESUME_BATCHES,
+                 retry_limit=config.WATCH_RETRY_LIMIT, retry_delay=config.WATCH_RETRY_DELAY):
+        self.detector = detector
+        self.src_dir = os.path.abspath(src_dir)
+        self.output_dir = output_dir
+        self.threshold = threshold
+        self.class_filter = class_filter
+        self.batch_size = max(1, int(batch_size))
+        self.max_batch = max(1, int(max_batch))
+        self.settle = max(0.0, float(settle))
+        self.poll_interval = max(0.1, float(poll_interval))
+        self.rescan_interval = max(self.poll_interval, float(rescan_interval))
+        self.use_events = use_events
+        self.process_existing = process_existing
+        self.resume = resume
+        self.retry_limit = max(1, int(retry_limit))
+        self.retry_delay = max(0.0, float(retry_delay))
+        # The watcher decides what is new; the pipeline must not skip re-written files the journal lists
+        self.journal = BatchJournal(output_dir, detector.model_identity, threshold, class_filter, resume=False)
+
+        self.events = False # Whether filesystem events are being delivered
+        self.rounds = 0
+        self.processed = 0
+        self.total_saved_crops = 0
+        self._seen = {} # path -> (size, mtime_ns) already processed (or present and skipped at start)
+        self._pending = {} # path -> ((size, mtime_ns), time it last changed, time it was first seen)
+        self._attempts = {} # path -> ((size, mtime_ns), failed attempts at that version)
+        self._hints = set() # Paths reported by filesystem events, checked on the next pass
+        self._hints_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def run(self, on_item=None, on_round=None, is_cancelled=None):
+        """
+        Watches until stop() is called or is_cancelled() returns True.
+        on_item(path, message) is called from pipeline writer threads for every
+        finished image, on_round(summary) after every round. Returns the number
+        of crops saved.
+        """
+        is_cancelled = is_cancelled or (lambda: False)
+        self._stop.clear()
+        observer = self._start_observer() if self.use_events else None
+        self.events = observer is not None
+        interval = self.rescan_interval if self.events else self.poll_interval
+        try:
+            self._initial_scan()
+            next_scan = time.monotonic() + interval
+            while not self._stop.is_set() and not is_cancelled():
+                if time.monotonic() >= next_scan:
+                    self._rescan()
+                    next_scan = time.monotonic() + interval
+                self._check_hints()
+                ready = self._settled()
+                if ready:
+                    self._process(ready, on_item, on_round, is_cancelled)
+                    continue
+                timeout = next_scan - time.monotonic()
+                if self._pending:
+                    timeout = min(timeout, self.settle / 4)
+                self._wake.wait(max(0.05, timeout))
+                self._wake.clear()
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join(5)
+            self.journal.close()
+        return self.total_saved_crops
+
+    def stop(self):
+        """Ends run() after the current round (thread-safe)."""
+        self._stop.set()
+        self._wake.set()
+
+    def pending(self):
+        """Number of changed files waiting to settle."""
+        return len(self._pending)
+
+    # --- Change detection ---
+
+    def _initial_scan(self):
+        snapshot = self._scan()
+        done = self.journal.completed_versions() if self.resume else {}
+        for path, signature in snapshot.items():
+            if not self.process_existing or (path in done and done[path] in (None, signature[1])):
+                self._seen[path] = signature
+            else:
+                self._offer(path, signature)
+        mode = "filesystem events" if self.events else f"polling every {self.poll_interval:g}s"
+        log.info(f"Watching '{self.src_dir}' ({mode}): {len(snapshot)} images, {len(self._pending)} to process.")
+
+    def _rescan(self):
+        snapshot = self._scan()
+        for path, signature in snapshot.items():
+            self._offer(path, signature)
+        for path in [p for p in self._seen if p not in snapshot]:
+            del self._seen[path] # Deleted; forget it
+            self._attempts.pop(path, None)
+        for path in [p for p in self._pending if p not in snapshot]:
+            del self._pending[path]
+
+    def _scan(self):
+        """Returns {path: (size, mtime_ns)} of every image under src_dir."""
+        snapshot = {}
+        for batch in image_utils.iter_images(self.src_dir):
+            for path in batch:
+                signature = _signature(path)
+                if signature is not None:
+                    snapshot[path] = signature
+        return snapshot
+
+    def _check_hints(self):
+        with self._hints_lock:
+            hints, self._hints = self._hints, set()
+        for path in hints:
+            if os.path.isdir(path): # A folder moved in: its files raise no events of their own
+                for batch in image_utils.iter_images(path):
+                    for file_path in batch:
+                        self._offer(file_path, _signature(file_path))
+            else:
+                self._offer(path, _signature(path))
+
+    def _offer(self, path, signature):
+        """Tracks a possibly changed file until it settles (signature None = gone)."""
+        if signature is None:
+            self._pending.pop(path, None)
+            return
+        if self._seen.get(path) == signature:
+            self._pending.pop(path, None)
+            return
+        entry = self._pending.get(path)
+        if entry is None:
+            now = time.monotonic()
+            self._pending[path] = (signature, now, now)
+        elif entry[0] != signature:
+            self._pending[path] = (signature, time.monotonic(), entry[2])
+
+    def _settled(self):
+        """
+        Takes up to max_batch pending files unchanged for settle seconds, oldest
+        arrival first. Returns [(path, signature, first seen)].
+        """
+        now = time.monotonic()
+        ready = []
+        for path, (signature, changed, first_seen) in list(self._pending.items()):
+            if now - changed < self.settle:
+                continue
+            current = _signature(path)
+            if current != signature: # Still being written (or gone)
+                self._offer(path, current)
+                continue
+            if signature[0] == 0:
+                continue # Empty placeholder: the writer hasn't started yet
+            ready.append((first_seen, path))
+        ready.sort()
+        taken = []
+        for first_seen, path in ready[:self.max_batch]:
+            taken.append((path, self._pending.pop(path)[0], first_seen))
+        return taken
+
+    def _hint(self, path):
+        with self._hints_lock:
+            self._hints.add(path)
+        self._wake.set()
+
+    def _start_observer(self):
+        """Starts a watchdog observer on src_dir; returns None if watchdog is missing or can't watch it."""
+        try:
+            from watchdog.observers import Observer
+        except ImportError:
+            log.info("watchdog is not installed; watching by polling.")
+            return None
+        observer = Observer()
+        try:
+            observer.schedule(_EventHandler(self), self.src_dir, recursive=True)
+            observer.start()
+        except OSError as e:
+            log.warning(f"Filesystem events unavailable for '{self.src_dir}' ({e}); watching by polling.")
+            return None
+        return observer
+
+    # --- Processing ---
+
+    def _process(self, ready, on_item, on_round, is_cancelled):
+        paths = [path for path, _signature, _first_seen in ready]
+        started = time.perf_counter()
+        pipeline = BatchPipeline(self.detector, paths, self.threshold, self.class_filter, self.output_dir,
+                                 batch_size=self.batch_size, journal=self.journal)
+
+        finished = set()
+
+        def item(i, message, _processed):
+            finished.add(i)
+            if on_item:
+                on_item(paths[i], message)
+
+        crops = pipeline.run(on_item=item, is_cancelled=lambda: self._stop.is_set() or is_cancelled())
+        for error in pipeline.errors:
+            log.error(f"Watch round failed: {error}")
+        self.rounds += 1
+        self.processed += pipeline.processed
+        self.total_saved_crops += crops
+        failed = self._settle_outcomes(ready, finished, pipeline.failed)
+        oldest = min(first_seen for _path, _signature, first_seen in ready)
+        summary = {"images": len(paths), "crops": crops, "seconds": round(time.perf_counter() - started, 3),
+                   "max_latency_s": round(time.monotonic() - oldest, 3), "failed": failed,
+                   "pending": len(self._pending), "errors": list(pipeline.errors)}
+        log.info(f"Watch round {self.rounds}: {len(paths)} images, {crops} crops in {summary['seconds']}s.")
+        if on_round:
+            on_round(summary)
+
+
+    def _settle_outcomes(self, ready, finished, failed):
+        """
+        Marks the round's successful files as seen and re-queues failed ones
+        (after retry_delay, up to retry_limit attempts per file version);
+        files the round never reached (stopped) stay unseen. Returns the number
+        of failed files.
+        """
+        for i, (path, signature, first_seen) in enumerate(ready):
+            if i not in finished:
+                continue
+            if i not in failed:
+                self._seen[path] = signature
+                self._attempts.pop(path, None)
+                continue
+            version, attempts = self._attempts.get(path, (signature, 0))
+            attempts = attempts + 1 if version == signature else 1
+            if attempts >= self.retry_limit:
+                log.warning(f"Giving up on {path} after {attempts} failed attempts (retried once it changes).")
+                self._seen[path] = signature
+                self._attempts.pop(path, None)
+            else:
+                self._attempts[path] = (signature, attempts)
+                # "Changed" in the future: settles again retry_delay from now
+                self._pending[path] = (signature, time.monotonic() + self.retry_delay, first_seen)
+        return len(failed)
+
+
+class _EventHandler:
+    """watchdog handler (watchdog only calls dispatch): hints changed images and folders to the watcher."""
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def dispatch(self, event):
+        if event.event_type not in ("created", "modified", "moved", "closed"):
+            return
+        path = os.fsdecode(getattr(event, "dest_path", None) or event.src_path)
+        if event.is_directory:
+            if event.event_type != "modified":
+                self.watcher._hint(path)
+        elif path.lower().endswith(config.SUPPORTED_EXTENSIONS):
+            self.watcher._hint(path)
+
+
+def _signature(path):
+    """(size, mtime_ns) of path, or None if it is gone."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
@@ -3,19 +3,25 @@ import os
 import logging
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QLabel, QFileDialog, QListWidget, QListWidgetItem,
+    QPushButton, QLabel, QFileDialog, QListView,
     QSlider, QLineEdit, QMessageBox, QSplitter, QProgressDialog, QCompleter,
-    QSizePolicy, QStatusBar
+    QSizePolicy, QStatusBar, QComboBox, QCheckBox
 )
 from PyQt6.QtCore import (
-    Qt, QThreadPool, pyqtSignal, QSize, QStringListModel, QTimer
+    Qt, QThreadPool, pyqtSignal, QSize, QStringListModel, QTimer, QModelIndex, QRectF
 )
-from PyQt6.QtGui import QPixmap, QIcon, QPainter, QColor, QPen, QGuiApplication, QIcon
+from PyQt6.QtGui import QPixmap, QIcon, QPainter, QColor, QPen, QGuiApplication, QIcon, QImageReader
 
 from .. import config
 from ..core.detector import Detector
-from ..core import image_utils
-from .workers import GenericRunnable, BatchProcessingRunnable
+from ..core import image_utils, model_meta
+from ..core.thumbnails import ThumbnailCache
+from ..core.image_index import ImageIndex, SORT_INSERTION, SORT_NAME, SORT_MTIME
+from .workers import (
+    GenericRunnable, BatchProcessingRunnable, DirectoryScanRunnable, CatalogSyncRunnable, DetectionPrefetchRunnable,
+    WatchFolderRunnable
+)
+from .thumbnail_model import ThumbnailListModel, IMAGE_ID_ROLE
 
 log = logging.getLogger(__name__)
 
@@ -27,21 +33,48 @@ class MainWindow(QMainWindow):
         
         self.source_dir = ""
         self.dest_dir = config.DEFAULT_OUTPUT_DIR
-        self.all_image_files = []
-        self.current_page_files = []
+        self.image_index = ImageIndex() # All images of the source folder
         self.current_image_path = None
+        self.current_image_id = None # image_index id of the selected image
         self.current_detections = None
         self.current_page = 0
+        self.paginated = config.THUMBNAIL_PAGINATED # Previous/Next pages instead of one scrolling grid
         self.items_per_page = config.DEFAULT_ITEMS_PER_PAGE
-        self.current_pixmap = None # Cache the original pixmap
+        self.current_pixmap = None # Preview-resolution decode of the current image
+        self.current_image_size = None # Full-resolution QSize of the current image (detections use its coordinates)
+        self._scaled_base = None # current_pixmap scaled to the preview label, reused until the label resizes
+        self._scaled_base_key = None
         self.batch_worker = None # To hold reference for cancellation
+        self.scan_worker = None # Source folder scan in progress, if any
+        self.mtime_index = None # ImageIndex whose missing mtimes are being read in the background, if any
+        self.watch_worker = None # Watch-folder job cropping new arrivals, if any
 
         self.detector = Detector()
         self.threadpool = QThreadPool()
         log.info(f"Thread pool started with max {self.threadpool.maxThreadCount()} threads.")
 
+        # Thumbnails get their own pool so they never queue behind detections
+        self.thumbnail_pool = QThreadPool()
+        self.thumbnail_pool.setMaxThreadCount(config.THUMBNAIL_WORKERS)
+        self.thumbnail_cache = ThumbnailCache()
+
+        # Speculative detection of neighbouring images runs one image at a time, at the scheduler's prefetch priority
+        self.prefetch_pool = QThreadPool()
+        self.prefetch_pool.setMaxThreadCount(1)
+        self.prefetch_worker = None
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(config.PREFETCH_IDLE_MS)
+        self.prefetch_timer.timeout.connect(self._start_prefetch)
+
+        # Inference queue stats in the status bar while a batch shares the model with previews
+        self.scheduler_stats_timer = QTimer(self)
+        self.scheduler_stats_timer.setInterval(1000)
+        self.scheduler_stats_timer.timeout.connect(self._show_scheduler_stats)
+
         self._set_initial_window_size()
         self._init_ui()
+        self.load_cached_class_names()
         self.update_button_states()
 
     def _init_ui(self):
@@ -104,24 +137,53 @@ class MainWindow(QMainWindow):
         model_layout = QHBoxLayout()
         self.model_name_input = QLineEdit(config.DEFAULT_MODEL_NAME)
         self.model_name_input.setPlaceholderText("e.g., yolov8n.pt or path/to/model.pt")
+        self.model_name_input.editingFinished.connect(self.load_cached_class_names)
         self.load_model_btn = QPushButton("Load Model")
         self.load_model_btn.clicked.connect(self.load_model)
         model_layout.addWidget(QLabel("Model:"))
         model_layout.addWidget(self.model_name_input)
         model_layout.addWidget(self.load_model_btn)
+        self.profile_combo = QComboBox()
+        self.profile_combo.setToolTip("Performance profile: input size, precision and torch settings used for inference")
+        for profile, settings in config.PERFORMANCE_PROFILES.items():
+            self.profile_combo.addItem(f"{profile} ({settings.get('imgsz', 640)}px)", profile)
+        self.profile_combo.setCurrentIndex(max(0, self.profile_combo.findData(config.DEFAULT_PROFILE)))
+        self.profile_combo.currentIndexChanged.connect(self.on_profile_changed)
+        model_layout.addWidget(QLabel("Profile:"))
+        model_layout.addWidget(self.profile_combo)
         layout.addLayout(model_layout)
         self.model_status_label = QLabel("Model: Not loaded")
         layout.addWidget(self.model_status_label)
 
-        # Thumbnails
-        self.thumbnail_list_widget = QListWidget()
-        self.thumbnail_list_widget.setIconSize(QSize(100, 100))
-        self.thumbnail_list_widget.setViewMode(QListWidget.ViewMode.IconMode)
-        self.thumbnail_list_widget.setResizeMode(QListWidget.ResizeMode.Adjust)
-        self.thumbnail_list_widget.setMovement(QListWidget.Movement.Static)
-        self.thumbnail_list_widget.currentItemChanged.connect(self.on_thumbnail_selected)
-        self.thumbnail_list_widget.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
-        layout.addWidget(self.thumbnail_list_widget)
+        # Sort / filter
+        view_layout = QHBoxLayout()
+        view_layout.addWidget(QLabel("Sort:"))
+        self.sort_combo = QComboBox()
+        self.sort_combo.addItem("Folder order", SORT_INSERTION)
+        self.sort_combo.addItem("Name", SORT_NAME)
+        self.sort_combo.addItem("Modified", SORT_MTIME)
+        self.sort_combo.currentIndexChanged.connect(self.on_view_options_changed)
+        view_layout.addWidget(self.sort_combo)
+        self.detections_only_checkbox = QCheckBox("With detections only")
+        self.detections_only_checkbox.toggled.connect(self.on_view_options_changed)
+        view_layout.addWidget(self.detections_only_checkbox)
+        layout.addLayout(view_layout)
+
+        # Thumbnails (virtualized: only rows in view are materialized and thumbnailed)
+        self.thumbnail_model = ThumbnailListModel(self.thumbnail_cache, self.thumbnail_pool, self)
+        self.thumbnail_view = QListView()
+        self.thumbnail_view.setModel(self.thumbnail_model)
+        self.thumbnail_view.setIconSize(QSize(config.THUMBNAIL_SIZE, config.THUMBNAIL_SIZE))
+        self.thumbnail_view.setGridSize(QSize(config.THUMBNAIL_SIZE + 30, config.THUMBNAIL_SIZE + 30))
+        self.thumbnail_view.setViewMode(QListView.ViewMode.IconMode)
+        self.thumbnail_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.thumbnail_view.setMovement(QListView.Movement.Static)
+        self.thumbnail_view.setUniformItemSizes(True) # Lay out without asking every row for its size
+        self.thumbnail_view.setVerticalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        self.thumbnail_view.selectionModel().currentChanged.connect(self.on_thumbnail_selected)
+        self.thumbnail_view.verticalScrollBar().valueChanged.connect(self._prefetch_thumbnails)
+        self.thumbnail_view.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        layout.addWidget(self.thumbnail_view)
 
         # Pagination
         pagination_layout = QHBoxLayout()
@@ -133,6 +195,8 @@ class MainWindow(QMainWindow):
         pagination_layout.addWidget(self.prev_btn)
         pagination_layout.addWidget(self.page_label, alignment=Qt.AlignmentFlag.AlignCenter)
         pagination_layout.addWidget(self.next_btn)
+        self.prev_btn.setVisible(self.paginated)
+        self.next_btn.setVisible(self.paginated)
         layout.addLayout(pagination_layout)
 
         return widget
@@ -173,6 +237,7 @@ class MainWindow(QMainWindow):
         self.class_completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
         self.class_completer.setFilterMode(Qt.MatchFlag.MatchContains)
         self.class_filter_input.setCompleter(self.class_completer)
+        self.class_filter_input.editingFinished.connect(self.on_class_filter_changed)
         class_filter_layout.addWidget(self.class_filter_input)
         controls_layout.addLayout(class_filter_layout)
 
@@ -185,6 +250,11 @@ class MainWindow(QMainWindow):
         self.delete_btn.setStyleSheet("background-color: #FF7F7F;")
         self.delete_btn.clicked.connect(self.delete_selected_image)
         actions1_layout.addWidget(self.delete_btn)
+        self.prefetch_checkbox = QCheckBox("Pre-detect neighbours")
+        self.prefetch_checkbox.setToolTip("Detect the next/previous images in the background while you review")
+        self.prefetch_checkbox.setChecked(config.PREFETCH_DETECTIONS)
+        self.prefetch_checkbox.toggled.connect(self.on_prefetch_toggled)
+        actions1_layout.addWidget(self.prefetch_checkbox)
         controls_layout.addLayout(actions1_layout)
 
         # Actions 2
@@ -192,12 +262,17 @@ class MainWindow(QMainWindow):
         self.save_crop_btn = QPushButton("Save Current Crop(s)")
         self.save_crop_btn.clicked.connect(self.save_current_image_crops)
         actions2_layout.addWidget(self.save_crop_btn)
-        self.save_page_crops_btn = QPushButton("Save Page Crops")
+        self.save_page_crops_btn = QPushButton("Save Page Crops" if self.paginated else "Save Visible Crops")
         self.save_page_crops_btn.clicked.connect(self.save_page_images_crops)
         actions2_layout.addWidget(self.save_page_crops_btn)
         self.save_all_crops_btn = QPushButton("Save All Pages Crops")
         self.save_all_crops_btn.clicked.connect(self.save_all_images_crops)
         actions2_layout.addWidget(self.save_all_crops_btn)
+        self.watch_btn = QPushButton("Watch Folder")
+        self.watch_btn.setCheckable(True)
+        self.watch_btn.setToolTip("Detect and crop images as they arrive in the source folder")
+        self.watch_btn.toggled.connect(self.on_watch_toggled)
+        actions2_layout.addWidget(self.watch_btn)
         controls_layout.addLayout(actions2_layout)
 
         layout.addWidget(controls_widget)
@@ -228,24 +303,25 @@ class MainWindow(QMainWindow):
 
     def update_button_states(self):
         has_model = self.detector.is_loaded()
-        has_source = bool(self.source_dir and self.all_image_files)
+        has_source = bool(self.source_dir and len(self.image_index))
         has_current_image = self.current_image_path is not None
         has_detections = self.current_detections is not None and len(self.current_detections['boxes']) > 0
 
         self.detect_btn.setEnabled(has_model and has_current_image)
         self.save_crop_btn.setEnabled(has_model and has_current_image and has_detections and bool(self.dest_dir))
-        self.save_page_crops_btn.setEnabled(has_model and has_source and bool(self.dest_dir) and len(self.current_page_files) > 0)
-        self.save_all_crops_btn.setEnabled(has_model and has_source and bool(self.dest_dir))
+        self.save_page_crops_btn.setEnabled(has_model and has_source and bool(self.dest_dir) and self.thumbnail_model.rowCount() > 0)
+        self.save_all_crops_btn.setEnabled(has_model and has_source and bool(self.dest_dir) and self.scan_worker is None)
+        self.watch_btn.setEnabled(self.watch_worker is not None or (has_model and bool(self.source_dir) and bool(self.dest_dir)))
         self.delete_btn.setEnabled(has_current_image)
+        self.sort_combo.setEnabled(self.scan_worker is None)
+        self.detections_only_checkbox.setEnabled(self.scan_worker is None)
+
+        if not self.paginated:
+            self.page_label.setText(f"{self.image_index.view_size()} images")
+            return
+        total_pages = self._total_pages()
+        current_p = self.current_page if self.image_index.view_size() > 0 else 0
 
-        total_files = len(self.all_image_files)
-        if total_files == 0:
-            total_pages = 1
-            current_p = 0
-        else:
-            total_pages = (total_files + self.items_per_page - 1) // self.items_per_page
-            current_p = self.current_page
-        
         self.prev_btn.setEnabled(current_p > 0)
         self.next_btn.setEnabled(current_p < total_pages - 1)
         self.page_label.setText(f"Page {current_p + 1}/{total_pages}")
@@ -254,6 +330,7 @@ class MainWindow(QMainWindow):
     def select_source_dir(self):
         dir_path = QFileDialog.getExistingDirectory(self, "Select Source Directory")
         if dir_path:
+            self._stop_watching()
             self.source_dir = dir_path
             self.source_label.setText(f"Source: {self.source_dir}")
             log.info(f"Source directory selected: {self.source_dir}")
@@ -263,6 +340,7 @@ class MainWindow(QMainWindow):
     def select_dest_dir(self):
         dir_path = QFileDialog.getExistingDirectory(self, "Select Output Directory", self.dest_dir)
         if dir_path:
+            self._stop_watching()
             self.dest_dir = dir_path
             self.dest_label.setText(f"Output: {self.dest_dir}")
             log.info(f"Destination directory selected: {self.dest_dir}")
@@ -274,20 +352,30 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Model Name Missing", "Please enter a model name or path.")
             return
 
+        self._cancel_prefetch()
+        self._stop_watching() # The watcher would keep running the old model
         self.model_status_label.setText(f"Loading model: {model_name}...")
         self.load_model_btn.setEnabled(False)
 
         runnable = GenericRunnable(self.detector.init_model, model_name)
+        runnable.kwargs['profile'] = self.profile_combo.currentData()
+        runnable.kwargs['progress_callback'] = runnable.signals.message.emit # Report warm-up stages
+        runnable.signals.message.connect(lambda msg: self.model_status_label.setText(f"Loading model: {model_name} - {msg}"))
         runnable.signals.result.connect(self.on_model_loaded)
         runnable.signals.error.connect(self.on_model_load_error)
         runnable.signals.finished.connect(lambda: self.load_model_btn.setEnabled(True))
         self.threadpool.start(runnable)
 
+    def on_profile_changed(self, _index):
+        """Reloads the model with the new profile; an unloaded model picks it up on its next load."""
+        if self.detector.is_loaded() and self.load_model_btn.isEnabled():
+            self.load_model()
+
     def on_model_loaded(self, result):
         success, msg = result
         if success:
             model_name = os.path.basename(self.model_name_input.text().strip())
-            self.model_status_label.setText(f"Model: {model_name} loaded.")
+            self.model_status_label.setText(f"Model: {model_name} loaded ({self.detector.profile}).")
             QMessageBox.information(self, "Model Loaded", msg)
             class_names = self.detector.get_class_names()
             if class_names:
@@ -295,11 +383,22 @@ class MainWindow(QMainWindow):
                 self.class_completer.setModel(completer_model)
             else:
                 log.warning("Model loaded but no class names found.")
+            self._schedule_prefetch()
         else:
             self.model_status_label.setText("Model: Load failed.")
             QMessageBox.critical(self, "Model Load Error", msg)
         self.update_button_states()
 
+    def load_cached_class_names(self):
+        """Fills the class-filter completer from the on-disk model metadata cache, without loading the model."""
+        if self.detector.is_loaded():
+            return
+        model_name = self.model_name_input.text().strip()
+        class_names = model_meta.load_class_names(model_name) if model_name else None
+        if class_names:
+            self.class_completer.setModel(QStringListModel(class_names))
+            log.debug(f"Loaded {len(class_names)} cached class names for '{model_name}'.")
+
     def on_model_load_error(self, error_msg):
         self.model_status_label.setText("Model: Load failed.")
         QMessageBox.critical(self, "Model Load Error", f"Failed to load model: {error_msg}")
@@ -307,127 +406,369 @@ class MainWindow(QMainWindow):
         self.update_button_states()
 
     def load_image_files_from_source(self):
+        """Starts a background scan; the first page shows as soon as enough images are found."""
         if not self.source_dir: return
-        self.all_image_files = image_utils.list_images(self.source_dir)
-        if not self.all_image_files:
-            QMessageBox.information(self, "No Images", "No supported image files found in the selected directory.")
+        if self.scan_worker:
+            self.scan_worker.cancel()
+
+        self.image_index = ImageIndex() # Insertion order while scanning; sort/filter apply once complete
         self.current_page = 0
+        self.on_thumbnail_selected(QModelIndex(), QModelIndex()) # Clear the preview of the previous folder
         self.update_thumbnails_for_page()
+
+        if config.USE_FILE_CATALOG:
+            self.scan_worker = CatalogSyncRunnable(self.source_dir)
+        else:
+            self.scan_worker = DirectoryScanRunnable(self.source_dir)
+        worker = self.scan_worker
+        worker.signals.items_found.connect(lambda paths: self.on_scan_items_found(worker, paths))
+        worker.signals.message.connect(lambda msg: self.statusBar.showMessage(msg) if worker is self.scan_worker else None)
+        worker.signals.result.connect(lambda result: self.on_scan_complete(worker, result))
+        worker.signals.error.connect(self.on_task_error)
+        worker.signals.finished.connect(lambda: self._on_scan_finished(worker))
+        self.threadpool.start(worker)
         self.update_button_states()
 
-    def update_thumbnails_for_page(self):
-        self.thumbnail_list_widget.clear()
-        self.current_page_files = []
-        if not self.all_image_files:
-            self.update_button_states()
+    def on_scan_items_found(self, worker, paths):
+        if worker is not self.scan_worker:
+            return # Results from a scan that was superseded
+        self.image_index.extend(paths)
+        self.thumbnail_model.sync_rows() # Appends rows without resetting what's already shown
+        if not self.thumbnail_view.currentIndex().isValid() and self.thumbnail_model.rowCount() > 0:
+            self.thumbnail_view.setCurrentIndex(self.thumbnail_model.index(0))
+        self.update_button_states() # Image count keeps growing
+
+    def on_scan_complete(self, worker, result):
+        """
+        result is the image count from a DirectoryScanRunnable, or the removed
+        paths (None if unchanged) from a CatalogSyncRunnable.
+        """
+        if worker is not self.scan_worker:
             return
+        if isinstance(result, int):
+            self.statusBar.showMessage(f"Found {result} images in {self.source_dir}.")
+        if result is not None:
+            # Batches arrive in filesystem order; settle on the catalog's folder/name order once complete
+            removed = set(result) if isinstance(result, list) else ()
+            self.image_index.set_view(SORT_NAME)
+            self.image_index = ImageIndex([path for path in self.image_index.view_paths() if path not in removed])
+        self._apply_view_options()
+        if not len(self.image_index):
+            self.update_thumbnails_for_page()
+            QMessageBox.information(self, "No Images", "No supported image files found in the selected directory.")
+            return
+        if result is None and self.sort_combo.currentData() == SORT_INSERTION and not self.detections_only_checkbox.isChecked():
+            return # Catalog unchanged and still in scan order: the model already shows the final view
+        if self.current_image_path:
+            self.current_image_id = self.image_index.find(self.current_image_path) # Ids change with a new index
+        self.current_page = self.image_index.clamp_page(self.current_page, self.items_per_page)
+        self.update_thumbnails_for_page()
 
-        start_idx = self.current_page * self.items_per_page
-        end_idx = min(start_idx + self.items_per_page, len(self.all_image_files))
-        self.current_page_files = self.all_image_files[start_idx:end_idx]
-
-        for img_path in self.current_page_files:
-            try:
-                pixmap = QPixmap(img_path)
-                item = QListWidgetItem(QIcon(pixmap.scaled(100, 100, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)), os.path.basename(img_path))
-                item.setData(Qt.ItemDataRole.UserRole, img_path)
-                self.thumbnail_list_widget.addItem(item)
-            except Exception as e:
-                log.error(f"Error loading thumbnail for {img_path}: {e}")
-        
-        # Select first item if none selected
-        if self.thumbnail_list_widget.count() > 0 and self.thumbnail_list_widget.currentRow() == -1:
-            self.thumbnail_list_widget.setCurrentRow(0)
+    def _on_scan_finished(self, worker):
+        if worker is self.scan_worker:
+            self.scan_worker = None
+            if self.sort_combo.currentData() == SORT_MTIME:
+                self._read_mtimes_in_background()
+        self.update_button_states()
 
+    def update_thumbnails_for_page(self):
+        """Points the thumbnail model at the current view (one page of it in paginated mode)."""
+        if self.paginated:
+            self.thumbnail_model.set_index(self.image_index, self.current_page * self.items_per_page, self.items_per_page)
+        else:
+            self.thumbnail_model.set_index(self.image_index)
+        self._restore_selection()
         self.update_button_states()
 
+    def _restore_selection(self):
+        """After a model reset: re-selects the current image if it is shown, else the first row."""
+        row = self.thumbnail_model.row_of(self.current_image_id)
+        if row is None:
+            row = 0
+        if row < self.thumbnail_model.rowCount():
+            index = self.thumbnail_model.index(row)
+            self.thumbnail_view.setCurrentIndex(index)
+            self.thumbnail_view.scrollTo(index)
+
+    def _visible_rows(self):
+        """(first, last) model rows intersecting the thumbnail viewport, or (None, None) if empty."""
+        rows = self.thumbnail_model.rowCount()
+        if rows == 0:
+            return None, None
+        grid = self.thumbnail_view.gridSize()
+        viewport = self.thumbnail_view.viewport()
+        columns = max(1, viewport.width() // grid.width())
+        top = self.thumbnail_view.verticalScrollBar().value()
+        first = (top // grid.height()) * columns
+        last = ((top + viewport.height()) // grid.height() + 1) * columns - 1
+        return min(first, rows - 1), min(last, rows - 1)
+
+    def _prefetch_thumbnails(self, *_):
+        """
+        Requests thumbnails just beyond the visible rows so they're ready when
+        scrolled to; queued requests for rows further away are skipped.
+        """
+        first, last = self._visible_rows()
+        if first is None:
+            return
+        margin = config.THUMBNAIL_PREFETCH_ROWS
+        self.thumbnail_model.set_wanted_rows(first - margin, last + margin)
+        self.thumbnail_model.prefetch(last + 1, last + margin)
+        self.thumbnail_model.prefetch(first - margin, first - 1)
+
+    def _total_pages(self):
+        return self.image_index.page_count(self.items_per_page)
+
+    def _apply_view_options(self):
+        """Applies the sort/filter controls to image_index."""
+        self.image_index.set_view(self.sort_combo.currentData(), self.detections_only_checkbox.isChecked())
+        if self.sort_combo.currentData() == SORT_MTIME and self.scan_worker is None:
+            self._read_mtimes_in_background()
+
+    def _read_mtimes_in_background(self):
+        """Stats images of unknown mtime on the thread pool; the Modified sort is re-applied when done."""
+        index = self.image_index
+        if index is self.mtime_index:
+            return
+        ids = index.missing_mtimes()
+        if not len(ids):
+            return
+        self.mtime_index = index
+        runnable = GenericRunnable(index.stat_mtimes, ids)
+        runnable.signals.result.connect(lambda mtimes: self.on_mtimes_ready(index, ids, mtimes))
+        runnable.signals.error.connect(self.on_task_error)
+        runnable.signals.finished.connect(lambda: self._on_mtimes_finished(index))
+        self.statusBar.showMessage(f"Reading modification times of {len(ids)} images...")
+        self.threadpool.start(runnable)
+
+    def on_mtimes_ready(self, index, ids, mtimes):
+        index.set_mtimes(ids, mtimes)
+        if index is self.image_index and self.sort_combo.currentData() == SORT_MTIME:
+            self.statusBar.showMessage(f"Sorted {len(index)} images by modification time.")
+            self.current_page = index.clamp_page(self.current_page, self.items_per_page)
+            self.update_thumbnails_for_page()
+
+    def _on_mtimes_finished(self, index):
+        if index is self.mtime_index:
+            self.mtime_index = None
 
-    def on_thumbnail_selected(self, current_item, _previous_item):
-        if current_item:
-            self.current_image_path = current_item.data(Qt.ItemDataRole.UserRole)
+    def on_view_options_changed(self):
+        self._apply_view_options()
+        self.current_page = 0
+        self.update_thumbnails_for_page()
+
+    def on_thumbnail_selected(self, current, _previous):
+        if current.isValid():
+            image_path = current.data(Qt.ItemDataRole.UserRole)
+            self.current_image_id = current.data(IMAGE_ID_ROLE)
+            if image_path == self.current_image_path:
+                self.update_button_states()
+                return # Same image re-selected after a model reset; keep preview and detections
+            self._cancel_prefetch() # The neighbourhood moved
+            self.current_image_path = image_path
             self.current_detections = None # Clear detections for new image
             self.load_and_display_image(self.current_image_path)
+            self._show_cached_detections()
+            self._schedule_prefetch()
         else:
+            self._cancel_prefetch()
             self.current_image_path = None
-            self.current_pixmap = None
+            self.current_image_id = None
+            self.current_detections = None
+            self._clear_preview_pixmap()
             self.image_preview_label.setText("No image selected.")
             self.image_preview_label.setPixmap(QPixmap())
         self.update_button_states()
 
+    def _show_cached_detections(self):
+        """Shows boxes for the current image straight away if its prediction is already cached (e.g. prefetched)."""
+        if not self.current_image_path or not self.detector.is_loaded():
+            return
+        threshold = self.threshold_slider.value() / 100.0
+        class_filter = self.class_filter_input.text().strip()
+        detections = self.detector.filter_cached(self.current_image_path, threshold, class_filter)
+        if detections is not None:
+            if self.current_image_id is not None:
+                self.image_index.mark_detections(self.current_image_id, len(detections) > 0)
+            self.display_image(detections)
+            self.update_button_states()
+
+    # --- Speculative detection ---
+
+    def on_prefetch_toggled(self, checked):
+        if checked:
+            self._schedule_prefetch()
+        else:
+            self._cancel_prefetch()
+
+    def _schedule_prefetch(self):
+        """(Re)starts the idle timer; prefetching begins once the selection has settled."""
+        if self.prefetch_checkbox.isChecked() and self.detector.is_loaded() and self.batch_worker is None:
+            self.prefetch_timer.start()
+
+    def _start_prefetch(self):
+        """Detects the next PREFETCH_AHEAD and previous PREFETCH_BEHIND images in view order, nearest first."""
+        row = self.thumbnail_view.currentIndex().row()
+        if row < 0 or not self.detector.is_loaded() or self.batch_worker is not None:
+            return
+        ahead = self.thumbnail_model.paths(row + 1, row + config.PREFETCH_AHEAD)
+        behind = self.thumbnail_model.paths(max(0, row - config.PREFETCH_BEHIND), row - 1)[::-1]
+        paths = ahead[:1] + behind[:1] + ahead[1:] + behind[1:]
+        if not paths:
+            return
+        self._cancel_prefetch()
+        worker = DetectionPrefetchRunnable(self.detector, paths, self.threshold_slider.value() / 100.0,
+                                           self.class_filter_input.text().strip())
+        worker.signals.batch_item_processed.connect(self._on_prefetched)
+        self.prefetch_worker = worker
+        self.prefetch_pool.start(worker)
+
+    def _on_prefetched(self, _index, image_path):
+        # The user may have moved onto an image while it was being prefetched
+        if image_path == self.current_image_path and self.current_detections is None:
+            self._show_cached_detections()
+
+    def _cancel_prefetch(self):
+        self.prefetch_timer.stop()
+        if self.prefetch_worker is not None:
+            self.prefetch_worker.cancel()
+            self.prefetch_worker = None
+
     def load_and_display_image(self, image_path):
-        """Loads the image into current_pixmap and calls display."""
+        """
+        Decodes the image into current_pixmap, no larger than the screen
+        (QImageReader scales JPEGs while decoding), and calls display.
+        """
+        self._clear_preview_pixmap()
         if not image_path:
-            self.current_pixmap = None
             self.display_image()
             return
 
         try:
-            self.current_pixmap = QPixmap(image_path)
-            if self.current_pixmap.isNull():
-                log.error(f"Failed to load image: {image_path}")
+            reader = QImageReader(image_path)
+            original_size = reader.size()
+            limit = self._preview_decode_limit()
+            if original_size.isValid() and (original_size.width() > limit.width() or original_size.height() > limit.height()):
+                reader.setScaledSize(original_size.scaled(limit, Qt.AspectRatioMode.KeepAspectRatio))
+            image = reader.read()
+            if image.isNull():
+                log.error(f"Failed to load image: {image_path} ({reader.errorString()})")
                 self.image_preview_label.setText(f"Error: Could not load image\n{os.path.basename(image_path)}")
-                self.current_pixmap = None
+                return
+            self.current_pixmap = QPixmap.fromImage(image)
+            self.current_image_size = original_size if original_size.isValid() else image.size()
             self.display_image() # Display initially without boxes
         except Exception as e:
             log.error(f"Error loading {image_path}: {e}", exc_info=True)
-            self.current_pixmap = None
+            self._clear_preview_pixmap()
             self.display_image()
 
+    def _clear_preview_pixmap(self):
+        self.current_pixmap = None
+        self.current_image_size = None
+        self._scaled_base = None
+        self._scaled_base_key = None
+
+    def _preview_decode_limit(self):
+        """Largest preview worth decoding: the screen size in device pixels."""
+        screen = self.screen() or QGuiApplication.primaryScreen()
+        if screen is None:
+            return QSize(4096, 4096)
+        size = screen.size()
+        ratio = screen.devicePixelRatio()
+        return QSize(int(size.width() * ratio), int(size.height() * ratio))
+
+    def _scaled_base_pixmap(self):
+        """current_pixmap smoothly scaled to the preview label; rescaled only when the label size changes."""
+        ratio = self.image_preview_label.devicePixelRatioF()
+        label_size = self.image_preview_label.size()
+        target = QSize(max(1, int(label_size.width() * ratio)), max(1, int(label_size.height() * ratio)))
+        key = (self.current_pixmap.cacheKey(), target.width(), target.height())
+        if self._scaled_base_key != key:
+            self._scaled_base = self.current_pixmap.scaled(target, Qt.AspectRatioMode.KeepAspectRatio,
+                                                           Qt.TransformationMode.SmoothTransformation)
+            self._scaled_base.setDevicePixelRatio(ratio)
+            self._scaled_base_key = key
+        return self._scaled_base
 
     def display_image(self, detections=None):
-        """Displays the current_pixmap, optionally drawing detections."""
+        """
+        Displays the current image scaled to the preview, optionally with
+        detections. Boxes are drawn in display coordinates on a copy of the
+        cached scaled base, so redraws never touch a full-size pixmap.
+        """
         if not self.current_pixmap or self.current_pixmap.isNull():
             self.image_preview_label.clear()
             self.image_preview_label.setText("No image to display.")
             return
 
-        pixmap_to_show = self.current_pixmap.copy() # Work on a copy
-
-        if detections and detections['boxes']:
-            painter = QPainter(pixmap_to_show)
-            pen = QPen(QColor("red"), max(2, int(pixmap_to_show.width() / 400))) # Scale pen width
-            painter.setPen(pen)
-            font = painter.font()
-            font.setPointSize(max(8, int(pixmap_to_show.height() / 60)))
-            painter.setFont(font)
-
-            for i, box in enumerate(detections['boxes']):
-                x1, y1, x2, y2 = map(int, box)
-                w, h = x2 - x1, y2 - y1
-                painter.drawRect(x1, y1, w, h)
-
-                label = detections['labels'][i]
-                score = detections['scores'][i]
-                text = f"{label}: {score:.2f}"
-
-                metrics = painter.fontMetrics()
-                text_width = metrics.horizontalAdvance(text) + 4
-                text_height = metrics.height()
-                text_x, text_y = x1, y1 - 2
-
-                if text_y < text_height: text_y = y1 + h + text_height
-
-                painter.fillRect(text_x, text_y - text_height, text_width, text_height, QColor(255, 0, 0, 180))
-                painter.setPen(QColor("white"))
-                painter.drawText(text_x + 2, text_y -1, text)
-                painter.setPen(QColor("red")) # Reset pen
-
-            painter.end()
+        base = self._scaled_base_pixmap()
+        if detections is not None and len(detections['boxes']) > 0:
+            pixmap_to_show = base.copy() # Display-sized copy
+            self._draw_detections(pixmap_to_show, detections)
+        else:
+            pixmap_to_show = base
+        self.image_preview_label.setPixmap(pixmap_to_show)
 
-        # Scale and display
-        self.image_preview_label.setPixmap(pixmap_to_show.scaled(
-            self.image_preview_label.size(),
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation))
-        
         self.current_detections = detections # Store detections
 
+    def _draw_detections(self, pixmap, detections):
+        """Paints boxes and labels onto a display-sized pixmap, mapping image coordinates to it."""
+        ratio = pixmap.devicePixelRatio()
+        scale = pixmap.width() / ratio / max(1, self.current_image_size.width())
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        pen = QPen(QColor("red"), 2)
+        painter.setPen(pen)
+        metrics = painter.fontMetrics()
+        text_height = metrics.height()
+        view_height = pixmap.height() / ratio
+
+        for (x1, y1, x2, y2), label, score in zip((detections['boxes'] * scale).tolist(), detections['labels'],
+                                                  detections['scores'].tolist()):
+            painter.drawRect(QRectF(x1, y1, x2 - x1, y2 - y1))
+
+            text = f"{label}: {score:.2f}"
+            text_width = metrics.horizontalAdvance(text) + 4
+            text_y = y1 - 2
+            if text_y < text_height:
+                text_y = min(y2 + text_height, view_height)
+
+            painter.fillRect(QRectF(x1, text_y - text_height, text_width, text_height), QColor(255, 0, 0, 180))
+            painter.setPen(QColor("white"))
+            painter.drawText(QRectF(x1 + 2, text_y - text_height, text_width, text_height),
+                             Qt.AlignmentFlag.AlignVCenter, text)
+            painter.setPen(pen) # Reset pen
+
+        painter.end()
+
 
     def update_threshold_label(self, value):
         self.threshold_label.setText(f"Confidence Threshold: {value / 100.0:.2f}")
-        # Optionally re-run detection or just re-draw if detections exist
-        if self.current_detections:
-             self.run_detection_on_current() # Re-run to re-filter
+        # Re-filter/re-draw if detections exist
+        if self.current_detections is not None:
+             self.refilter_current_detections()
+
+    def refilter_current_detections(self):
+        """
+        Re-applies threshold and class filter to the current image.
+        Uses the detector's cached raw prediction when available, so slider
+        ticks redraw immediately; falls back to a full detection otherwise.
+        """
+        if not self.current_image_path or not self.detector.is_loaded():
+            return
+        threshold = self.threshold_slider.value() / 100.0
+        class_filter = self.class_filter_input.text().strip()
+        detections = self.detector.filter_cached(self.current_image_path, threshold, class_filter)
+        if detections is None:
+            self.run_detection_on_current() # Not cached, re-run to re-filter
+            return
+        self.display_image(detections)
+        self.update_button_states()
+
+    def on_class_filter_changed(self):
+        if self.current_detections is not None:
+            self.refilter_current_detections()
 
     def prev_page(self):
         if self.current_page > 0:
@@ -436,8 +777,7 @@ class MainWindow(QMainWindow):
         self.update_button_states()
 
     def next_page(self):
-        total_pages = (len(self.all_image_files) + self.items_per_page - 1) // self.items_per_page
-        if self.current_page < total_pages - 1:
+        if self.current_page < self._total_pages() - 1:
             self.current_page += 1
             self.update_thumbnails_for_page()
         self.update_button_states()
@@ -463,9 +803,11 @@ class MainWindow(QMainWindow):
         self.threadpool.start(runnable)
 
     def on_detection_complete(self, detections):
-        if not detections or not detections['boxes']:
+        if self.current_image_id is not None and detections is not None:
+            self.image_index.mark_detections(self.current_image_id, len(detections['boxes']) > 0)
+        if detections is None or len(detections['boxes']) == 0:
              QMessageBox.information(self, "Detection Complete", "No objects found matching criteria.")
-             self.display_image(None) # Show original image
+             self.display_image(detections) # Show original image, keep (empty) result for re-filtering
         else:
              num_found = len(detections['boxes'])
              log.info(f"Detection found {num_found} objects.")
@@ -474,10 +816,10 @@ class MainWindow(QMainWindow):
 
 
     def save_current_image_crops(self):
-        if not self.current_image_path or not self.current_detections or not self.dest_dir:
+        if not self.current_image_path or self.current_detections is None or not self.dest_dir:
             QMessageBox.warning(self, "Cannot Save", "No image, detections, or output directory.")
             return
-        if not self.current_detections['boxes']:
+        if len(self.current_detections['boxes']) == 0:
             QMessageBox.information(self, "No Detections", "No objects to save.")
             return
 
@@ -487,7 +829,7 @@ class MainWindow(QMainWindow):
         self.save_crop_btn.setText("Saving...")
 
         runnable = GenericRunnable(image_utils.crop_and_save, self.current_image_path, self.current_detections, self.dest_dir, prefix)
-        runnable.signals.result.connect(lambda count: QMessageBox.information(self, "Crops Saved", f"Saved {count} cropped image(s) to {self.dest_dir}."))
+        runnable.signals.result.connect(self.on_current_crops_saved)
         runnable.signals.error.connect(self.on_task_error)
         runnable.signals.finished.connect(lambda: (
             self.save_crop_btn.setText("Save Current Crop(s)"),
@@ -495,12 +837,21 @@ class MainWindow(QMainWindow):
         ))
         self.threadpool.start(runnable)
 
+    def on_current_crops_saved(self, result):
+        count, errors = result
+        if errors:
+            QMessageBox.warning(self, "Crops Saved", f"Saved {count} cropped image(s) to {self.dest_dir}; "
+                                                     f"{errors} could not be saved (see the log).")
+        else:
+            QMessageBox.information(self, "Crops Saved", f"Saved {count} cropped image(s) to {self.dest_dir}.")
+
 
     def _batch_save_crops(self, image_paths, operation_name):
         if not self.detector.is_loaded() or not self.dest_dir or not image_paths:
             QMessageBox.warning(self, "Cannot Save", "Model not loaded, output dir not set, or no images.")
             return
 
+        self._cancel_prefetch() # The batch gets the model to itself
         threshold = self.threshold_slider.value() / 100.0
         class_filter = self.class_filter_input.text().strip()
 
@@ -511,7 +862,8 @@ class MainWindow(QMainWindow):
         self.progress_dialog.setValue(0)
 
         self.batch_worker = BatchProcessingRunnable(
-            self.detector, image_paths, threshold, class_filter, self.dest_dir
+            self.detector, image_paths, threshold, class_filter, self.dest_dir,
+            batch_size=config.DEFAULT_BATCH_SIZE
         )
 
         self.progress_dialog.canceled.connect(self.batch_worker.cancel)
@@ -526,22 +878,74 @@ class MainWindow(QMainWindow):
         self.save_all_crops_btn.setEnabled(False)
         self.progress_dialog.show()
         self.threadpool.start(self.batch_worker)
+        self.scheduler_stats_timer.start()
+
+    def _show_scheduler_stats(self):
+        """Queue depth and p95 wait per priority of the detector's inference scheduler."""
+        stats = self.detector.scheduler.stats()
+        depth = ", ".join(f"{name} {count}" for name, count in stats["queue_depth"].items() if count)
+        waits = ", ".join(f"{name} {wait['p95']:.0f} ms" for name, wait in stats["wait_ms"].items())
+        self.statusBar.showMessage(f"Inference queue: {depth or 'empty'} | p95 wait: {waits or '-'}"
+                                   f" | {stats['inputs']} images in {stats['model_calls']} model calls")
 
     def _on_batch_finished(self):
         if self.progress_dialog:
             self.progress_dialog.close()
             self.progress_dialog = None
         self.batch_worker = None
+        self.scheduler_stats_timer.stop()
+        self._show_scheduler_stats()
         self.update_button_states()
+        self._schedule_prefetch()
         log.info("Batch processing GUI cleanup finished.")
 
 
     def save_page_images_crops(self):
-        self._batch_save_crops(list(self.current_page_files), "Save Page Crops")
+        if self.paginated:
+            first, last = 0, self.thumbnail_model.rowCount() - 1
+        else:
+            first, last = self._visible_rows()
+        paths = self.thumbnail_model.paths(first, last) if first is not None else []
+        self._batch_save_crops(paths, self.save_page_crops_btn.text())
 
     def save_all_images_crops(self):
-        self._batch_save_crops(list(self.all_image_files), "Save All Pages Crops")
+        self._batch_save_crops(self.image_index.view_paths(), "Save All Pages Crops")
+
 
+    def on_watch_toggled(self, checked):
+        if not checked:
+            self._stop_watching()
+            return
+        if self.watch_worker is not None:
+            return
+        if not self.detector.is_loaded() or not self.source_dir or not self.dest_dir:
+            QMessageBox.warning(self, "Cannot Watch", "Model not loaded, or source/output folder not set.")
+            self.watch_btn.setChecked(False)
+            return
+        threshold = self.threshold_slider.value() / 100.0
+        class_filter = self.class_filter_input.text().strip()
+        worker = WatchFolderRunnable(self.detector, self.source_dir, threshold, class_filter, self.dest_dir,
+                                     batch_size=config.DEFAULT_BATCH_SIZE)
+        worker.signals.batch_item_processed.connect(lambda count, msg: self.statusBar.showMessage(f"Watching ({count}): {msg}"))
+        worker.signals.message.connect(self.statusBar.showMessage)
+        worker.signals.error.connect(self.on_task_error)
+        worker.signals.finished.connect(lambda: self._on_watch_finished(worker))
+        self.watch_worker = worker
+        self.threadpool.start(worker)
+        self.statusBar.showMessage(f"Watching {self.source_dir} for new images...")
+        log.info(f"Watching {self.source_dir} -> {self.dest_dir} (threshold {threshold}, class '{class_filter}').")
+
+    def _stop_watching(self):
+        if self.watch_worker is not None:
+            self.watch_worker.cancel()
+
+    def _on_watch_finished(self, worker):
+        if self.watch_worker is worker:
+            self.watch_worker = None
+            self.watch_btn.setChecked(False)
+            self.statusBar.showMessage(f"Stopped watching ({worker.watcher.processed} images, "
+                                       f"{worker.watcher.total_saved_crops} crops).")
+        self.update_button_states()
 
     def delete_selected_image(self):
         if not self.current_image_path:
@@ -559,26 +963,22 @@ class MainWindow(QMainWindow):
                 os.remove(path_to_delete)
                 QMessageBox.information(self, "Deleted", f"File '{os.path.basename(path_to_delete)}' deleted.")
 
-                # Remove from lists and update UI
-                if path_to_delete in self.all_image_files:
-                    self.all_image_files.remove(path_to_delete)
-
+                deleted_id = self.current_image_id
                 self.current_image_path = None
+                self.current_image_id = None
                 self.current_detections = None
-                self.current_pixmap = None
+                self._clear_preview_pixmap()
                 self.image_preview_label.clear()
                 self.image_preview_label.setText("Select an image.")
 
-                # Recalculate page and update thumbnails
-                total_files = len(self.all_image_files)
-                if total_files == 0:
-                    self.current_page = 0
-                else:
-                    total_pages = (total_files + self.items_per_page - 1) // self.items_per_page
-                    if self.current_page >= total_pages:
-                        self.current_page = max(0, total_pages - 1)
-                
-                self.update_thumbnails_for_page()
+                # Remove from the index (O(1) tombstone) and the model; the view moves on to the next row
+                if deleted_id is not None:
+                    self.thumbnail_model.remove_image(deleted_id)
+                if self.paginated:
+                    self.current_page = self.image_index.clamp_page(self.current_page, self.items_per_page)
+                    self.update_thumbnails_for_page()
+                elif not self.thumbnail_view.currentIndex().isValid():
+                    self._restore_selection()
 
             except Exception as e:
                 log.error(f"Could not delete file {path_to_delete}: {e}", exc_info=True)
@@ -612,10 +1012,23 @@ class MainWindow(QMainWindow):
                                        QMessageBox.StandardButton.No)
              if reply == QMessageBox.StandardButton.Yes:
                  self.batch_worker.cancel()
+                 self._stop_watching()
+                 self._stop_thumbnail_workers()
                  self.threadpool.waitForDone(3000) # Wait 3s
+                 self.detector.close()
                  event.accept()
              else:
                  event.ignore()
         else:
+            self._stop_watching()
+            self._stop_thumbnail_workers()
             self.threadpool.waitForDone(1000) # Wait 1s
-            event.accept()
\ No newline at end of file
+            self.detector.close()
+            event.accept()
+
+    def _stop_thumbnail_workers(self):
+        """Drops queued thumbnail and prefetch jobs and waits briefly for running ones."""
+        self._cancel_prefetch()
+        self.thumbnail_model.cancel_pending()
+        self.thumbnail_pool.waitForDone(1000)
+        self.prefetch_pool.waitForDone(1000)
\ No newline at end of file
@@ -10,10 +10,12 @@ class WorkerSignals(QObject):
     - progress: int (0-100 or current count)
     - message: str (status messages)
     - batch_item_processed: int (index of item processed)
+    - items_found: list (incremental batch of results, e.g. image paths from a scan)
     """
     finished = pyqtSignal()
     error = pyqtSignal(str)
     result = pyqtSignal(object)
     progress = pyqtSignal(int)
     message = pyqtSignal(str)
-    batch_item_processed = pyqtSignal(int, str) # Emits index and status/error message
\ No newline at end of file
+    batch_item_processed = pyqtSignal(int, str) # Emits index and status/error message
+    items_found = pyqtSignal(list)
@@ -0,0 +1,223 @@
+import os
+import logging
+from collections import OrderedDict
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex
+from PyQt6.QtGui import QPixmap, QColor, QIcon
+
+from .. import config
+from ..core.image_index import ImageIndex
+from .workers import GenericRunnable
+
+log = logging.getLogger(__name__)
+
+IMAGE_ID_ROLE = Qt.ItemDataRole.UserRole + 1 # image_index id of a row
+
+
+class ThumbnailListModel(QAbstractListModel):
+    """
+    Virtualized list model over the current view of an ImageIndex.
+    Rows cost nothing until the view asks to paint them: thumbnails are only
+    requested for rows whose decoration is read (the visible ones) plus an
+    explicit prefetch range, generated on a thread pool via ThumbnailCache,
+    and held in an LRU pixmap cache bounded by a memory budget, so
+    offscreen pixmaps are dropped as the user scrolls. Queued jobs for rows
+    scrolled out of the wanted range (set_wanted_rows) are skipped before
+    decoding, so a fast scroll doesn't leave workers busy behind the viewport.
+    In paged mode the model exposes the slice [offset, offset + limit).
+    """
+
+    def __init__(self, thumbnail_cache, pool, parent=None):
+        super().__init__(parent)
+        self.thumbnail_cache = thumbnail_cache
+        self.pool = pool
+        self.image_index = ImageIndex()
+        self.offset = 0
+        self.limit = None # None = all rows (scroll mode)
+        self._rows = 0
+
+        self._pixmaps = OrderedDict() # path -> QPixmap, least recently used first
+        self._pixmap_bytes = 0
+        self._pending = {} # path -> row it was requested for
+        self._generation = 0 # Bumped to drop results of requests made for an older layout
+        self._wanted = None # (first, last) rows whose thumbnails are still wanted; None = all
+
+        placeholder = QPixmap(config.THUMBNAIL_SIZE, config.THUMBNAIL_SIZE)
+        placeholder.fill(QColor("#d8d8d8"))
+        self._placeholder = QIcon(placeholder)
+
+    # --- Layout ---
+
+    def set_index(self, image_index, offset=0, limit=None):
+        """Shows image_index's current view (or one slice of it in paged mode)."""
+        self.beginResetModel()
+        self.image_index = image_index
+        self.offset = offset
+        self.limit = limit
+        self._rows = self._count_rows()
+        self._drop_pending()
+        self.endResetModel()
+
+    def sync_rows(self):
+        """Call after the index grew (e.g. a scan batch): appends the new rows without a reset."""
+        rows = self._count_rows()
+        if rows > self._rows:
+            self.beginInsertRows(QModelIndex(), self._rows, rows - 1)
+            self._rows = rows
+            self.endInsertRows()
+        elif rows < self._rows:
+            self.set_index(self.image_index, self.offset, self.limit)
+
+    def remove_image(self, image_id):
+        """Deletes an image from the index (O(1) tombstone) and removes its row, if shown."""
+        row = self.row_of(image_id)
+        if row is None:
+            self.image_index.delete(image_id)
+            return
+        if self.limit is not None:
+            # A page slides the next image in, so the whole slice shifts
+            self.beginResetModel()
+            self.image_index.delete(image_id)
+            self._rows = self._count_rows()
+            self._drop_pending()
+            self.endResetModel()
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.image_index.delete(image_id)
+        self._rows -= 1
+        self._drop_pending() # Rows below shifted up
+        self.endRemoveRows()
+
+    def entry(self, row):
+        """Returns (image id, path) of a row."""
+        return self.image_index.entry_at(self.offset + row)
+
+    def row_of(self, image_id):
+        """Row showing image_id, or None if it isn't in the model."""
+        if image_id is None:
+            return None
+        position = self.image_index.position(image_id)
+        if position is None or not 0 <= position - self.offset < self._rows:
+            return None
+        return position - self.offset
+
+    def paths(self, first_row, last_row):
+        """Paths of rows first_row..last_row (inclusive, clipped)."""
+        last_row = min(last_row, self._rows - 1)
+        return [self.entry(row)[1] for row in range(max(0, first_row), last_row + 1)]
+
+    def _count_rows(self):
+        size = self.image_index.view_size()
+        if self.limit is None:
+            return size
+        return max(0, min(self.limit, size - self.offset))
+
+    # --- Qt model interface ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._rows
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < self._rows:
+            return None
+        image_id, path = self.entry(index.row())
+        if role == Qt.ItemDataRole.DisplayRole:
+            return os.path.basename(path)
+        if role == Qt.ItemDataRole.DecorationRole:
+            pixmap = self._pixmaps.get(path)
+            if pixmap is not None:
+                self._pixmaps.move_to_end(path)
+                return pixmap
+            self._want(index.row()) # Being painted, so wanted whatever the last scroll said
+            self._request(index.row(), path)
+            return self._placeholder
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return path
+        if role == Qt.ItemDataRole.UserRole:
+            return path
+        if role == IMAGE_ID_ROLE:
+            return image_id
+        return None
+
+    # --- Thumbnail loading ---
+
+    def prefetch(self, first_row, last_row):
+        """Requests thumbnails for rows first_row..last_row (inclusive, clipped) ahead of painting."""
+        for row in range(max(0, first_row), min(last_row, self._rows - 1) + 1):
+            path = self.entry(row)[1]
+            if path not in self._pixmaps:
+                self._request(row, path)
+
+    def set_wanted_rows(self, first_row, last_row):
+        """Rows on screen or about to be (visible plus prefetch margin); queued jobs for other rows are skipped."""
+        self._wanted = (first_row, last_row)
+
+    def cancel_pending(self):
+        """Drops queued thumbnail jobs (e.g. on close)."""
+        self._drop_pending()
+        self.pool.clear()
+
+    def _request(self, row, path):
+        if path in self._pending:
+            return
+        self._pending[path] = row
+        runnable = GenericRunnable(self._make_thumbnail, path, row, self._generation)
+        runnable.signals.result.connect(lambda thumb_path, p=path, g=self._generation: self._on_thumbnail_ready(p, g, thumb_path))
+        runnable.signals.error.connect(lambda msg, p=path: self._on_thumbnail_failed(p, msg))
+        self.pool.start(runnable)
+
+    def _make_thumbnail(self, path, row, generation):
+        """
+        Runs on a thumbnail worker. Returns the cached thumbnail path, or None if
+        the request went stale (older layout, or its row scrolled out of the
+        wanted range; the view requests it again when the row is painted).
+        """
+        if generation != self._generation or not self._is_wanted(row):
+            return None
+        return self.thumbnail_cache.get_or_create(path)
+
+    def _on_thumbnail_ready(self, path, generation, thumb_path):
+        if generation != self._generation:
+            return # Layout changed since the request; the view will ask again if still visible
+        row = self._pending.pop(path, None)
+        if not thumb_path:
+            return
+        pixmap = QPixmap(thumb_path)
+        if pixmap.isNull():
+            return
+        self._store(path, pixmap)
+        if row is not None and row < self._rows and self.entry(row)[1] == path:
+            model_index = self.index(row)
+            self.dataChanged.emit(model_index, model_index, [Qt.ItemDataRole.DecorationRole])
+
+    def _on_thumbnail_failed(self, path, msg):
+        self._pending.pop(path, None)
+        log.error(f"Error loading thumbnail for {path}: {msg}")
+
+    def _store(self, path, pixmap):
+        """Adds a pixmap to the LRU cache, evicting the least recently painted ones over budget."""
+        old = self._pixmaps.pop(path, None)
+        if old is not None:
+            self._pixmap_bytes -= _pixmap_bytes(old)
+        self._pixmaps[path] = pixmap
+        self._pixmap_bytes += _pixmap_bytes(pixmap)
+        while self._pixmap_bytes > config.THUMBNAIL_MEMORY_BUDGET and len(self._pixmaps) > 1:
+            _, evicted = self._pixmaps.popitem(last=False)
+            self._pixmap_bytes -= _pixmap_bytes(evicted)
+
+    def _want(self, row):
+        wanted = self._wanted
+        if wanted is not None and not wanted[0] <= row <= wanted[1]:
+            self._wanted = (min(wanted[0], row), max(wanted[1], row))
+
+    def _is_wanted(self, row):
+        wanted = self._wanted # Read once: the GUI thread may replace it meanwhile
+        return wanted is None or wanted[0] <= row <= wanted[1]
+
+    def _drop_pending(self):
+        self._generation += 1
+        self._pending.clear()
+        self._wanted = None # Rows mean something else now; the next scroll narrows it again
+
+
+def _pixmap_bytes(pixmap):
+    return pixmap.width() * pixmap.height() * max(1, pixmap.depth() // 8)
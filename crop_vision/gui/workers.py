@@ -1,10 +1,16 @@
-import os
 import traceback
 import logging
 from PyQt6.QtCore import QRunnable
 from .signals import WorkerSignals
 from ..core.detector import Detector
 from ..core import image_utils
+from ..core.catalog import FileCatalog
+from ..core.pipeline import BatchPipeline
+from ..core.multiproc import ShardedBatchRunner
+from ..core.journal import BatchJournal
+from ..core.watcher import FolderWatcher
+from ..core.scheduler import PRIORITY_PREFETCH
+from .. import config
 
 log = logging.getLogger(__name__)
 
@@ -32,24 +38,158 @@ class GenericRunnable(QRunnable):
             self.signals.finished.emit()
 
 
+class DirectoryScanRunnable(QRunnable):
+    """
+    Streams a recursive image scan of a source folder.
+    Emits items_found with each batch of paths, message with the running
+    count, and result with the total when the scan completes.
+    """
+    def __init__(self, src_dir: str):
+        super().__init__()
+        self.src_dir = src_dir
+        self.signals = WorkerSignals()
+        self.is_cancelled = False
+
+    def run(self):
+        log.info(f"Scanning '{self.src_dir}' for images...")
+        found = 0
+        batches = image_utils.iter_images(self.src_dir)
+        try:
+            for batch in batches:
+                if self.is_cancelled:
+                    break
+                found += len(batch)
+                self.signals.items_found.emit(batch)
+                self.signals.message.emit(f"Scanning... found {found} images.")
+            if not self.is_cancelled:
+                log.info(f"Found {found} images.")
+                self.signals.result.emit(found)
+        except Exception as e:
+            log.error(f"Error scanning directory {self.src_dir}: {e}", exc_info=True)
+            self.signals.error.emit(f"{type(e).__name__}: {str(e)}")
+        finally:
+            batches.close()
+            self.signals.finished.emit()
+
+    def cancel(self):
+        self.is_cancelled = True
+
+
+class CatalogSyncRunnable(QRunnable):
+    """
+    Loads a source folder through the persistent FileCatalog.
+    A known folder's catalogued paths are emitted at once via items_found,
+    then only changed directories are rescanned. Images found by the sync
+    (all of them for a new folder) follow via items_found as they are found.
+    result carries the paths that no longer exist, or None if the catalogued
+    list was already current.
+    """
+    def __init__(self, src_dir: str, db_path: str = None):
+        super().__init__()
+        self.src_dir = src_dir
+        self.db_path = db_path
+        self.signals = WorkerSignals()
+        self.is_cancelled = False
+
+    def run(self):
+        catalog = None
+        try:
+            catalog = FileCatalog(self.db_path)
+            known = catalog.has_root(self.src_dir)
+            if known:
+                cached = catalog.paths(self.src_dir)
+                self.signals.items_found.emit(cached)
+                self.signals.message.emit(f"Loaded {len(cached)} catalogued images, checking for changes...")
+
+            found = [0]
+            removed_paths = []
+            def on_added(paths):
+                found[0] += len(paths)
+                self.signals.items_found.emit(paths)
+                if not known:
+                    self.signals.message.emit(f"Scanning... found {found[0]} images.")
+
+            added, removed = catalog.sync(self.src_dir, on_added=on_added, on_removed=removed_paths.extend,
+                                          is_cancelled=lambda: self.is_cancelled)
+            if not self.is_cancelled:
+                changed = not known or added or removed
+                self.signals.result.emit(removed_paths if changed else None)
+                self.signals.message.emit(f"Catalog up to date: {catalog.count(self.src_dir)} images (+{added}/-{removed}).")
+        except Exception as e:
+            log.error(f"Error cataloguing {self.src_dir}: {e}", exc_info=True)
+            self.signals.error.emit(f"{type(e).__name__}: {str(e)}")
+        finally:
+            if catalog:
+                catalog.close()
+            self.signals.finished.emit()
+
+    def cancel(self):
+        self.is_cancelled = True
+
+
+class DetectionPrefetchRunnable(QRunnable):
+    """
+    Speculatively runs detection on images next to the selected one, so
+    selecting them shows boxes at once. Raw predictions land in the
+    detector's bounded prediction cache (and results store). Requests go to
+    the detector's inference scheduler at PRIORITY_PREFETCH, so previews the
+    user is waiting for overtake them; cancellation is checked between images.
+    batch_item_processed(index, path) is emitted for every image now cached.
+    """
+    def __init__(self, detector: Detector, image_paths: list, threshold: float, class_filter: str):
+        super().__init__()
+        self.detector = detector
+        self.image_paths = image_paths
+        self.threshold = threshold
+        self.class_filter = class_filter
+        self.signals = WorkerSignals()
+        self.is_cancelled = False
+
+    def run(self):
+        try:
+            for i, image_path in enumerate(self.image_paths):
+                if self.is_cancelled or not self.detector.is_loaded():
+                    break
+                if self.detector.filter_cached(image_path, self.threshold, self.class_filter) is not None:
+                    continue
+                try:
+                    self.detector.detect_objects(image_path, self.threshold, self.class_filter,
+                                                 priority=PRIORITY_PREFETCH)
+                except Exception as e:
+                    log.debug(f"Prefetch detection failed for {image_path}: {e}")
+                    continue
+                if not self.is_cancelled:
+                    self.signals.batch_item_processed.emit(i, image_path)
+        finally:
+            self.signals.finished.emit()
+
+    def cancel(self):
+        self.is_cancelled = True
+
+
 class BatchProcessingRunnable(QRunnable):
     """
     Specialized QRunnable for batch detection and cropping.
-    Emits progress signals.
+    Drives a staged BatchPipeline (decode -> batched inference -> crop/encode),
+    or a ShardedBatchRunner for multi-process CPU jobs, and emits progress signals.
+    With resume on, images already recorded in the output folder's journal
+    for the same model/threshold/class filter are skipped.
     """
-    def __init__(self, detector: Detector, image_paths: list, threshold: float, class_filter: str, output_dir: str):
+    def __init__(self, detector: Detector, image_paths: list, threshold: float, class_filter: str, output_dir: str,
+                 batch_size: int = config.DEFAULT_BATCH_SIZE, resume: bool = config.RESUME_BATCHES):
         super().__init__()
         self.detector = detector
         self.image_paths = image_paths
         self.threshold = threshold
         self.class_filter = class_filter
         self.output_dir = output_dir
+        self.batch_size = max(1, int(batch_size))
+        self.resume = resume
         self.signals = WorkerSignals()
         self.is_cancelled = False
 
     def run(self):
-        log.info(f"Starting batch processing for {len(self.image_paths)} images.")
-        total_saved_crops = 0
+        log.info(f"Starting batch processing for {len(self.image_paths)} images (batch size {self.batch_size}).")
         total_images = len(self.image_paths)
 
         if not self.detector.is_loaded():
@@ -57,36 +197,96 @@ class BatchProcessingRunnable(QRunnable):
             self.signals.finished.emit()
             return
 
-        for i, img_path in enumerate(self.image_paths):
-            if self.is_cancelled:
-                self.signals.message.emit("Operation cancelled.")
-                break
-
-            try:
-                detections = self.detector.detect_objects(img_path, self.threshold, self.class_filter)
-                if detections['boxes']:
-                    base_name = os.path.splitext(os.path.basename(img_path))[0]
-                    prefix = f"{base_name}_crop"
-                    num_saved = image_utils.crop_and_save(img_path, detections, self.output_dir, prefix)
-                    total_saved_crops += num_saved
-                    self.signals.batch_item_processed.emit(i, f"Processed {os.path.basename(img_path)} - {num_saved} crops.")
-                else:
-                     self.signals.batch_item_processed.emit(i, f"Processed {os.path.basename(img_path)} - No crops.")
-
-            except Exception as e:
-                log.error(f"Error processing {img_path} in batch: {e}", exc_info=True)
-                self.signals.batch_item_processed.emit(i, f"ERROR processing {os.path.basename(img_path)}: {e}")
+        pipeline = self._create_pipeline()
 
+        def on_item(i, message, processed):
+            self.signals.batch_item_processed.emit(i, message)
             # Calculate and emit progress (0-100)
-            progress_percent = int(((i + 1) / total_images) * 100)
-            self.signals.progress.emit(progress_percent)
+            self.signals.progress.emit(int((processed / total_images) * 100))
 
-        if not self.is_cancelled:
-            self.signals.result.emit(f"Batch completed. Total crops saved: {total_saved_crops}")
+        try:
+            total_saved_crops = pipeline.run(on_item=on_item, is_cancelled=lambda: self.is_cancelled)
+            if pipeline.errors:
+                self.signals.error.emit("\n".join(pipeline.errors))
+            if self.is_cancelled:
+                self.signals.message.emit("Operation cancelled.")
+            else:
+                result_msg = f"Batch completed. Total crops saved: {total_saved_crops}"
+                if pipeline.skipped:
+                    result_msg += f" ({pipeline.skipped} images already done were skipped)"
+                self.signals.result.emit(result_msg)
+        except Exception as e:
+            log.error(f"Batch processing failed: {e}", exc_info=True)
+            self.signals.error.emit(f"{type(e).__name__}: {str(e)}")
 
         self.signals.finished.emit()
         log.info("Batch processing finished.")
 
+    def _create_pipeline(self):
+        """
+        Picks the batch backend: sharded worker processes for CPU jobs when
+        config.INFERENCE_PROCESSES > 1, otherwise the in-process pipeline.
+        """
+        journal = BatchJournal(self.output_dir, self.detector.model_identity, self.threshold, self.class_filter,
+                               resume=self.resume)
+        on_cpu = self.detector.device is not None and self.detector.device.type == "cpu"
+        if config.INFERENCE_PROCESSES > 1 and on_cpu and len(self.image_paths) > 1:
+            return ShardedBatchRunner(
+                self.detector.model_name, self.image_paths, self.threshold, self.class_filter, self.output_dir,
+                processes=config.INFERENCE_PROCESSES,
+                torch_threads=config.TORCH_THREADS_PER_PROCESS,
+                batch_size=self.batch_size,
+                journal=journal,
+                backend=self.detector.backend,
+                profile=self.detector.profile,
+                tiled=self.detector.tiled
+            )
+        return BatchPipeline(
+            self.detector, self.image_paths, self.threshold, self.class_filter, self.output_dir,
+            batch_size=self.batch_size,
+            loader_workers=config.PIPELINE_LOADER_WORKERS,
+            writer_workers=config.PIPELINE_WRITER_WORKERS,
+            queue_size=config.PIPELINE_QUEUE_SIZE,
+            journal=journal
+        )
+
     def cancel(self):
         log.warning("Cancellation requested for batch processing.")
-        self.is_cancelled = True
\ No newline at end of file
+        self.is_cancelled = True
+
+
+class WatchFolderRunnable(QRunnable):
+    """
+    Runs a FolderWatcher on the source folder until cancelled: images that
+    arrive (or are re-written) are detected and cropped into the output folder
+    as soon as their writes settle. Emits batch_item_processed(processed
+    count, message) per image and message with a summary after every round.
+    """
+    def __init__(self, detector: Detector, src_dir: str, threshold: float, class_filter: str, output_dir: str,
+                 batch_size: int = config.DEFAULT_BATCH_SIZE, resume: bool = config.RESUME_BATCHES):
+        super().__init__()
+        self.watcher = FolderWatcher(detector, src_dir, output_dir, threshold, class_filter,
+                                     batch_size=batch_size, resume=resume)
+        self.signals = WorkerSignals()
+        self.is_cancelled = False
+
+    def run(self):
+        def on_item(image_path, message):
+            self.signals.batch_item_processed.emit(self.watcher.processed, message)
+
+        def on_round(summary):
+            self.signals.message.emit(
+                f"Watching: {summary['images']} new images, {summary['crops']} crops in {summary['seconds']:.1f}s"
+                f" ({self.watcher.processed} images, {self.watcher.total_saved_crops} crops since start)")
+
+        try:
+            self.watcher.run(on_item=on_item, on_round=on_round, is_cancelled=lambda: self.is_cancelled)
+        except Exception as e:
+            log.error(f"Watching {self.watcher.src_dir} failed: {e}", exc_info=True)
+            self.signals.error.emit(f"{type(e).__name__}: {str(e)}")
+        finally:
+            self.signals.finished.emit()
+
+    def cancel(self):
+        self.is_cancelled = True
+        self.watcher.stop()
@@ -1,6 +1,7 @@
 import sys
 import os
 import logging
+import multiprocessing
 from PyQt6.QtWidgets import QApplication
 from PyQt6.QtGui import QIcon
 
@@ -59,4 +60,5 @@ def main():
         log.critical(f"Application exited with an error: {e}", exc_info=True)
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support() # Needed for sharded batch workers in frozen builds
     main()
\ No newline at end of file